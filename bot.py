@@ -9,11 +9,16 @@
 import os
 import json
 import math
+import time
+import hashlib
+import functools
 import requests
 from discord import ui
 from discord.ui import View, Button
 import asyncio
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -22,6 +27,20 @@ from discord.ext import commands, tasks
 from aiohttp import web
 from colorama import init as colorama_init, Fore
 
+from storage import open_storage, PersistenceWriter, intern_decklists, export_decklists, record_players
+from matchmaking import MatchQueue, Elo, RatingPolicy
+from leaderboard import Leaderboard
+from decklist import CardCatalog, validate_decklist, validate_many
+from cardindex import CardIndex
+from metagame import Metagame, format_report
+from headtohead import HeadToHead
+from seasons import SeasonArchive, TOTAL, PLAYED, TITLES, BEST
+from scheduler import Scheduler, monthly, local_now
+from webapi import CachedJson, KeyedCachedJson, respond, bad_request
+from metrics import registry
+from loopwatch import LoopWatchdog, where
+import swiss
+
 # optional dotenv
 try:
     from dotenv import load_dotenv
@@ -37,61 +56,90 @@ GUILD_ID = int(os.getenv("GUILD_ID", 0) or 0)
 PANEL_CHANNEL_ID = int(os.getenv("PANEL_CHANNEL_ID", 0) or 0)
 BOT_OWNER = int(os.getenv("BOT_OWNER", 0) or 0)
 PORT = int(os.getenv("PORT", 10000))
+PANEL_DEBOUNCE = float(os.getenv("PANEL_DEBOUNCE", 1.5))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 2048))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 900))
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", 8))
+POLL_TTL = float(os.getenv("POLL_TTL", 48 * 3600))
+POLL_REGISTRY_MAX = int(os.getenv("POLL_REGISTRY_MAX", 5000))
+DECK_CONFIRM_TTL = float(os.getenv("DECK_CONFIRM_TTL", 24 * 3600))
+CARD_CATALOG = os.getenv("CARD_CATALOG", "data/cards.json")
+ELO_K = float(os.getenv("ELO_K", 32))
+RATING_WINDOW = float(os.getenv("RATING_WINDOW", 100))
+RATING_WINDOW_GROWTH = float(os.getenv("RATING_WINDOW_GROWTH", 10))
+ROUND_REMINDER_MINUTES = float(os.getenv("ROUND_REMINDER_MINUTES", 50))
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", 0.25))
 
 DATA_PATH = Path("data")
 DECKLIST_PATH = DATA_PATH / "decklists"
-RANKING_FILE = DATA_PATH / "ranking.json"
-TORNEIO_FILE = DATA_PATH / "torneio.json"
-HISTORICO_FILE = DATA_PATH / "historico.json"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", 2))
+IO_WORKERS = int(os.getenv("IO_WORKERS", 2))
 
 DATA_PATH.mkdir(exist_ok=True)
 DECKLIST_PATH.mkdir(parents=True, exist_ok=True)
 
-# ---------------- STORAGE ----------------
-def save_json(path: Path, data):
-    try:
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(Fore.RED + f"[SAVE ERROR] {path}: {e}")
-
-def load_json(path: Path, default):
-    if not path.exists():
-        save_json(path, default)
-        return default
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        save_json(path, default)
-        return default
-
 # ---------------- STATE ----------------
-ranking = load_json(RANKING_FILE, {"scores_1x1": {}, "scores_torneio": {}, "__last_reset": None})
-torneio_data = load_json(TORNEIO_FILE, {
-    "active": False,
-    "inscriptions_open": False,
-    "players": [],
-    "decklists": {},
-    "deck_confirmed": {},
-    "round": 0,
-    "rounds_target": None,
-    "pairings": {},
-    "scores": {},
-    "played": {},
-    "byes": [],
-    "finished": False,
-    "inscription_message_id": 0,
-    "tournament_champions": {}
-})
-historico = load_json(HISTORICO_FILE, [])
-
-fila = []
-partidas_ativas = {}
-poll_message_map = {}
+storage = open_storage(STORAGE_BACKEND, DATA_PATH)
+ranking = storage.load_ranking()
+torneio_data = storage.load_torneio()
+historico = storage.matches
+try:
+    card_catalog = CardCatalog.load(CARD_CATALOG)
+except Exception as e:
+    print(Fore.RED + f"[CATALOGO] {e}")
+    card_catalog = CardCatalog()
+if not card_catalog:
+    print(Fore.YELLOW + f"[CATALOGO] {CARD_CATALOG} ausente — validando só a estrutura das decklists")
+card_index = CardIndex(card_catalog)
+if intern_decklists(storage.decks, torneio_data):
+    storage.save_torneio(torneio_data)
+metagame = Metagame(storage.decks.get, card_index)
+for _rec in historico:
+    metagame.ingest(_rec)
+h2h = HeadToHead.build(historico)
+standings = swiss.Standings(torneio_data)
+# blocking serialization / disk I/O never runs on the event loop
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+persist = PersistenceWriter(storage, {
+    "ranking": (lambda: ranking, storage.save_ranking),
+    "torneio": (lambda: torneio_data, storage.save_torneio),
+    "partidas": (lambda: partidas_ativas, lambda d: storage.save_doc("partidas", d)),
+    "polls": (lambda: poll_registry.entries, lambda d: storage.save_doc("polls", d)),
+    "agenda": (lambda: agenda.jobs, lambda d: storage.save_doc("agenda", d)),
+}, executor=io_executor)
+# every timed job (monthly reset, round reminders) runs off one persisted timer heap
+agenda = Scheduler(storage.load_doc("agenda", {}), on_change=lambda: persist.mark_dirty("agenda"))
+
+elo = Elo(ranking.setdefault("elo_1x1", {}), k=ELO_K)
+lb_1x1 = Leaderboard(ranking.setdefault("scores_1x1", {}))
+lb_torneio = Leaderboard(ranking.setdefault("scores_torneio", {}))
+# resets close a season: the outgoing standings are archived, never dropped
+seasons = SeasonArchive(DATA_PATH / "seasons")
+SEASON_SCOPES = {"1x1": lb_1x1, "torneio": lb_torneio}
+fila = MatchQueue(RatingPolicy(elo.rating, base_window=RATING_WINDOW, growth=RATING_WINDOW_GROWTH))
+partidas_ativas = storage.load_doc("partidas", {})
 PANEL_MESSAGE_ID = 0
 mostrar_inscritos = True
 
+# ---------------- METRICS ----------------
+# exposed at /metrics; gauges are only evaluated when scraped
+QUEUE_JOINS = registry.counter("optcg_queue_joins", "Players entering the 1x1 queue", ("via",))
+MATCHES_FORMED = registry.counter("optcg_matches_formed", "1x1 matches formed by the queue")
+RESULTS_CONFIRMED = registry.counter("optcg_results_confirmed", "Results confirmed by both players", ("source", "outcome"))
+DIVERGENT_REPORTS = registry.counter("optcg_divergent_reports", "Result polls where the players disagreed", ("source",))
+HANDLER_SECONDS = registry.histogram("optcg_handler_seconds", "Gateway event handling time", ("event",))
+USER_LOOKUPS = registry.counter("optcg_user_lookups", "safe_fetch_user resolutions by source", ("result",))
+REST_SECONDS = registry.histogram("optcg_rest_seconds", "Discord REST call latency (rate-limit waits included)", ("method", "route"))
+registry.gauge("optcg_queue_length", "Players waiting in the 1x1 queue", lambda: len(fila))
+registry.gauge("optcg_active_matches", "Matches waiting for a result", lambda: {
+    "fila": len(partidas_ativas), "torneio": len(torneio_data.get("pairings", {}))}, ("source",))
+registry.gauge("optcg_poll_registry_entries", "Persisted result polls / deck confirmations", lambda: len(poll_registry))
+registry.gauge("optcg_reaction_routes", "Messages with a live reaction route", lambda: router.counts(), ("kind",))
+registry.gauge("optcg_user_cache_entries", "Users held in the TTL user cache", lambda: len(user_cache))
+# loop lag sampler; logs the stack of whatever blocks the loop past the threshold
+loop_watch = LoopWatchdog(threshold=LOOP_LAG_THRESHOLD)
+
 # ---------------- INTENTS & BOT ----------------
 intents = discord.Intents.default()
 intents.message_content = True
@@ -101,15 +149,35 @@ intents.members = True
 class TournamentBot(commands.Bot):
     def __init__(self):
         super().__init__(command_prefix="!", intents=intents, help_command=None)
+        # every REST call (fetch_user, send, edit, ...) goes through HTTPClient.request
+        request = self.http.request
+
+        async def timed_request(route, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            finally:
+                REST_SECONDS.observe(time.perf_counter() - t0, route.method, route.path)
+        self.http.request = timed_request
 
     async def setup_hook(self):
         # start webserver and tasks
+        loop_watch.start()
         asyncio.create_task(start_webserver())
         if not save_states.is_running():
             save_states.start()
-        if not daily_reset_check.is_running():
-            daily_reset_check.start()
+        start_agenda()
         asyncio.create_task(fila_worker())
+        restore_reaction_routes()
+
+    async def close(self):
+        save_states.cancel()
+        agenda.stop()
+        loop_watch.stop()
+        await persist.shutdown()
+        storage.close()
+        io_executor.shutdown(wait=True)
+        await super().close()
 
 bot = TournamentBot()
 
@@ -127,25 +195,316 @@ EMOJI_YES = "➡️"
 EMOJI_NO = "❌"
 EMOJI_CONFIRM = "✅"
 EMOJI_DENY = "❌"
+EMOJI_PREV = "⬅️"
+EMOJI_NEXT = "➡️"
 
 # ---------------- UTIL ----------------
+class UserCache:
+    """User resolution: gateway cache, then a bounded TTL LRU, then REST.
+
+    Concurrent lookups of the same id share one ``fetch_user`` call.
+    Hits, gateway hits and misses are counted in ``optcg_user_lookups``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # uid -> (expires_at, user)
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"hits": USER_LOOKUPS.value("hit"), "gateway_hits": USER_LOOKUPS.value("gateway"),
+                "misses": USER_LOOKUPS.value("miss"), "size": len(self._entries)}
+
+    def invalidate(self, uid: int):
+        self._entries.pop(uid, None)
+
+    async def get(self, uid: int) -> Optional[discord.User]:
+        user = bot.get_user(uid)
+        if user is not None:
+            USER_LOOKUPS.inc("gateway")
+            return user
+        now = time.monotonic()
+        entry = self._entries.get(uid)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(uid)
+                USER_LOOKUPS.inc("hit")
+                return entry[1]
+            del self._entries[uid]
+        fut = self._inflight.get(uid)
+        if fut is not None:
+            USER_LOOKUPS.inc("hit")
+            return await asyncio.shield(fut)
+        USER_LOOKUPS.inc("miss")
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[uid] = fut
+        user = None
+        try:
+            user = await bot.fetch_user(uid)
+        except Exception:
+            user = None
+        finally:
+            self._inflight.pop(uid, None)
+            fut.set_result(user)
+        if user is not None:
+            self._entries[uid] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return user
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
 async def safe_fetch_user(uid: int) -> Optional[discord.User]:
-    try:
-        return await bot.fetch_user(uid)
-    except Exception:
-        return None
+    return await user_cache.get(uid)
+
+class ReactionRouter:
+    """Reaction dispatch keyed by message id.
+
+    Each message maps to one ``(kind, handler, expires_at)`` route, so a
+    reaction costs a single dict lookup however many polls, confirmations
+    and waiters are open. ``expect`` replaces ``bot.wait_for`` predicates.
+    """
+
+    PURGE_EVERY = 256
+
+    def __init__(self):
+        self._routes = {}
+        self._since_purge = 0
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, message_id) -> bool:
+        return message_id in self._routes
+
+    def counts(self) -> dict:
+        out = {}
+        for kind, _, _ in self._routes.values():
+            out[kind] = out.get(kind, 0) + 1
+        return out
+
+    def register(self, message_id: int, handler, ttl: Optional[float] = None, kind: str = "handler"):
+        expires = time.monotonic() + ttl if ttl else None
+        self._routes[message_id] = (kind, handler, expires)
+        self._since_purge += 1
+        if self._since_purge >= self.PURGE_EVERY:
+            self.purge()
+
+    def unregister(self, message_id: int, handler=None):
+        route = self._routes.get(message_id)
+        if route is not None and (handler is None or route[1] is handler):
+            del self._routes[message_id]
+
+    def purge(self):
+        now = time.monotonic()
+        for mid in [mid for mid, (_, _, exp) in self._routes.items() if exp is not None and exp < now]:
+            del self._routes[mid]
+        self._since_purge = 0
+
+    def expect(self, message_id: int, user_id: int, emojis, timeout: float) -> asyncio.Task:
+        """Task resolving to the emoji ``user_id`` picks on ``message_id``
+        (``asyncio.TimeoutError`` after ``timeout``). Register it before
+        adding the reactions so no early click is lost."""
+        fut = asyncio.get_running_loop().create_future()
+
+        async def resolve(reaction, user):
+            emoji = str(reaction.emoji)
+            if user.id == user_id and emoji in emojis and not fut.done():
+                fut.set_result(emoji)
+
+        self.register(message_id, resolve, ttl=timeout, kind="waiter")
+
+        async def wait():
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            finally:
+                self.unregister(message_id, resolve)
+
+        return asyncio.ensure_future(wait())
+
+    async def dispatch(self, reaction, user) -> bool:
+        mid = reaction.message_id
+        route = self._routes.get(mid)
+        if route is None:
+            return False
+        kind, handler, expires = route
+        if expires is not None and expires < time.monotonic():
+            del self._routes[mid]
+            return False
+        try:
+            await handler(reaction, user)
+        except Exception as e:
+            print(Fore.RED + f"[REACTION {kind}] {e}")
+        return True
+
+router = ReactionRouter()
+
+class PollRegistry:
+    """Persisted registry of DM polls/confirmations awaiting reactions.
+
+    ``entries`` is the "polls" document: ``{str(message_id): {"kind",
+    "expires" (epoch), ...handler args}}``. It is restored into the router at
+    startup, so polls keep working across restarts and cache evictions;
+    expired entries are evicted and the size is capped (oldest first).
+    """
+
+    PURGE_EVERY = 256
+
+    def __init__(self, entries: dict, maxsize: int):
+        self.entries = entries
+        self.maxsize = maxsize
+        self._since_purge = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, message_id: int, kind: str, ttl: float, **fields):
+        self.entries[str(message_id)] = dict(kind=kind, expires=time.time() + ttl, **fields)
+        self._since_purge += 1
+        if self._since_purge >= self.PURGE_EVERY:
+            self.purge()
+        while len(self.entries) > self.maxsize:
+            oldest = next(iter(self.entries))
+            router.unregister(int(oldest))
+            del self.entries[oldest]
+        persist.mark_dirty("polls")
+
+    def remove(self, message_id: int):
+        if self.entries.pop(str(message_id), None) is not None:
+            persist.mark_dirty("polls")
+
+    def purge(self) -> int:
+        now = time.time()
+        expired = [mid for mid, e in self.entries.items() if e.get("expires", 0) < now]
+        for mid in expired:
+            del self.entries[mid]
+        self._since_purge = 0
+        if expired:
+            persist.mark_dirty("polls")
+        return len(expired)
+
+poll_registry = PollRegistry(storage.load_doc("polls", {}), POLL_REGISTRY_MAX)
+
+class RawReaction:
+    """Minimal reaction object built from a raw gateway payload."""
+
+    def __init__(self, payload: discord.RawReactionActionEvent):
+        self.payload = payload
+        self.message_id = payload.message_id
+        self.emoji = payload.emoji
+
+    async def remove(self, user):
+        channel = bot.get_partial_messageable(self.payload.channel_id)
+        await channel.get_partial_message(self.message_id).remove_reaction(self.emoji, user)
 
 def now_iso():
     return datetime.datetime.utcnow().isoformat()
 
-# ---------------- WEB SERVER (keepalive) ----------------
+# ---------------- WEB SERVER (keepalive + API) ----------------
+API_TOP = 100
+API_HISTORY_LIMIT = 100
+
 async def _handle_root(request):
     return web.Response(text="OPTCG Sorocaba Bot — running")
 
+# read-only documents: each is re-serialized only when its version changes.
+# Discord ids are sent as strings (they do not fit a JavaScript number).
+def _api_ranking():
+    def rows(lb):
+        return [{"uid": str(u), "points": p, "rank": lb.rank(u), "elo": elo.rating(int(u))} for u, p in lb.top(API_TOP)]
+    return {"last_reset": ranking.get("__last_reset"), "1x1": rows(lb_1x1), "torneio": rows(lb_torneio)}
+
+def _api_tournament():
+    return {
+        "active": bool(torneio_data.get("active")),
+        "inscriptions_open": bool(torneio_data.get("inscriptions_open")),
+        "finished": bool(torneio_data.get("finished")),
+        "round": torneio_data.get("round", 0),
+        "rounds_target": torneio_data.get("rounds_target"),
+        "players": [str(u) for u in torneio_data.get("players", [])],
+        "pairings": [{"match_id": mid, "player1": str(p["player1"]), "player2": str(p["player2"])}
+                     for mid, p in torneio_data.get("pairings", {}).items()],
+        "byes": [str(u) for u in torneio_data.get("byes", [])],
+        "standings": [dict(r, uid=str(r["uid"])) for r in standings.table()],
+    }
+
+def _api_queue():
+    return {
+        "waiting": [str(u) for u in fila],
+        "matches": [{"match_id": mid, "player1": str(p["player1"]), "player2": str(p["player2"]), "source": p.get("source", "fila")}
+                    for mid, p in partidas_ativas.items()],
+    }
+
+def _api_match(record: dict) -> dict:
+    out = {k: v for k, v in record.items() if k != "decks"}
+    out["players"] = [str(u) for u in record_players(record)]
+    for k in ("winner", "loser"):
+        if out.get(k) is not None:
+            out[k] = str(out[k])
+    return out
+
+async def player_history(uid: int, limit: int, offset: int) -> list:
+    """One page of a player's records; the disk reads run on the io executor."""
+    page = historico.page(uid, limit, offset)
+    return await asyncio.get_running_loop().run_in_executor(io_executor, historico.read_page, page)
+
+async def _api_history(uid: int, limit: int, offset: int):
+    return {
+        "player": str(uid), "total": historico.count_for_player(uid), "offset": offset,
+        "matches": [_api_match(r) for r in await player_history(uid, limit, offset)],
+    }
+
+api_ranking = CachedJson(lambda: (persist.generation("ranking"), lb_1x1.version, lb_torneio.version), _api_ranking)
+api_tournament = CachedJson(lambda: persist.generation("torneio"), _api_tournament)
+api_queue = CachedJson(lambda: (fila.version, persist.generation("partidas")), _api_queue)
+# the history is append-only, so a player's count is their version
+api_history = KeyedCachedJson(lambda uid, limit, offset: historico.count_for_player(uid), _api_history)
+
+async def _handle_health(request):
+    return web.json_response({"status": "ok" if loop_watch.healthy() else "degraded",
+                              "gateway_ms": None if math.isnan(bot.latency) else round(bot.latency * 1000, 1),
+                              "loop_lag": loop_watch.summary(),
+                              "user_cache": user_cache.stats()})
+
+async def _handle_metrics(request):
+    return web.Response(body=registry.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def _handle_api_ranking(request):
+    return respond(request, api_ranking.current())
+
+async def _handle_api_tournament(request):
+    return respond(request, api_tournament.current())
+
+async def _handle_api_queue(request):
+    return respond(request, api_queue.current())
+
+async def _handle_api_history(request):
+    try:
+        uid = int(request.query["player"])
+        limit = min(max(int(request.query.get("limit", 20)), 1), API_HISTORY_LIMIT)
+        offset = max(int(request.query.get("offset", 0)), 0)
+    except (KeyError, ValueError):
+        return bad_request("use ?player=<id>[&limit=20&offset=0]")
+    return respond(request, await api_history.current(uid, limit, offset))
+
 async def start_webserver():
     try:
         app = web.Application()
-        app.add_routes([web.get("/", _handle_root)])
+        app.add_routes([
+            web.get("/", _handle_root),
+            web.get("/api/ranking", _handle_api_ranking),
+            web.get("/api/tournament", _handle_api_tournament),
+            web.get("/api/queue", _handle_api_queue),
+            web.get("/api/history", _handle_api_history),
+            web.get("/metrics", _handle_metrics),
+            web.get("/health", _handle_health),
+        ])
         runner = web.AppRunner(app)
         await runner.setup()
         site = web.TCPSite(runner, "0.0.0.0", PORT)
@@ -164,9 +523,16 @@ def build_panel_embed():
     # header field with gold accent via emoji
     embed.add_field(name="🏴‍☠️ Status geral", value=f"**Torneio ativo:** {torneio_data.get('active')}\n**Rodada:** {torneio_data.get('round')}/{torneio_data.get('rounds_target') or '-'}", inline=False)
 
+    # Classificação do torneio (tabela já ordenada, com desempates)
+    if torneio_data.get("active"):
+        top = standings.table()[:5]
+        if top:
+            st_text = "\n".join([f"{i}. <@{r['uid']}> — {r['points']} pts (OMW {r['omw'] * 100:.0f}%)" for i, r in enumerate(top, 1)])
+            embed.add_field(name="📈 Classificação", value=st_text, inline=False)
+
     # Fila
     if fila:
-        fila_text = "\n".join([f"• <@{u}>" for u in fila[:30]])
+        fila_text = "\n".join([f"• <@{u}>" for u in fila.head(30)])
     else:
         fila_text = "Vazia"
     embed.add_field(name="🟦 Fila 1x1", value=fila_text, inline=False)
@@ -183,7 +549,7 @@ def build_panel_embed():
 
     # Ultimas 3
     if historico:
-        last = historico[-3:]
+        last = historico.tail(3)
         last_lines = []
         for h in last:
             if h.get("tie"):
@@ -206,43 +572,96 @@ def build_panel_embed():
     embed.set_footer(text="Reaja: ✅ entrar | ❌ sair | 👁️ mostrar | 🙈 ocultar | 📊 ranking")
     return embed
 
-async def atualizar_painel():
-    global PANEL_MESSAGE_ID
-    if PANEL_CHANNEL_ID == 0:
-        return
-    ch = bot.get_channel(PANEL_CHANNEL_ID)
-    if not ch:
-        return
-    embed = build_panel_embed()
-    try:
-        if PANEL_MESSAGE_ID == 0:
-            msg = await ch.send(embed=embed)
-            PANEL_MESSAGE_ID = msg.id
-            try:
-                await msg.add_reaction(EMOJI_CHECK)
-                await msg.add_reaction(EMOJI_X)
-                await msg.add_reaction(EMOJI_SHOW)
-                await msg.add_reaction(EMOJI_HIDE)
-                await msg.add_reaction(EMOJI_RANK)
-            except:
-                pass
-        else:
+def _embed_digest(embed: discord.Embed) -> str:
+    # the timestamp changes on every build, it is not a visible change
+    data = embed.to_dict()
+    data.pop("timestamp", None)
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class PanelRenderer:
+    """Debounced, diff-aware panel updates.
+
+    Any number of ``request()`` calls inside the debounce window collapse
+    into one render; the panel message is cached (no ``fetch_message`` per
+    update) and the edit is skipped when the rendered embed did not change.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self.message: Optional[discord.Message] = None
+        self._last_digest = None
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    def request(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._debounced())
+
+    def reset(self):
+        self.message = None
+        self._last_digest = None
+
+    async def _debounced(self):
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            # requests arriving while rendering schedule a new window
+            self._task = None
+        await self.render()
+
+    def _adopt(self, msg):
+        global PANEL_MESSAGE_ID
+        if PANEL_MESSAGE_ID and PANEL_MESSAGE_ID != msg.id:
+            router.unregister(PANEL_MESSAGE_ID)
+        self.message = msg
+        PANEL_MESSAGE_ID = msg.id
+        router.register(msg.id, handle_panel_reaction, kind="panel")
+
+    async def _send_new(self, ch, embed):
+        msg = await ch.send(embed=embed)
+        self._adopt(msg)
+        try:
+            for emoji in (EMOJI_CHECK, EMOJI_X, EMOJI_SHOW, EMOJI_HIDE, EMOJI_RANK):
+                await msg.add_reaction(emoji)
+        except:
+            pass
+
+    async def render(self):
+        global PANEL_MESSAGE_ID
+        if PANEL_CHANNEL_ID == 0:
+            return
+        ch = bot.get_channel(PANEL_CHANNEL_ID)
+        if not ch:
+            return
+        async with self._lock:
+            embed = build_panel_embed()
+            digest = _embed_digest(embed)
+            if self.message is not None and digest == self._last_digest:
+                return
             try:
-                msg = await ch.fetch_message(PANEL_MESSAGE_ID)
-                await msg.edit(embed=embed)
-            except discord.NotFound:
-                msg = await ch.send(embed=embed)
-                PANEL_MESSAGE_ID = msg.id
-                try:
-                    await msg.add_reaction(EMOJI_CHECK)
-                    await msg.add_reaction(EMOJI_X)
-                    await msg.add_reaction(EMOJI_SHOW)
-                    await msg.add_reaction(EMOJI_HIDE)
-                    await msg.add_reaction(EMOJI_RANK)
-                except:
-                    pass
-    except Exception as e:
-        print(Fore.RED + f"[PAINEL] erro: {e}")
+                if self.message is None and PANEL_MESSAGE_ID:
+                    try:
+                        self._adopt(await ch.fetch_message(PANEL_MESSAGE_ID))
+                    except discord.NotFound:
+                        PANEL_MESSAGE_ID = 0
+                if self.message is None:
+                    await self._send_new(ch, embed)
+                else:
+                    try:
+                        await self.message.edit(embed=embed)
+                    except discord.NotFound:
+                        await self._send_new(ch, embed)
+                self._last_digest = digest
+            except Exception as e:
+                print(Fore.RED + f"[PAINEL] erro: {e}")
+
+panel = PanelRenderer(PANEL_DEBOUNCE)
+
+async def atualizar_painel(now: bool = False):
+    if now:
+        await panel.render()
+    else:
+        panel.request()
 
 # ---------------- PERSIST / TASKS ----------------
 
@@ -258,21 +677,21 @@ class PanelView(View):
         self.add_item(Button(label="👁 Mostrar/Ocultar Inscritos", style=discord.ButtonStyle.secondary, custom_id="toggle_inscritos"))
 
 @bot.event
+@HANDLER_SECONDS.timed("on_interaction")
 async def on_interaction(interaction: discord.Interaction):
     try:
         if interaction.data and interaction.data.get('custom_id'):
             cid = interaction.data['custom_id']
             user = interaction.user
             if cid == "enter_1x1":
-                if user.id not in fila:
-                    fila.append(user.id)
+                if await fila.join(user.id):
+                    QUEUE_JOINS.inc("button")
                     await interaction.response.send_message("✅ Você entrou na fila 1x1!", ephemeral=True)
                     await atualizar_painel()
                 else:
                     await interaction.response.send_message("⚠️ Você já está na fila.", ephemeral=True)
             elif cid == "leave_1x1":
-                if user.id in fila:
-                    fila.remove(user.id)
+                if await fila.leave(user.id):
                     await interaction.response.send_message("❌ Você saiu da fila 1x1.", ephemeral=True)
                     await atualizar_painel()
                 else:
@@ -283,7 +702,7 @@ async def on_interaction(interaction: discord.Interaction):
                 else:
                     if user.id not in torneio_data.get("players", []):
                         torneio_data.setdefault("players", []).append(user.id)
-                        save_json(TORNEIO_FILE, torneio_data)
+                        persist.mark_dirty("torneio")
                         await interaction.response.send_message("✅ Você foi inscrito no torneio! Verifique sua DM para enviar decklist.", ephemeral=True)
                         try:
                             await user.send("📩 Você foi inscrito no torneio. Por favor, envie sua decklist aqui (cole o texto).")
@@ -304,160 +723,257 @@ async def on_interaction(interaction: discord.Interaction):
         print("Interaction handler error:", e)
 
 # ---------------- END UI ----------------
-@tasks.loop(minutes=5)
+@tasks.loop(seconds=PERSIST_INTERVAL)
 async def save_states():
-    save_json(RANKING_FILE, ranking)
-    save_json(TORNEIO_FILE, torneio_data)
-    save_json(HISTORICO_FILE, historico)
-
-@tasks.loop(hours=24)
-async def daily_reset_check():
+    # only dirty documents are written, once per interval
+    if persist.pending:
+        await persist.flush_async()
+
+async def close_season(scope: str, label: str) -> Optional[dict]:
+    """Archive the standings of ``scope`` as a season, then empty the scope."""
+    lb = SEASON_SCOPES[scope]
+    scores = dict(lb.scores)
+    lb.clear()
+    persist.mark_dirty("ranking")
     try:
-        now = datetime.datetime.utcnow()
-        if now.day == 1:
-            ranking["scores_1x1"] = {}
-            ranking["__last_reset"] = now.isoformat()
-            save_json(RANKING_FILE, ranking)
-            owner = await safe_fetch_user(BOT_OWNER)
-            if owner:
-                try:
-                    await owner.send("🔄 Rankings 1x1 resetados automaticamente (dia 1).")
-                except:
-                    pass
+        return await asyncio.get_running_loop().run_in_executor(
+            io_executor, seasons.close_season, scope, scores, label, now_iso())
+    except Exception:
+        # snapshot not written: put the standings back (plus anything scored meanwhile)
+        for uid, pts in scores.items():
+            lb.incr(uid, pts)
+        persist.mark_dirty("ranking")
+        raise
+
+def season_label(when: Optional[datetime.datetime] = None) -> str:
+    # one id format for every reset: the local month the season belongs to;
+    # a second close in the same month gets a "-2" suffix from the archive
+    return (when or local_now()).strftime("%Y-%m")
+
+def season_note(entry: Optional[dict]) -> str:
+    return f" Temporada arquivada: `{entry['id']}` ({entry['players']} jogadores)." if entry else ""
+
+# ---------------- AGENDA (scheduled jobs) ----------------
+async def monthly_reset(due: datetime.datetime):
+    # ``due`` is local midnight on the 1st (also when catching up after
+    # downtime), so the season that ended is the month before it
+    try:
+        entry = await close_season("1x1", season_label(due - datetime.timedelta(days=1)))
+        ranking["__last_reset"] = datetime.datetime.utcnow().isoformat()
+        persist.mark_dirty("ranking")
+        owner = await safe_fetch_user(BOT_OWNER)
+        if owner:
+            try:
+                await owner.send("🔄 Rankings 1x1 resetados automaticamente (dia 1)." + season_note(entry))
+            except:
+                pass
     except Exception as e:
-        print(Fore.RED + "[DAILY] error:", e)
+        print(Fore.RED + f"[RESET MENSAL] {e}")
+
+async def round_reminder(due: datetime.datetime, round_no: int):
+    # only if that round is still being played
+    if not torneio_data.get("active") or torneio_data.get("round") != round_no:
+        return
+    jobs = []
+    for pairing in torneio_data.get("pairings", {}).values():
+        p1 = pairing["player1"]; p2 = pairing["player2"]
+        for uid in (p1, p2):
+            async def remind(uid=uid, p1=p1, p2=p2):
+                u = await safe_fetch_user(uid)
+                if not u:
+                    raise LookupError("usuário não encontrado")
+                await u.send(f"⏰ Rodada {round_no}: o resultado de <@{p1}> vs <@{p2}> ainda não foi confirmado. "
+                             "Reajam na DM da partida (1️⃣/2️⃣/➖).")
+            jobs.append((uid, remind))
+    if jobs:
+        failures = await dm_fanout(jobs)
+        await report_fanout(f"Lembrete da rodada {round_no}", len(jobs), failures)
+
+def schedule_round_reminder(round_no: int):
+    if ROUND_REMINDER_MINUTES > 0:
+        # one job name: starting the next round moves the reminder
+        agenda.schedule("round_reminder", "round_reminder",
+                        local_now() + datetime.timedelta(minutes=ROUND_REMINDER_MINUTES), round_no=round_no)
+
+def start_agenda():
+    agenda.register("monthly_reset", monthly_reset, every=monthly(day=1))
+    agenda.register("round_reminder", round_reminder)
+    # first run with the agenda: resume from the last reset so a missed 1st catches up
+    last = ranking.get("__last_reset")
+    after = None
+    if last:
+        try:
+            after = datetime.datetime.fromisoformat(last).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+    agenda.ensure("reset_1x1", "monthly_reset", after=after)
+    agenda.start()
 
 # ---------------- FILA WORKER ----------------
+_fila_tasks = set()
+
+async def start_fila_match(p1: int, p2: int):
+    MATCHES_FORMED.inc()
+    match_id = f"fila_{p1}_{p2}_{int(datetime.datetime.utcnow().timestamp())}"
+    partidas_ativas[match_id] = {
+        "player1": p1,
+        "player2": p2,
+        "attempts": {},
+        "cancel_attempts": {},
+        "source": "fila",
+        "timestamp": now_iso(),
+        "polls": []
+    }
+    try:
+        await send_result_poll(match_id, partidas_ativas[match_id])
+    except Exception as e:
+        print(Fore.RED + f"[FILA] {e}")
+    persist.mark_dirty("partidas")
+    await atualizar_painel()
+
 async def fila_worker():
+    # woken by the queue itself as soon as a pair can be formed
     while True:
         try:
-            if len(fila) >= 2:
-                p1 = fila.pop(0)
-                p2 = fila.pop(0)
-                match_id = f"fila_{p1}_{p2}_{int(datetime.datetime.utcnow().timestamp())}"
-                partidas_ativas[match_id] = {
-                    "player1": p1,
-                    "player2": p2,
-                    "attempts": {},
-                    "cancel_attempts": {},
-                    "source": "fila",
-                    "timestamp": now_iso(),
-                    "polls": []
-                }
-                await send_result_poll(match_id, partidas_ativas[match_id])
-                await atualizar_painel()
+            p1, p2 = await fila.next_pair()
+            task = asyncio.create_task(start_fila_match(p1, p2))
+            _fila_tasks.add(task)
+            task.add_done_callback(_fila_tasks.discard)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(Fore.RED + f"[FILA WORKER] {e}")
-        await asyncio.sleep(3)
+            await asyncio.sleep(1)
 
 # ---------------- TORNEIO SUÍÇO ----------------
 def calcular_rodadas(n):
     base = math.ceil(math.log2(max(1, n)))
     return max(1, base - 1) if n > 1 else 1
 
-def swiss_sort(players, scores):
-    return sorted(players, key=lambda u: (-scores.get(str(u), 0), u))
-
 async def gerar_pairings_torneio():
     players = list(torneio_data.get("players", []))
+    torneio_data["byes"] = []
     if not players:
         torneio_data["pairings"] = {}
         return
-    scores = torneio_data.get("scores", {})
-    sorted_players = swiss_sort(players, scores)
+    scores = torneio_data.setdefault("scores", {})
+    pairs, bye = swiss.pair_round(players, scores, torneio_data.get("played", {}),
+                                  torneio_data.get("bye_history", []))
+    ts = int(datetime.datetime.utcnow().timestamp())
     pairings = {}
-    i = 0
-    while i < len(sorted_players) - 1:
-        p1 = sorted_players[i]; p2 = sorted_players[i+1]
-        pid = f"tor_{p1}_{p2}_{int(datetime.datetime.utcnow().timestamp())}"
+    for p1, p2 in pairs:
+        pid = f"tor_{p1}_{p2}_{ts}"
         pairings[pid] = {
             "player1": p1, "player2": p2, "attempts": {}, "cancel_attempts": {}, "result": None,
             "round": torneio_data.get("round", 1), "source": "torneio", "polls": []
         }
-        i += 2
-    if len(sorted_players) % 2 == 1:
-        bye = sorted_players[-1]
-        if bye not in torneio_data.get("byes", []):
-            torneio_data.setdefault("byes", []).append(bye)
-            torneio_data.setdefault("scores", {})[str(bye)] = torneio_data.get("scores", {}).get(str(bye), 0) + 1
+    if bye is not None:
+        # bye counts as a win and is remembered for the rest of the event
+        torneio_data["byes"] = [bye]
+        standings.record_bye(bye)
     torneio_data["pairings"] = pairings
 
+# ---------------- DM FAN-OUT ----------------
+async def dm_fanout(jobs):
+    """Run per-player DM jobs concurrently, at most DM_CONCURRENCY at a time.
+
+    ``jobs`` is a list of ``(uid, coroutine_function)``. Each job keeps its
+    own requests sequential, so we never have two requests in flight on the
+    same DM channel route; discord.py's HTTP client handles the per-route
+    buckets and 429 retries. Returns ``{uid: reason}`` for failed players.
+    """
+    sem = asyncio.Semaphore(DM_CONCURRENCY)
+
+    async def run(uid, fn):
+        async with sem:
+            try:
+                await fn()
+                return uid, None
+            except discord.Forbidden:
+                return uid, "DM fechada"
+            except discord.HTTPException as e:
+                return uid, f"HTTP {e.status}"
+            except Exception as e:
+                return uid, str(e) or type(e).__name__
+
+    results = await asyncio.gather(*(run(uid, fn) for uid, fn in jobs))
+    return {uid: reason for uid, reason in results if reason}
+
+async def report_fanout(title: str, total: int, failures: dict):
+    owner = await safe_fetch_user(BOT_OWNER)
+    if not owner:
+        return
+    text = f"📨 {title}: {total - len(failures)}/{total} jogadores notificados."
+    if failures:
+        text += "\nFalhas:\n" + "\n".join(f"• <@{uid}> — {reason}" for uid, reason in failures.items())
+    try: await owner.send(text)
+    except: pass
+
 async def dm_pairings_round():
+    round_no = torneio_data.get('round', 1)
+    schedule_round_reminder(round_no)
+    jobs = []
     for pid, pairing in torneio_data.get("pairings", {}).items():
         p1 = pairing["player1"]; p2 = pairing["player2"]
+        content = result_poll_content(p1, p2)
         for uid in (p1, p2):
-            u = await safe_fetch_user(uid)
-            if u:
-                try:
-                    await u.send(f"🏁 Rodada {torneio_data.get('round',1)} — Confronto: <@{p1}> vs <@{p2}>\nReportar resultado reagindo (1️⃣/2️⃣/➖).")
-                except:
-                    pass
-        await send_result_poll(pid, pairing)
+            async def notify(uid=uid, pid=pid, pairing=pairing, content=content, p1=p1, p2=p2):
+                u = await safe_fetch_user(uid)
+                if not u:
+                    raise LookupError("usuário não encontrado")
+                await u.send(f"🏁 Rodada {round_no} — Confronto: <@{p1}> vs <@{p2}>\nReportar resultado reagindo (1️⃣/2️⃣/➖).")
+                await send_result_poll_to(u, pid, pairing, content)
+            jobs.append((uid, notify))
+    failures = await dm_fanout(jobs)
+    await report_fanout(f"Rodada {round_no}", len(jobs), failures)
 
 # ---------------- SEND RESULT POLL ----------------
-async def send_result_poll(match_id: str, partida: dict):
-    p1 = partida["player1"]; p2 = partida["player2"]
-    content = (
-        f"⚔️ Partida: <@{p1}> vs <@{p2}>\n\n"
+def h2h_line(p1: int, p2: int) -> str:
+    w, l, t = h2h.get(p1, p2)
+    if not (w or l or t):
+        return f"📊 Primeiro confronto entre <@{p1}> e <@{p2}>."
+    return f"📊 Confronto direto: <@{p1}> {w} x {l} <@{p2}>" + (f" ({t} empate(s))" if t else "")
+
+def result_poll_content(p1: int, p2: int) -> str:
+    return (
+        f"⚔️ Partida: <@{p1}> vs <@{p2}>\n"
+        f"{h2h_line(p1, p2)}\n\n"
         f"Quem venceu? Reaja:\n"
         f"{EMOJI_ONE} — <@{p1}>\n"
         f"{EMOJI_TWO} — <@{p2}>\n"
         f"{EMOJI_TIE} — Empate\n\n"
         "Resultado só será confirmado se ambos reagirem na mesma opção."
     )
-    for uid in (p1, p2):
+
+async def send_result_poll_to(u: discord.User, match_id: str, partida: dict, content: str):
+    msg = await u.send(content)
+    partida.setdefault("polls", []).append((u.id, msg.id))
+    # a flush during the fan-out must not persist the match without this poll id
+    persist.mark_dirty("torneio" if partida.get("source") == "torneio" else "partidas")
+    track_route(msg.id, "poll", POLL_TTL, match_id=match_id, uid=u.id)
+    try:
+        await msg.add_reaction(EMOJI_ONE)
+        await msg.add_reaction(EMOJI_TWO)
+        await msg.add_reaction(EMOJI_TIE)
+    except:
+        pass
+
+async def send_result_poll(match_id: str, partida: dict):
+    p1 = partida["player1"]; p2 = partida["player2"]
+    content = result_poll_content(p1, p2)
+
+    async def one(uid):
         u = await safe_fetch_user(uid)
         if not u:
-            continue
+            return
         try:
-            msg = await u.send(content)
-            try:
-                await msg.add_reaction(EMOJI_ONE)
-                await msg.add_reaction(EMOJI_TWO)
-                await msg.add_reaction(EMOJI_TIE)
-            except:
-                pass
-            partida.setdefault("polls", []).append((uid, msg.id))
-            poll_message_map[msg.id] = (match_id, uid)
+            await send_result_poll_to(u, match_id, partida, content)
         except:
             pass
 
-# ---------------- DECKLIST VALIDATION & DM HANDLING ----------------
-async def validate_decklist_text(text: str) -> (bool, int):
-    total = 0
-    for line in text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split('x', 1)
-        if len(parts) < 2:
-            parts = line.split('X', 1)
-            if len(parts) < 2:
-                # try first token
-                tok = line.split()[0]
-                try:
-                    n = int(tok)
-                    total += n
-                    continue
-                except:
-                    return False, total
-        try:
-            n = int(parts[0].strip())
-            total += n
-        except:
-            # try leading digits
-            digits = ''
-            for ch in parts[0]:
-                if ch.isdigit():
-                    digits += ch
-                else:
-                    break
-            if digits:
-                total += int(digits)
-            else:
-                return False, total
-    return (total == 51), total
+    await asyncio.gather(one(p1), one(p2))
 
+# ---------------- DECKLIST VALIDATION & DM HANDLING ----------------
 @bot.event
 async def on_message(message):
     if message.author.bot:
@@ -468,144 +984,173 @@ async def on_message(message):
         uid = message.author.id
         if uid in torneio_data.get("players", []):
             deck_text = message.content.strip()
-            ok, total = await validate_decklist_text(deck_text)
-            if not ok:
+            result = validate_decklist(deck_text, card_catalog, card_index)
+            if not result.ok:
                 try:
-                    await message.author.send(f"⚠️ Deck inválido: total encontrado = {total}. O deck precisa ter exatamente 51 cartas. Envie novamente no formato `4xOP13-113` por linha.")
+                    await message.author.send(f"⚠️ Deck inválido (total encontrado = {result.total}):\n{result.summary()}\nEnvie novamente no formato `4xOP13-113` por linha, com o líder na primeira linha.")
                 except:
                     pass
                 return
+            # names / near-miss codes were resolved: store the canonical list
+            # and show what was understood in the confirmation
+            if result.corrections:
+                deck_text = result.canonical()
+            # store the draft first, so a ✅ on the confirmation can never be
+            # overwritten by this handler and no route points at a missing deck;
+            # the text goes to the content-addressed store, the state keeps the ref
+            try:
+                ref = await asyncio.get_running_loop().run_in_executor(io_executor, storage.decks.put, deck_text)
+            except Exception as e:
+                print(Fore.RED + f"[DECKLIST] {e}")
+                try:
+                    await message.author.send("❌ Não foi possível salvar sua decklist agora. Envie novamente em instantes.")
+                except:
+                    pass
+                return
+            torneio_data.setdefault("decklists", {})[str(uid)] = ref
+            torneio_data.setdefault("deck_confirmed", {})[str(uid)] = False
+            persist.mark_dirty("torneio")
             # ask confirmation via reaction
             try:
-                confirm_msg = await message.author.send("📋 Decklist recebida. Confirma esta decklist? Reaja ✅ para confirmar ou ❌ para reenviar.")
+                note = f"\n{result.summary()}\n" if result.corrections else " "
+                confirm_msg = await message.author.send(f"📋 Decklist recebida.{note}Confirma esta decklist? Reaja ✅ para confirmar ou ❌ para reenviar.")
+                track_route(confirm_msg.id, "deck_confirm", DECK_CONFIRM_TTL, uid=uid)
                 await confirm_msg.add_reaction(EMOJI_CONFIRM)
                 await confirm_msg.add_reaction(EMOJI_DENY)
-                poll_message_map[confirm_msg.id] = ("deck_confirm", uid)
             except:
                 pass
-            # store draft
-            torneio_data.setdefault("decklists", {})[str(uid)] = deck_text
-            torneio_data.setdefault("deck_confirmed", {})[str(uid)] = False
-            save_json(TORNEIO_FILE, torneio_data)
             return
 
     await bot.process_commands(message)
 
 # ---------------- REACTIONS HANDLER ----------------
 @bot.event
-async def on_reaction_add(reaction, user):
-    if user.bot:
+@HANDLER_SECONDS.timed("on_raw_reaction_add")
+async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
+    # raw events fire even when the message is not in the message cache
+    # (DM polls after a restart); unrelated reactions cost one dict lookup
+    if bot.user and payload.user_id == bot.user.id:
         return
-    # Panel reactions
+    if payload.message_id not in router:
+        return
+    user = payload.member or await safe_fetch_user(payload.user_id)
+    if user is None or user.bot:
+        return
+    await router.dispatch(RawReaction(payload), user)
+
+async def handle_panel_reaction(reaction, user):
+    global mostrar_inscritos
+    emoji = str(reaction.emoji)
+    if emoji == EMOJI_CHECK:
+        if await fila.join(user.id):
+            QUEUE_JOINS.inc("reaction")
+            try: await user.send("✅ Você entrou na fila 1x1. Aguarde emparelhamento.")
+            except: pass
+            await atualizar_painel()
+    elif emoji == EMOJI_X:
+        if await fila.leave(user.id):
+            try: await user.send("❌ Você saiu da fila 1x1.")
+            except: pass
+            await atualizar_painel()
+    elif emoji == EMOJI_SHOW:
+        mostrar_inscritos = True
+        await atualizar_painel()
+    elif emoji == EMOJI_HIDE:
+        mostrar_inscritos = False
+        await atualizar_painel()
+    elif emoji == EMOJI_RANK:
+        await send_ranking_dm(user.id)
     try:
-        if reaction.message.id == PANEL_MESSAGE_ID:
-            emoji = str(reaction.emoji)
-            if emoji == EMOJI_CHECK:
-                if user.id not in fila:
-                    fila.append(user.id)
-                    try: await user.send("✅ Você entrou na fila 1x1. Aguarde emparelhamento.")
-                    except: pass
-                    await atualizar_painel()
-            elif emoji == EMOJI_X:
-                if user.id in fila:
-                    fila.remove(user.id)
-                    try: await user.send("❌ Você saiu da fila 1x1.")
-                    except: pass
-                    await atualizar_painel()
-            elif emoji == EMOJI_SHOW:
-                global mostrar_inscritos
-                mostrar_inscritos = True
-                await atualizar_painel()
-            elif emoji == EMOJI_HIDE:
-                mostrar_inscritos = False
-                await atualizar_painel()
-            elif emoji == EMOJI_RANK:
-                await send_ranking_dm(user.id)
-            try:
-                await reaction.remove(user)
-            except:
-                pass
-    except Exception:
+        await reaction.remove(user)
+    except:
         pass
 
-    # inscription reaction
-    try:
-        if torneio_data.get("inscription_message_id") and reaction.message.id == torneio_data.get("inscription_message_id"):
-            if str(reaction.emoji) == EMOJI_TROPHY and torneio_data.get("inscriptions_open"):
-                if user.id not in torneio_data.get("players", []):
-                    torneio_data["players"].append(user.id)
-                    torneio_data["decklists"].pop(str(user.id), None)
-                    torneio_data.setdefault("deck_confirmed", {})[str(user.id)] = False
-                    save_json(TORNEIO_FILE, torneio_data)
-                    try: await user.send("✅ Inscrição recebida! Quando o admin solicitar decklists, você será avisado por DM.")
-                    except: pass
-                    await atualizar_painel()
-                try:
-                    await reaction.remove(user)
-                except:
-                    pass
-    except Exception:
-        pass
+async def handle_inscription_reaction(reaction, user):
+    if str(reaction.emoji) == EMOJI_TROPHY and torneio_data.get("inscriptions_open"):
+        if user.id not in torneio_data.get("players", []):
+            torneio_data["players"].append(user.id)
+            torneio_data["decklists"].pop(str(user.id), None)
+            torneio_data.setdefault("deck_confirmed", {})[str(user.id)] = False
+            persist.mark_dirty("torneio")
+            try: await user.send("✅ Inscrição recebida! Quando o admin solicitar decklists, você será avisado por DM.")
+            except: pass
+            await atualizar_painel()
+        try:
+            await reaction.remove(user)
+        except:
+            pass
 
-    # deck confirm reaction
-    try:
-        mid = reaction.message.id
-        if mid in poll_message_map:
-            key = poll_message_map[mid]
-            if isinstance(key, tuple) and key[0] == "deck_confirm":
-                _, uid = key
-                if user.id != uid:
-                    try: await reaction.remove(user)
-                    except: pass
-                    return
-                emoji = str(reaction.emoji)
-                if emoji == EMOJI_CONFIRM:
-                    torneio_data.setdefault("deck_confirmed", {})[str(uid)] = True
-                    save_json(TORNEIO_FILE, torneio_data)
-                    try: await user.send("✅ Decklist confirmada. Aguarde os demais jogadores.")
-                    except: pass
-                elif emoji == EMOJI_DENY:
-                    torneio_data.setdefault("deck_confirmed", {})[str(uid)] = False
-                    torneio_data.setdefault("decklists", {}).pop(str(uid), None)
-                    save_json(TORNEIO_FILE, torneio_data)
-                    try: await user.send("🔁 Ok. Envie novamente sua decklist no formato correto.")
-                    except: pass
-                try: await reaction.remove(user)
-                except: pass
-                await check_all_decks_confirmed_and_maybe_start()
-                return
-    except Exception as e:
-        print(Fore.RED + f"[DECK CONFIRM] {e}")
+async def handle_deck_confirm(uid: int, reaction, user):
+    if user.id != uid:
+        try: await reaction.remove(user)
+        except: pass
+        return
+    emoji = str(reaction.emoji)
+    if emoji == EMOJI_CONFIRM:
+        torneio_data.setdefault("deck_confirmed", {})[str(uid)] = True
+        persist.mark_dirty("torneio")
+        try: await user.send("✅ Decklist confirmada. Aguarde os demais jogadores.")
+        except: pass
+    elif emoji == EMOJI_DENY:
+        torneio_data.setdefault("deck_confirmed", {})[str(uid)] = False
+        torneio_data.setdefault("decklists", {}).pop(str(uid), None)
+        persist.mark_dirty("torneio")
+        try: await user.send("🔁 Ok. Envie novamente sua decklist no formato correto.")
+        except: pass
+    try: await reaction.remove(user)
+    except: pass
+    await check_all_decks_confirmed_and_maybe_start()
 
-    # poll reaction (match result)
-    try:
-        emoji = str(reaction.emoji)
-        if emoji in (EMOJI_ONE, EMOJI_TWO, EMOJI_TIE):
-            msg_id = reaction.message.id
-            if msg_id in poll_message_map:
-                match_id, uid = poll_message_map[msg_id]
-                if match_id in partidas_ativas:
-                    p = partidas_ativas[match_id]
-                    if user.id != uid:
-                        try: await reaction.remove(user)
-                        except: pass
-                        return
-                    p.setdefault("attempts", {})[str(user.id)] = emoji
-                    partidas_ativas[match_id] = p
-                    await check_and_process_match_result(match_id, p)
-                elif match_id in torneio_data.get("pairings", {}):
-                    p = torneio_data["pairings"][match_id]
-                    if user.id != uid:
-                        try: await reaction.remove(user)
-                        except: pass
-                        return
-                    p.setdefault("attempts", {})[str(user.id)] = emoji
-                    torneio_data["pairings"][match_id] = p
-                    await check_and_process_torneio_result(match_id, p)
-                try: await reaction.remove(user)
-                except: pass
-    except Exception as e:
-        print(Fore.RED + f"[POLL REACT] {e}")
+async def handle_result_poll(match_id: str, uid: int, reaction, user):
+    emoji = str(reaction.emoji)
+    if emoji not in (EMOJI_ONE, EMOJI_TWO, EMOJI_TIE):
+        return
+    if match_id in partidas_ativas:
+        p = partidas_ativas[match_id]
+        check = check_and_process_match_result
+    elif match_id in torneio_data.get("pairings", {}):
+        p = torneio_data["pairings"][match_id]
+        check = check_and_process_torneio_result
+    else:
+        return
+    if user.id != uid:
+        try: await reaction.remove(user)
+        except: pass
+        return
+    p.setdefault("attempts", {})[str(user.id)] = emoji
+    persist.mark_dirty("partidas" if check is check_and_process_match_result else "torneio")
+    await check(match_id, p)
+    try: await reaction.remove(user)
+    except: pass
+
+ROUTE_FACTORIES = {
+    "poll": lambda e: functools.partial(handle_result_poll, e["match_id"], e["uid"]),
+    "deck_confirm": lambda e: functools.partial(handle_deck_confirm, e["uid"]),
+}
+
+def track_route(message_id: int, kind: str, ttl: float, **fields):
+    """Register a persisted route (survives restarts via poll_registry)."""
+    poll_registry.add(message_id, kind, ttl, **fields)
+    router.register(message_id, ROUTE_FACTORIES[kind](fields), ttl=ttl, kind=kind)
+
+def untrack_route(message_id: int):
+    router.unregister(message_id)
+    poll_registry.remove(message_id)
+
+def drop_polls(partida: dict):
+    for _, msg_id in partida.get("polls", []):
+        untrack_route(msg_id)
+
+def restore_reaction_routes():
+    if torneio_data.get("inscription_message_id"):
+        router.register(torneio_data["inscription_message_id"], handle_inscription_reaction, kind="inscricao")
+    evicted = poll_registry.purge()
+    now = time.time()
+    for mid, entry in poll_registry.entries.items():
+        factory = ROUTE_FACTORIES.get(entry.get("kind"))
+        if factory:
+            router.register(int(mid), factory(entry), ttl=entry["expires"] - now, kind=entry["kind"])
+    print(Fore.CYAN + f"[POLLS] {len(poll_registry)} enquetes restauradas ({evicted} expiradas)")
 
 # ---------------- PROCESS RESULT ----------------
 async def check_and_process_match_result(match_id: str, partida: dict):
@@ -617,6 +1162,7 @@ async def check_and_process_match_result(match_id: str, partida: dict):
             if c1 == c2:
                 await finalize_match_result(match_id, partida, c1)
             else:
+                DIVERGENT_REPORTS.inc("fila")
                 u1 = await safe_fetch_user(p1); u2 = await safe_fetch_user(p2)
                 for u in (u1, u2):
                     if u:
@@ -634,6 +1180,7 @@ async def check_and_process_torneio_result(match_id: str, partida: dict):
             if c1 == c2:
                 await finalize_torneio_result(match_id, partida, c1)
             else:
+                DIVERGENT_REPORTS.inc("torneio")
                 u1 = await safe_fetch_user(p1); u2 = await safe_fetch_user(p2)
                 for u in (u1, u2):
                     if u:
@@ -653,15 +1200,23 @@ async def finalize_match_result(match_id: str, partida: dict, emoji_choice: str)
             winner, loser = None, None
         ts = now_iso()
         if winner:
-            historico.append({"winner": winner, "loser": loser, "timestamp": ts, "match_id": match_id, "source": partida.get("source","fila")})
-            ranking.setdefault("scores_1x1", {})[str(winner)] = ranking.get("scores_1x1", {}).get(str(winner), 0) + 1
+            record = {"winner": winner, "loser": loser, "players": [p1, p2], "timestamp": ts, "match_id": match_id, "source": partida.get("source","fila")}
+            persist.mark_score("scores_1x1", winner, lb_1x1.incr(winner))
         else:
-            historico.append({"winner": None, "loser": None, "timestamp": ts, "match_id": match_id, "source": partida.get("source","fila"), "tie": True})
+            record = {"winner": None, "loser": None, "players": [p1, p2], "timestamp": ts, "match_id": match_id, "source": partida.get("source","fila"), "tie": True}
+        historico.append(record)
+        h2h.add(record)
+        RESULTS_CONFIRMED.inc("fila", "win" if winner else "tie")
+        old1, old2 = elo.rating(p1), elo.rating(p2)
+        new1, new2 = elo.update(p1, p2, 0.5 if winner is None else (1.0 if winner == p1 else 0.0))
+        persist.mark_score("elo_1x1", p1, new1)
+        persist.mark_score("elo_1x1", p2, new2)
         partidas_ativas.pop(match_id, None)
-        save_json(RANKING_FILE, ranking)
-        save_json(HISTORICO_FILE, historico)
+        persist.mark_dirty("partidas")
+        drop_polls(partida)
         u1 = await safe_fetch_user(p1); u2 = await safe_fetch_user(p2)
-        note = f"✅ Resultado confirmado: {'Empate' if winner is None else f'<@{winner}> venceu <@{loser}>'} (match {match_id})"
+        note = (f"✅ Resultado confirmado: {'Empate' if winner is None else f'<@{winner}> venceu <@{loser}>'} (match {match_id})\n"
+                f"📈 Elo: <@{p1}> {new1} ({new1 - old1:+d}) | <@{p2}> {new2} ({new2 - old2:+d})")
         for u in (u1, u2):
             if u:
                 try: await u.send(note)
@@ -681,13 +1236,23 @@ async def finalize_torneio_result(match_id: str, partida: dict, emoji_choice: st
             winner, loser = None, None
         ts = now_iso()
         if winner:
-            historico.append({"winner": winner, "loser": loser, "timestamp": ts, "match_id": match_id, "source": "torneio"})
-            torneio_data.setdefault("scores", {})[str(winner)] = torneio_data.get("scores", {}).get(str(winner), 0) + 1
+            record = {"winner": winner, "loser": loser, "players": [p1, p2], "timestamp": ts, "match_id": match_id, "source": "torneio"}
         else:
-            historico.append({"winner": None, "loser": None, "timestamp": ts, "match_id": match_id, "source": "torneio", "tie": True})
+            record = {"winner": None, "loser": None, "players": [p1, p2], "timestamp": ts, "match_id": match_id, "source": "torneio", "tie": True}
+        # event + deck refs feed the metagame report
+        decks = torneio_data.get("decklists", {})
+        if torneio_data.get("event_id") and str(p1) in decks and str(p2) in decks:
+            record["event"] = torneio_data["event_id"]
+            record["decks"] = {str(p1): decks[str(p1)], str(p2): decks[str(p2)]}
+        historico.append(record)
+        metagame.ingest(record)
+        h2h.add(record)
+        RESULTS_CONFIRMED.inc("torneio", "win" if winner else "tie")
+        # scores, opponents and tiebreakers in one incremental update
+        standings.record_result(p1, p2, winner)
         torneio_data.get("pairings", {}).pop(match_id, None)
-        save_json(TORNEIO_FILE, torneio_data)
-        save_json(HISTORICO_FILE, historico)
+        drop_polls(partida)
+        persist.mark_dirty("torneio")
         u1 = await safe_fetch_user(p1); u2 = await safe_fetch_user(p2)
         note = f"✅ Resultado confirmado: {'Empate' if winner is None else f'<@{winner}> venceu <@{loser}>'} (match {match_id})"
         for u in (u1, u2):
@@ -699,6 +1264,14 @@ async def finalize_torneio_result(match_id: str, partida: dict, emoji_choice: st
         print(Fore.RED + f"[FINALIZE TORNEIO] {e}")
 
 # ---------------- CHECK ALL DECKS CONFIRMED & MAYBE START ----------------
+def write_decklist_export(refs: dict, path: Path) -> Path:
+    """Runs on io_executor: validate each distinct deck once, then stream the archive."""
+    checks = validate_many({ref: storage.decks.get(ref) for ref in set(refs.values()) if ref}, card_catalog, card_index)
+    entries = ((uid, f"Player: {uid}\nDiscord: <@{uid}>\nValidação:\n"
+                     f"{checks[ref].summary() if ref else 'sem decklist'}\nDecklist:\n", ref)
+               for uid, ref in refs.items())
+    return export_decklists(storage.decks, path, entries)
+
 async def check_all_decks_confirmed_and_maybe_start():
     if not torneio_data.get("inscriptions_open") and torneio_data.get("players") and not torneio_data.get("active"):
         players = torneio_data.get("players", [])
@@ -709,17 +1282,13 @@ async def check_all_decks_confirmed_and_maybe_start():
                 all_confirmed = False
                 break
         if all_confirmed:
-            # create combined decklist file and send to owner
-            combined = []
-            for uid in players:
-                dl = torneio_data["decklists"].get(str(uid), "")
-                combined.append(f"Player: {uid}\nDiscord: <@{uid}>\nDecklist:\n{dl}\n\n---\n\n")
-            combined_text = "".join(combined)
-            combined_path = DECKLIST_PATH / f"decklists_{int(datetime.datetime.utcnow().timestamp())}.txt"
+            # stream every decklist into one archive and send it to the owner
+            refs = {str(uid): torneio_data["decklists"].get(str(uid), "") for uid in players}
+            combined_path = DECKLIST_PATH / f"decklists_{int(datetime.datetime.utcnow().timestamp())}.zip"
             try:
-                combined_path.write_text(combined_text, encoding="utf-8")
-            except:
-                pass
+                await asyncio.get_running_loop().run_in_executor(io_executor, write_decklist_export, refs, combined_path)
+            except Exception as e:
+                print(Fore.RED + f"[DECKLIST EXPORT] {e}")
             owner = await safe_fetch_user(BOT_OWNER)
             if owner:
                 try:
@@ -731,13 +1300,17 @@ async def check_all_decks_confirmed_and_maybe_start():
                         pass
             # start tournament
             torneio_data["active"] = True
+            torneio_data["event_id"] = now_iso()
             torneio_data["rounds_target"] = calcular_rodadas(len(players))
             torneio_data["round"] = 1
             torneio_data["scores"] = {str(u): 0 for u in players}
             torneio_data["byes"] = []
+            torneio_data["bye_history"] = []
             torneio_data["played"] = {str(u): [] for u in players}
+            torneio_data["records"] = {}
+            standings.rebuild()
             await gerar_pairings_torneio()
-            save_json(TORNEIO_FILE, torneio_data)
+            persist.mark_dirty("torneio")
             await dm_pairings_round()
             ch = bot.get_channel(PANEL_CHANNEL_ID)
             if ch:
@@ -768,7 +1341,8 @@ async def cmd_novopainel(ctx):
             try: await msg.delete()
             except: pass
     PANEL_MESSAGE_ID = 0
-    await atualizar_painel()
+    panel.reset()
+    await atualizar_painel(now=True)
     try:
         await ctx.send("✅ Painel recriado com sucesso.", delete_after=5)
         await ctx.message.delete()
@@ -791,7 +1365,8 @@ async def cmd_torneio_open(ctx):
     try: await msg.add_reaction(EMOJI_TROPHY)
     except: pass
     torneio_data["inscription_message_id"] = msg.id
-    save_json(TORNEIO_FILE, torneio_data)
+    router.register(msg.id, handle_inscription_reaction, kind="inscricao")
+    persist.mark_dirty("torneio")
     await atualizar_painel()
     try: await ctx.message.delete()
     except: pass
@@ -804,7 +1379,7 @@ async def cmd_fecharinscricoes(ctx):
         await ctx.send("❌ Apenas o dono pode fechar inscrições.", delete_after=5)
         return
     torneio_data["inscriptions_open"] = False
-    save_json(TORNEIO_FILE, torneio_data)
+    persist.mark_dirty("torneio")
     await ctx.send(f"🔒 Inscrições fechadas. Jogadores inscritos: {len(torneio_data.get('players', []))}", delete_after=8)
     await atualizar_painel()
     try: await ctx.message.delete()
@@ -824,7 +1399,7 @@ async def cmd_comecar_torneio(ctx):
         await ctx.send("❌ Jogadores insuficientes (mínimo 2).", delete_after=5)
         return
     torneio_data["inscriptions_open"] = False
-    save_json(TORNEIO_FILE, torneio_data)
+    persist.mark_dirty("torneio")
     for uid in players:
         u = await safe_fetch_user(uid)
         if not u:
@@ -835,12 +1410,12 @@ async def cmd_comecar_torneio(ctx):
         elif str(uid) in torneio_data.get("decklists", {}):
             try:
                 msg = await u.send("✅ Decklist já recebida. Confirma esta decklist? Reaja ✅ para confirmar ou ❌ para reenviar.")
+                track_route(msg.id, "deck_confirm", DECK_CONFIRM_TTL, uid=uid)
                 await msg.add_reaction(EMOJI_CONFIRM); await msg.add_reaction(EMOJI_DENY)
-                poll_message_map[msg.id] = ("deck_confirm", uid)
             except: pass
         else:
             try:
-                await u.send("✏️ Envie sua decklist aqui (formato ex: `4xOP13-113`) — o bot validará se totaliza 51 cartas e pedirá confirmação.")
+                await u.send("✏️ Envie sua decklist aqui (formato ex: `4xOP13-113`, líder na primeira linha) — o bot validará líder, 50 cartas, limite de 4 cópias e cores e pedirá confirmação.")
             except: pass
     await ctx.send("📨 Solicitações de decklist enviadas por DM. O torneio só iniciará quando todos confirmarem, ou o admin pode forçar.", delete_after=8)
     await atualizar_painel()
@@ -859,7 +1434,9 @@ async def cmd_remover_jogador(ctx, member: discord.Member):
         torneio_data["players"].remove(uid)
         torneio_data.get("decklists", {}).pop(str(uid), None)
         torneio_data.get("deck_confirmed", {}).pop(str(uid), None)
-        save_json(TORNEIO_FILE, torneio_data)
+        # the cached table still lists the removed player
+        standings.rebuild()
+        persist.mark_dirty("torneio")
         await ctx.send(f"✅ Jogador <@{uid}> removido do torneio.", delete_after=6)
         await atualizar_painel()
     else:
@@ -881,13 +1458,17 @@ async def cmd_forcar_rodada(ctx):
         except: pass
         return
     torneio_data["active"] = True
+    torneio_data["event_id"] = now_iso()
     torneio_data["rounds_target"] = calcular_rodadas(len(players))
     torneio_data["round"] = torneio_data.get("round", 1)
     torneio_data["scores"] = {str(u): 0 for u in players}
     torneio_data["byes"] = []
+    torneio_data["bye_history"] = []
     torneio_data["played"] = {str(u): [] for u in players}
+    torneio_data["records"] = {}
+    standings.rebuild()
     await gerar_pairings_torneio()
-    save_json(TORNEIO_FILE, torneio_data)
+    persist.mark_dirty("torneio")
     await dm_pairings_round()
     await ctx.send("⚠️ Início forçado: rodada iniciada apesar de decklists pendentes.", delete_after=8)
     await atualizar_painel()
@@ -904,9 +1485,10 @@ async def cmd_cancelar_torneio(ctx):
     torneio_data.update({
         "active": False, "inscriptions_open": False, "players": [], "decklists": {},
         "deck_confirmed": {}, "round": 0, "rounds_target": None, "pairings": {},
-        "scores": {}, "played": {}, "byes": [], "finished": False, "inscription_message_id": 0
+        "scores": {}, "played": {}, "byes": [], "bye_history": [], "records": {}, "finished": False, "inscription_message_id": 0
     })
-    save_json(TORNEIO_FILE, torneio_data)
+    standings.rebuild()
+    persist.mark_dirty("torneio")
     await ctx.send("✅ Torneio cancelado e resetado (nenhum campeão registrado).", delete_after=8)
     await atualizar_painel()
     try: await ctx.message.delete()
@@ -925,18 +1507,19 @@ async def cmd_encerrar(ctx):
         await ctx.send("❌ Nenhum torneio ativo.", delete_after=5)
         return
     scores = torneio_data.get("scores", {})
-    if not scores:
+    lead = standings.leader()
+    if not scores or lead is None:
         try: await ctx.message.delete()
         except: pass
         await ctx.send("❌ Nenhum resultado registrado.", delete_after=5)
         return
-    champ_id, champ_score = max(scores.items(), key=lambda kv: kv[1])
+    champ_id, champ_score = lead["uid"], lead["points"]
     torneio_data.setdefault("tournament_champions", {})[str(champ_id)] = torneio_data.get("tournament_champions", {}).get(str(champ_id), 0) + 1
-    ranking.setdefault("scores_torneio", {})[str(champ_id)] = ranking.get("scores_torneio", {}).get(str(champ_id), 0) + 1
+    lb_torneio.incr(champ_id)
     torneio_data["active"] = False
     torneio_data["finished"] = True
-    save_json(RANKING_FILE, ranking)
-    save_json(TORNEIO_FILE, torneio_data)
+    persist.mark_dirty("ranking")
+    persist.mark_dirty("torneio")
     ch = bot.get_channel(PANEL_CHANNEL_ID)
     if ch:
         await ch.send(f"🏆 Torneio encerrado pelo admin. Campeão: <@{champ_id}> com {champ_score} pontos. Parabéns!")
@@ -964,10 +1547,11 @@ async def cmd_proxima_rodada(ctx):
         torneio_data["active"] = False
         torneio_data["finished"] = True
         scores = torneio_data.get("scores", {})
-        if scores:
-            champion_id, champ_score = max(scores.items(), key=lambda kv: kv[1])
+        lead = standings.leader()
+        if scores and lead is not None:
+            champion_id, champ_score = lead["uid"], lead["points"]
             torneio_data.setdefault("tournament_champions", {})[str(champion_id)] = torneio_data.get("tournament_champions", {}).get(str(champion_id), 0) + 1
-            ranking.setdefault("scores_torneio", {})[str(champion_id)] = ranking.get("scores_torneio", {}).get(str(champion_id), 0) + 1
+            lb_torneio.incr(champion_id)
             ch = bot.get_channel(PANEL_CHANNEL_ID)
             if ch:
                 await ch.send(f"🏆 Torneio finalizado! Campeão: <@{champion_id}> com {champ_score} pontos. Parabéns!")
@@ -975,16 +1559,15 @@ async def cmd_proxima_rodada(ctx):
             if owner:
                 try: await owner.send(f"🏆 Torneio finalizado! Campeão: <@{champion_id}> — {champ_score} pts.")
                 except: pass
-        save_json(RANKING_FILE, ranking)
-        save_json(TORNEIO_FILE, torneio_data)
+        persist.mark_dirty("ranking")
+        persist.mark_dirty("torneio")
         await atualizar_painel()
         try: await ctx.message.delete()
         except: pass
         return
     torneio_data["round"] += 1
-    torneio_data["byes"] = []
     await gerar_pairings_torneio()
-    save_json(TORNEIO_FILE, torneio_data)
+    persist.mark_dirty("torneio")
     await dm_pairings_round()
     await ctx.send(f"➡️ Avançado para rodada {torneio_data['round']} — pairings enviados por DM.", delete_after=8)
     await atualizar_painel()
@@ -1001,9 +1584,10 @@ async def cmd_reset_torneio(ctx):
     torneio_data.update({
         "active": False, "inscriptions_open": False, "players": [], "decklists": {},
         "deck_confirmed": {}, "round": 0, "rounds_target": None, "pairings": {},
-        "results": {}, "scores": {}, "played": {}, "byes": [], "finished": False, "inscription_message_id": 0
+        "results": {}, "scores": {}, "played": {}, "byes": [], "bye_history": [], "records": {}, "finished": False, "inscription_message_id": 0
     })
-    save_json(TORNEIO_FILE, torneio_data)
+    standings.rebuild()
+    persist.mark_dirty("torneio")
     await ctx.send("✅ Torneio resetado (sem registrar campeão).", delete_after=6)
     await atualizar_painel()
     try: await ctx.message.delete()
@@ -1017,10 +1601,16 @@ async def cmd_reset_ranking(ctx, scope: str = "1x1"):
         await ctx.send("❌ Apenas o dono pode resetar rankings.", delete_after=5)
         return
     if scope.lower() in ("1x1", "fila", "1x"):
-        ranking["scores_1x1"] = {}
-        ranking["__last_reset"] = datetime.datetime.utcnow().isoformat()
-        save_json(RANKING_FILE, ranking)
-        await ctx.send("🔄 Ranking 1x1 resetado manualmente.", delete_after=6)
+        now = datetime.datetime.utcnow()
+        try:
+            entry = await close_season("1x1", season_label())
+        except Exception as e:
+            print(Fore.RED + f"[SEASON] {e}")
+            await ctx.send("❌ Não foi possível arquivar a temporada; ranking mantido.", delete_after=6)
+        else:
+            ranking["__last_reset"] = now.isoformat()
+            persist.mark_dirty("ranking")
+            await ctx.send("🔄 Ranking 1x1 resetado manualmente." + season_note(entry), delete_after=6)
     else:
         await ctx.send("Uso: `!resetranking 1x1`", delete_after=6)
     try: await ctx.message.delete()
@@ -1033,9 +1623,13 @@ async def cmd_reset_torneio_ranking(ctx):
         except: pass
         await ctx.send("❌ Apenas o dono pode resetar ranking de torneio.", delete_after=5)
         return
-    ranking["scores_torneio"] = {}
-    save_json(RANKING_FILE, ranking)
-    await ctx.send("🔄 Ranking de torneios resetado manualmente.", delete_after=6)
+    try:
+        entry = await close_season("torneio", season_label())
+    except Exception as e:
+        print(Fore.RED + f"[SEASON] {e}")
+        await ctx.send("❌ Não foi possível arquivar a temporada; ranking mantido.", delete_after=6)
+    else:
+        await ctx.send("🔄 Ranking de torneios resetado manualmente." + season_note(entry), delete_after=6)
     try: await ctx.message.delete()
     except: pass
 
@@ -1053,6 +1647,11 @@ async def cmd_ajuda(ctx):
         "Jogadores:\n"
         "• Reaja no painel com ✅ para entrar / ❌ para sair da fila 1x1\n"
         "• !cancelarpartida — solicita cancelamento da sua partida atual (confirmar via DM)\n"
+        "• !historico [@user] — suas partidas (ou de outro jogador), com ⬅️/➡️ para paginar\n"
+        "• !confronto @user [@user2] — placar de confronto direto entre dois jogadores\n"
+        "• !temporadas [1x1|torneio] / !temporada <id> — rankings de temporadas anteriores\n"
+        "• !geral [@user] — vitórias e campeonatos somando todas as temporadas\n"
+        "• !meta — líderes mais usados, confrontos e cartas mais jogadas nos torneios\n"
         "• As partidas enviam DM com reações 1️⃣/2️⃣/➖ para reportar resultado\n\n"
         "Admin:\n"
         "• !torneio — abrir inscrições\n"
@@ -1063,40 +1662,47 @@ async def cmd_ajuda(ctx):
         "• !cancelartorneio — cancela torneio imediatamente\n"
         "• !encerrar — encerra torneio na rodada atual e declara campeão\n"
         "• !proximarodada — avança rodada (admin)\n"
-        "• !resetranking 1x1 — reset manual ranking 1x1\n"
-        "• !torneiorankreset — reset manual ranking torneio\n"
+        "• !lag — atraso do event loop e últimos travamentos (com o ponto do código)\n"
+        "• !agenda — próximas tarefas agendadas (reset mensal, lembretes de rodada)\n"
+        "• !resetranking 1x1 — encerra a temporada 1x1 (arquivada) e zera o ranking\n"
+        "• !torneiorankreset — encerra a temporada de torneios (arquivada) e zera o ranking\n"
     )
     await ctx.send(help_text, delete_after=15)
     try: await ctx.message.delete()
     except: pass
 
 # ---------------- RANKING DM FLOW ----------------
+# row formatters are module-level so Leaderboard.render can cache by them
+def _line_1x1(i, u, pts):
+    return f"{i}. <@{u}> — {pts} vitórias"
+
+def _line_torneio(i, u, wins):
+    return f"{i}. <@{u}> — {wins} campeonatos"
+
+def ranking_text_1x1() -> str:
+    return lb_1x1.render("🏅 **Ranking 1x1** 🏅\n", _line_1x1, "Nenhuma partida registrada ainda.")
+
+def ranking_text_torneio() -> str:
+    return lb_torneio.render("🏆 **Ranking de Torneios (campeões)** 🏆\n", _line_torneio, "Nenhum campeão registrado ainda.")
+
+def my_position(lb: Leaderboard, uid: int, unit: str) -> str:
+    pos = lb.rank(uid)
+    if pos is None:
+        return "Você ainda não está no ranking."
+    return f"📍 Sua posição: #{pos} de {len(lb)} — {lb.points(uid)} {unit}"
+
 async def send_ranking_dm(uid: int):
     user = await safe_fetch_user(uid)
     if not user:
         return
     try:
-        s_1x1 = sorted(ranking.get("scores_1x1", {}).items(), key=lambda kv: kv[1], reverse=True)
-        lines = ["🏅 **Ranking 1x1** 🏅\n"]
-        for i, (u, pts) in enumerate(s_1x1[:20], 1):
-            lines.append(f"{i}. <@{u}> — {pts} vitórias")
-        if not s_1x1:
-            lines.append("Nenhuma partida registrada ainda.")
-        dm = await user.send("\n".join(lines))
+        dm = await user.send(ranking_text_1x1() + "\n\n" + my_position(lb_1x1, uid, "vitórias"))
         ask_msg = await user.send("Deseja visualizar também o ranking de torneios? Reaja com ➡️ para sim ou ❌ para não.")
+        answer = router.expect(ask_msg.id, uid, (EMOJI_YES, EMOJI_NO), timeout=60)
         await ask_msg.add_reaction(EMOJI_YES); await ask_msg.add_reaction(EMOJI_NO)
-        def check(reaction, usr):
-            return usr.id == uid and reaction.message.id == ask_msg.id and str(reaction.emoji) in (EMOJI_YES, EMOJI_NO)
         try:
-            reaction, usr = await bot.wait_for("reaction_add", check=check, timeout=60)
-            if str(reaction.emoji) == EMOJI_YES:
-                s_t = sorted(ranking.get("scores_torneio", {}).items(), key=lambda kv: kv[1], reverse=True)
-                lines2 = ["🏆 **Ranking de Torneios (campeões)** 🏆\n"]
-                for i, (u, wins) in enumerate(s_t[:20], 1):
-                    lines2.append(f"{i}. <@{u}> — {wins} campeonatos")
-                if not s_t:
-                    lines2.append("Nenhum campeão registrado ainda.")
-                await user.send("\n".join(lines2))
+            if await answer == EMOJI_YES:
+                await user.send(ranking_text_torneio() + "\n\n" + my_position(lb_torneio, uid, "campeonatos"))
             else:
                 await user.send("👍 Ok, não exibirei o ranking de torneios.")
         except asyncio.TimeoutError:
@@ -1104,6 +1710,173 @@ async def send_ranking_dm(uid: int):
     except Exception as e:
         print(Fore.RED + f"[RANK DM] {e}")
 
+# ---------------- HISTÓRICO POR JOGADOR ----------------
+HISTORY_PAGE = 10
+HISTORY_TTL = 300
+
+async def history_page_text(uid: int, page: int):
+    # per-player index: only this player's records are read
+    total = historico.count_for_player(uid)
+    pages = max(1, -(-total // HISTORY_PAGE))
+    page = min(max(page, 0), pages - 1)
+    lines = [f"📜 **Histórico de <@{uid}>** — {total} partida(s) | página {page + 1}/{pages}\n"]
+    for r in await player_history(uid, HISTORY_PAGE, page * HISTORY_PAGE):
+        opp = next((p for p in record_players(r) if p != uid), None)
+        if r.get("tie"):
+            res = "➖ empatou com"
+        elif r.get("winner") == uid:
+            res = "✅ venceu"
+        else:
+            res = "❌ perdeu para"
+        lines.append(f"`{(r.get('timestamp') or '')[:10]}` {res} <@{opp}> ({r.get('source', 'fila')})")
+    if not total:
+        lines.append("Nenhuma partida registrada.")
+    return "\n".join(lines), page, pages
+
+async def handle_history_page(state: dict, reaction, user):
+    emoji = str(reaction.emoji)
+    try: await reaction.remove(user)
+    except: pass
+    if user.id != state["viewer"] or emoji not in (EMOJI_PREV, EMOJI_NEXT):
+        return
+    text, page, _ = await history_page_text(state["uid"], state["page"] + (1 if emoji == EMOJI_NEXT else -1))
+    if page == state["page"]:
+        return
+    state["page"] = page
+    try: await state["msg"].edit(content=text)
+    except: pass
+
+@bot.command(name="historico")
+async def cmd_historico(ctx, member: discord.Member = None):
+    uid = (member or ctx.author).id
+    text, page, pages = await history_page_text(uid, 0)
+    msg = await ctx.send(text, delete_after=HISTORY_TTL)
+    if pages > 1:
+        state = {"uid": uid, "viewer": ctx.author.id, "page": page, "msg": msg}
+        router.register(msg.id, functools.partial(handle_history_page, state), ttl=HISTORY_TTL, kind="historico")
+        try:
+            await msg.add_reaction(EMOJI_PREV); await msg.add_reaction(EMOJI_NEXT)
+        except: pass
+    try: await ctx.message.delete()
+    except: pass
+
+@bot.command(name="lag")
+async def cmd_lag(ctx):
+    if ctx.author.id != BOT_OWNER:
+        await ctx.send("❌ Apenas o dono pode ver o diagnóstico do loop.", delete_after=5)
+    else:
+        s = loop_watch.summary()
+        lines = [f"⏱️ **Event loop** — últimos {s['window']:.0f}s ({s['samples']} amostras)",
+                 f"p50 {s['p50_ms']} ms | p95 {s['p95_ms']} ms | p99 {s['p99_ms']} ms | máx {s['max_ms']} ms",
+                 f"Acima de {s['threshold_ms']} ms: {s['over_threshold']} amostra(s) | travamentos registrados: {s['stalls']}"]
+        for st in list(loop_watch.stalls)[-5:]:
+            at = datetime.datetime.fromtimestamp(st["at"], datetime.timezone.utc).strftime("%d/%m %H:%M:%S")
+            lines.append(f"• {at} UTC — {st['lag'] * 1000:.0f} ms em `{where(st['stack'])}`")
+        await ctx.send("\n".join(lines), delete_after=60)
+    try: await ctx.message.delete()
+    except: pass
+
+@bot.command(name="agenda")
+async def cmd_agenda(ctx):
+    if ctx.author.id != BOT_OWNER:
+        await ctx.send("❌ Apenas o dono pode ver a agenda.", delete_after=5)
+    else:
+        lines = ["🗓️ **Agenda** (America/Sao_Paulo)"]
+        for name in sorted(agenda.jobs, key=lambda n: agenda.jobs[n]["at"]):
+            lines.append(f"• `{name}` — {agenda.next_run(name).strftime('%d/%m/%Y %H:%M')}")
+        if len(lines) == 1:
+            lines.append("Nenhuma tarefa agendada.")
+        await ctx.send("\n".join(lines), delete_after=30)
+    try: await ctx.message.delete()
+    except: pass
+
+# ---------------- TEMPORADAS ----------------
+SEASON_LIST = 10
+SEASON_TOP = 20
+
+def season_scope(arg: str) -> Optional[str]:
+    arg = (arg or "").lower()
+    if arg in ("1x1", "fila", "1x"):
+        return "1x1"
+    if arg in ("torneio", "torneios"):
+        return "torneio"
+    return None
+
+@bot.command(name="temporadas")
+async def cmd_temporadas(ctx, scope: str = "1x1"):
+    # the index alone answers this; no snapshot is opened
+    key = season_scope(scope)
+    if key is None:
+        await ctx.send("Uso: `!temporadas [1x1|torneio]`", delete_after=6)
+    else:
+        entries = seasons.seasons(key)
+        lines = [f"🗂️ **Temporadas anteriores — {key}** ({len(entries)})\n"]
+        for e in entries[:SEASON_LIST]:
+            podium = " ".join(f"{'🥇🥈🥉'[r - 1] if r <= 3 else r}<@{u}> {p}" for u, p, r in e["podium"])
+            lines.append(f"• `{e['id']}` — {e['players']} jogadores | {podium}")
+        if not entries:
+            lines.append("Nenhuma temporada arquivada ainda.")
+        else:
+            lines.append("\nDetalhes: `!temporada <id>`")
+        await ctx.send("\n".join(lines)[:2000], delete_after=60)
+    try: await ctx.message.delete()
+    except: pass
+
+@bot.command(name="temporada")
+async def cmd_temporada(ctx, season_id: str):
+    entry = seasons.get(season_id)
+    if entry is None:
+        await ctx.send("❌ Temporada não encontrada. Veja `!temporadas`.", delete_after=6)
+    else:
+        try:
+            # only this season's snapshot is read, off the event loop
+            rows = await asyncio.get_running_loop().run_in_executor(io_executor, seasons.standings, season_id)
+            unit = "vitórias" if entry["scope"] == "1x1" else "campeonatos"
+            lines = [f"🗂️ **Temporada `{entry['id']}`** — {entry['players']} jogadores\n"]
+            lines += [f"{r}. <@{u}> — {p} {unit}" for u, p, r in rows[:SEASON_TOP]]
+            mine = next((row for row in rows if row[0] == str(ctx.author.id)), None)
+            if mine:
+                lines.append(f"\nSua posição: {mine[2]}º com {mine[1]} {unit}")
+            await ctx.send("\n".join(lines)[:2000], delete_after=60)
+        except Exception as e:
+            print(Fore.RED + f"[SEASON] {e}")
+            await ctx.send("❌ Não foi possível ler a temporada.", delete_after=6)
+    try: await ctx.message.delete()
+    except: pass
+
+@bot.command(name="geral")
+async def cmd_geral(ctx, member: discord.Member = None):
+    # closed seasons come from the precomputed rollups, the open one from the leaderboard
+    uid = (member or ctx.author).id
+    lines = [f"🏛️ **Histórico geral de <@{uid}>**\n"]
+    # lb_torneio counts tournaments won, one per championship
+    for key, label, unit in (("1x1", "1x1", "vitórias"), ("torneio", "Torneios", "campeonatos")):
+        row = seasons.alltime(key, uid) or [0, 0, 0, None]
+        current = SEASON_SCOPES[key].points(uid)
+        best = f"{row[BEST]}º" if row[BEST] else "—"
+        lines.append(f"**{label}:** {row[TOTAL] + current} {unit} no total ({current} na temporada atual) | "
+                     f"{row[PLAYED]} temporada(s) encerrada(s) | {row[TITLES]} temporada(s) em 1º | melhor posição: {best}")
+    await ctx.send("\n".join(lines), delete_after=30)
+    try: await ctx.message.delete()
+    except: pass
+
+# ---------------- CONFRONTO DIRETO ----------------
+@bot.command(name="confronto")
+async def cmd_confronto(ctx, member: discord.Member, other: discord.Member = None):
+    # pairwise aggregate kept up to date on every confirmed result
+    a, b = (member, other) if other else (ctx.author, member)
+    if a.id == b.id:
+        await ctx.send("❌ Escolha dois jogadores diferentes.", delete_after=6)
+    else:
+        w, l, t = h2h.get(a.id, b.id)
+        total = w + l + t
+        text = h2h_line(a.id, b.id)
+        if total:
+            text += f" — {total} partida(s), {w / total * 100:.0f}% de vitórias de <@{a.id}>"
+        await ctx.send(text, delete_after=30)
+    try: await ctx.message.delete()
+    except: pass
+
 # ---------------- CANCELAR PARTIDA (sem match_id) ----------------
 @bot.command(name="cancelarpartida")
 async def cmd_cancelar_partida(ctx):
@@ -1122,12 +1895,11 @@ async def cmd_cancelar_partida(ctx):
         except: pass
         return
     confirm_msg = await ctx.send(f"⚠️ Tem certeza que deseja solicitar cancelamento da sua partida atual? Reaja {EMOJI_YES} para confirmar ou {EMOJI_NO} para cancelar.")
+    answer = router.expect(confirm_msg.id, uid, (EMOJI_YES, EMOJI_NO), timeout=30)
     try: await confirm_msg.add_reaction(EMOJI_YES); await confirm_msg.add_reaction(EMOJI_NO)
     except: pass
-    def check_self(reaction, user): return user.id == uid and reaction.message.id == confirm_msg.id and str(reaction.emoji) in (EMOJI_YES, EMOJI_NO)
     try:
-        reaction, user = await bot.wait_for("reaction_add", check=check_self, timeout=30)
-        if str(reaction.emoji) == EMOJI_NO:
+        if await answer == EMOJI_NO:
             await ctx.send("✋ Pedido de cancelamento abortado.", delete_after=6)
             try: await ctx.message.delete()
             except: pass
@@ -1148,21 +1920,22 @@ async def cmd_cancelar_partida(ctx):
         return
     try:
         dm = await op_user.send(f"⚠️ <@{uid}> solicitou cancelar a partida. Reaja com {EMOJI_YES} para confirmar o cancelamento, ou {EMOJI_NO} para negar.")
-        await dm.add_reaction(EMOJI_YES); await dm.add_reaction(EMOJI_NO)
-        poll_message_map[dm.id] = ("cancel_ack", (found_mid, uid))
     except:
         await ctx.send("❌ Falha ao enviar DM ao adversário.", delete_after=6)
         try: await ctx.message.delete()
         except: pass
         return
-    def check_op(reaction, user): return user.id == opponent and reaction.message.id == dm.id and str(reaction.emoji) in (EMOJI_YES, EMOJI_NO)
+    answer = router.expect(dm.id, opponent, (EMOJI_YES, EMOJI_NO), timeout=60)
+    try: await dm.add_reaction(EMOJI_YES); await dm.add_reaction(EMOJI_NO)
+    except: pass
     try:
-        reaction, user = await bot.wait_for("reaction_add", check=check_op, timeout=60)
-        if str(reaction.emoji) == EMOJI_YES:
+        if await answer == EMOJI_YES:
             partidas_ativas.pop(found_mid, None)
+            persist.mark_dirty("partidas")
+            drop_polls(partida)
             if found_mid in torneio_data.get("pairings", {}):
                 torneio_data["pairings"].pop(found_mid, None)
-            save_json(TORNEIO_FILE, torneio_data)
+            persist.mark_dirty("torneio")
             await ctx.send("✅ Partida cancelada por acordo entre os jogadores.", delete_after=6)
             p1u = await safe_fetch_user(partida["player1"]); p2u = await safe_fetch_user(partida["player2"])
             for u in (p1u, p2u):
@@ -1190,14 +1963,30 @@ async def cmd_statustorneio(ctx):
         txt += f"{pid}: <@{p['player1']}> vs <@{p['player2']}> — {p.get('result') or 'Pendente'}\n"
     if torneio_data.get("byes"):
         txt += "\nByes: " + ", ".join([f"<@{u}>" for u in torneio_data["byes"]]) + "\n"
-    await ctx.send(txt, delete_after=20)
+    txt += "\nClassificação (pts | V-D-E | OMW% | Buchholz):\n"
+    for i, r in enumerate(standings.table()[:16], 1):
+        txt += f"{i}. <@{r['uid']}> — {r['points']} | {r['w']}-{r['l']}-{r['t']} | {r['omw'] * 100:.1f}% | {r['buchholz']}\n"
+    await ctx.send(txt[:2000], delete_after=20)
+    try: await ctx.message.delete()
+    except: pass
+
+@bot.command(name="meta")
+async def cmd_meta(ctx):
+    # the report is cached until the next tournament result; a rebuild
+    # (and the first parse of new decks) runs off the event loop
+    try:
+        report = await asyncio.get_running_loop().run_in_executor(io_executor, metagame.report)
+        await ctx.send(format_report(report)[:2000], delete_after=60)
+    except Exception as e:
+        print(Fore.RED + f"[META] {e}")
+        await ctx.send("❌ Não foi possível gerar o relatório de metagame.", delete_after=6)
     try: await ctx.message.delete()
     except: pass
 
 # ---------------- ON_READY ----------------
 @bot.event
 async def on_ready():
-    await atualizar_painel()
+    await atualizar_painel(now=True)
     print(Fore.GREEN + f"[READY] {bot.user} (id: {bot.user.id})")
 
 # ---------------- AUTO-DELETE: apagar apenas a mensagem do usuário ao usar comando ----------------
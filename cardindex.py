@@ -0,0 +1,287 @@
+# cardindex.py — OPTCG Sorocaba — busca de cartas
+#
+# Índice pré-construído sobre o catálogo local para resolver o que o jogador
+# digita na decklist: códigos quase certos (`op13 113`, `0P13-113`,
+# `OP13-11`) e nomes com erro de digitação ou incompletos (`trafalgar lw`,
+# `Portgas.D.Ac`). Camadas, da mais barata para a mais cara:
+#
+#   1. dicionário de nomes normalizados (sem acento, caixa ou pontuação);
+#   2. trie de nomes para prefixos únicos;
+#   3. índice de trigramas + Levenshtein limitado para nomes com erros;
+#   4. índice de deleções (symmetric delete) para códigos a 1 edição.
+#
+# Nomes repetidos entre coleções (vários "Monkey.D.Luffy") só são resolvidos
+# quando as cores do líder deixam um único candidato; senão a busca devolve
+# os candidatos para o jogador escolher.
+#
+# Benchmark: python cardindex.py [cartas] [consultas]
+
+import re
+import unicodedata
+from collections import Counter
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from decklist import CardCatalog, LEADER, normalize_code
+
+MAX_CANDIDATES = 5
+NGRAM = 3
+
+# "op13 113", "OP13113", "0P13-113" -> OP13-113
+LOOSE_CODE_RE = re.compile(r"^(?P<set>[A-Za-z0]{1,4})\s*(?P<num>\d{0,2})\s*[-_ ]?\s*(?P<card>\d{2,4})$")
+
+
+class Match(NamedTuple):
+    code: Optional[str]      # canonical card id when resolved
+    how: str                 # exact | code | prefix | fuzzy | ambiguous | none
+    candidates: Tuple[str, ...] = ()
+
+
+NO_MATCH = Match(None, "none")
+
+
+def fold(text: str) -> str:
+    """Accent/case/punctuation-insensitive form: ``Portgas.D.Ace`` -> ``portgas d ace``."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text).split())
+
+
+def levenshtein(a: str, b: str, limit: int) -> int:
+    """Edit distance, or ``limit + 1`` once it is known to exceed ``limit``.
+
+    Only the diagonal band of width ``limit`` is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) < len(b):
+        a, b = b, a
+    over = limit + 1
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        cur[0] = i if i <= limit else over
+        best = cur[0]
+        for j in range(lo, hi + 1):
+            v = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j - 1] + 1 < v:
+                v = cur[j - 1] + 1
+            cur[j] = v if v < over else over
+            if v < best:
+                best = v
+        if best > limit:
+            return over
+        prev = cur
+    return prev[-1]
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """O(n) check for ``levenshtein(a, b) <= 1``."""
+    if len(a) < len(b):
+        a, b = b, a
+    if len(a) - len(b) > 1:
+        return False
+    i = 0
+    while i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:]
+    return a[i + 1:] == b[i:]
+
+
+def canonical_code(token: str) -> Optional[str]:
+    m = LOOSE_CODE_RE.match(token.strip())
+    if not m:
+        return None
+    return f"{m.group('set').upper().replace('0', 'O')}{m.group('num')}-{m.group('card')}"
+
+
+class DeleteIndex:
+    """Symmetric-delete index: strings within one edit share a 1-deletion variant.
+
+    Card codes are dense (OP13-113, OP13-118, ...) so a metric tree over them
+    degenerates; looking up the query and its deletions is O(len) instead.
+    """
+
+    def __init__(self):
+        self.variants: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def _deletions(word: str) -> set:
+        return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+    def add(self, word: str):
+        for v in self._deletions(word):
+            self.variants.setdefault(v, []).append(word)
+
+    def search(self, word: str) -> List[str]:
+        """Indexed words within one edit of ``word``."""
+        seen = set()
+        for v in self._deletions(word):
+            seen.update(self.variants.get(v, ()))
+        return sorted(w for w in seen if within_one_edit(word, w))
+
+
+class Trie:
+    """Prefix tree of folded names; every node keeps the names below it (capped)."""
+
+    CAP = MAX_CANDIDATES + 1
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, key: str):
+        node = self.root
+        for ch in key:
+            node = node.setdefault(ch, {})
+            below = node.setdefault("", [])
+            if len(below) < self.CAP and key not in below:
+                below.append(key)
+
+    def prefix(self, key: str) -> List[str]:
+        node = self.root
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                return []
+        return node.get("", [])
+
+
+class CardIndex:
+    """Resolve free-form card references to catalog codes."""
+
+    def __init__(self, catalog: CardCatalog):
+        self.catalog = catalog
+        self.names: Dict[str, List[str]] = {}  # folded name -> codes
+        self.trie = Trie()
+        self.grams: Dict[str, List[str]] = {}  # trigram -> folded names
+        self.codes = DeleteIndex()
+        for code, card in catalog.by_code.items():
+            self.codes.add(code)
+            key = fold(card.name)
+            if not key:
+                continue
+            if key not in self.names:
+                self.names[key] = []
+                self.trie.insert(key)
+                for g in self._grams(key):
+                    self.grams.setdefault(g, []).append(key)
+            self.names[key].append(code)
+
+    def __bool__(self):
+        return bool(self.catalog)
+
+    @staticmethod
+    def _grams(key: str) -> Iterable[str]:
+        padded = f"  {key} "
+        return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+    # ---- codes ----
+    def resolve_code(self, token: str) -> Match:
+        code = canonical_code(token)
+        if code is None:
+            return NO_MATCH
+        if code in self.catalog:
+            how = "exact" if normalize_code(token) == code else "code"
+            return Match(code, how, (code,))
+        near = self.codes.search(code)
+        if len(near) == 1:
+            return Match(near[0], "code", tuple(near))
+        return Match(None, "ambiguous" if near else "none", tuple(near[:MAX_CANDIDATES]))
+
+    # ---- names ----
+    def _pick(self, keys: List[str], how: str, colors, leader: bool = False) -> Match:
+        codes = [c for k in keys for c in self.names[k]]
+        if leader:
+            codes = [c for c in codes if self.catalog.by_code[c].type == LEADER] or codes
+        elif colors:
+            allowed = set(colors)
+            fitting = [c for c in codes
+                       if self.catalog.by_code[c].type != LEADER
+                       and allowed.intersection(self.catalog.by_code[c].colors)]
+            codes = fitting or codes
+        if len(codes) == 1:
+            return Match(codes[0], how, tuple(codes))
+        return Match(None, "ambiguous", tuple(codes[:MAX_CANDIDATES]))
+
+    def resolve_name(self, name: str, colors: Optional[Iterable[str]] = None, leader: bool = False) -> Match:
+        key = fold(name)
+        if not key:
+            return NO_MATCH
+        if key in self.names:
+            return self._pick([key], "exact", colors, leader)
+        below = self.trie.prefix(key)
+        if below and len(below) <= MAX_CANDIDATES:
+            return self._pick(below, "prefix", colors, leader)
+        # trigram candidates, verified with a bounded edit distance
+        limit = 1 + len(key) // 12
+        grams = self._grams(key)
+        votes = Counter(chain.from_iterable(self.grams.get(g, ()) for g in grams))
+        # q-gram lemma: within ``limit`` edits at least this many grams survive
+        need = len(grams) - NGRAM * limit
+        best, best_d = [], limit + 1
+        for k, shared in votes.most_common(20):
+            if shared < need:
+                break
+            d = levenshtein(key, k, limit)
+            if d < best_d:
+                best, best_d = [k], d
+            elif d == best_d and d <= limit:
+                best.append(k)
+        if best_d <= limit:
+            return self._pick(best, "fuzzy", colors, leader)
+        return NO_MATCH
+
+    def resolve(self, token: str, colors: Optional[Iterable[str]] = None, leader: bool = False) -> Match:
+        """A code-like token goes to the code index, anything else to names.
+
+        ``colors`` (the leader's) and ``leader`` narrow cards sharing a name.
+        """
+        if canonical_code(token):
+            return self.resolve_code(token)
+        return self.resolve_name(token, colors, leader)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    from decklist import Card
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    q = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rng = random.Random(42)
+    syll = [c + v for c in "bdfghjklmnprstvz" for v in "aeiou"]
+    colors = ("red", "green", "blue", "purple", "black", "yellow")
+    cards = []
+    for i in range(n):
+        s, num = divmod(i, 120)
+        name = " ".join("".join(rng.sample(syll, rng.randint(2, 3))).capitalize() for _ in range(2))
+        cards.append(Card(f"OP{s + 1:02d}-{num + 1:03d}", name, "character", (rng.choice(colors),)))
+    index = CardIndex(CardCatalog(cards))
+
+    def typo(word):
+        i = rng.randrange(len(word))
+        return word[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[i + 1:]
+
+    kinds = ("nome exato", "nome com erro", "código solto", "código com erro")
+    queries = []
+    for _ in range(q):
+        c = rng.choice(cards)
+        kind = rng.randrange(4)
+        queries.append((kind, [c.name, typo(c.name), c.code.replace("-", " ").lower(), c.code[:-2] + c.code[-1]][kind]))
+
+    spent, hows = Counter(), Counter()
+    for kind, text in queries:
+        t0 = time.perf_counter()
+        m = index.resolve(text)
+        spent[kind] += time.perf_counter() - t0
+        hows[m.how] += 1
+    per_kind = Counter(k for k, _ in queries)
+    print(f"{n} cartas, {q} consultas — {dict(hows)}")
+    for k, label in enumerate(kinds):
+        print(f"  {label}: {spent[k] / per_kind[k] * 1e6:.1f} µs por consulta")
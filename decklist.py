@@ -0,0 +1,381 @@
+# decklist.py — OPTCG Sorocaba — decklists
+#
+# Parser e validador de decklists de One Piece TCG. Cada linha é lida por
+# expressões compiladas (`4xOP13-113`, `4 OP13-113 Nome`, `OP13-113 x4`,
+# `Leader: OP13-079`); as cartas são resolvidas num catálogo local
+# (data/cards.json) indexado por código e por coleção.
+#
+# Regras: 1 líder + 50 cartas (51 no total), no máximo 4 cópias por código,
+# sem líder ou DON!! no deck principal e toda carta compartilhando ao menos
+# uma cor com o líder. Sem catálogo, só as regras estruturais são aplicadas.
+#
+# Com um CardIndex (cardindex.py), nomes de cartas e códigos com erro de
+# digitação são corrigidos para o código canônico e as correções voltam no
+# resultado para o jogador confirmar.
+#
+# Os erros são estruturados (linha, tipo, mensagem) e validate_many valida
+# as decklists de um torneio inteiro numa chamada, reaproveitando o parse de
+# textos repetidos.
+#
+# Formato do catálogo: lista JSON de cartas
+#   {"code": "OP13-113", "name": "...", "type": "Character", "colors": ["Red"]}
+# ("id"/"card_id", "category" e "color": "Red/Green" também são aceitos).
+#
+# Benchmark: python decklist.py [decks]
+
+import re
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DECK_SIZE = 50
+MAX_COPIES = 4
+MAX_LINES = 120
+MAX_LINE_LENGTH = 200
+
+LEADER = "leader"
+DON = "don"
+
+_CODE = r"(?P<code>[A-Za-z]{1,4}\d{0,2}-\d{3})(?:_[A-Za-z0-9]+)?"
+_COUNT = r"(?P<count>\d{1,3})"
+# "4xOP13-113 Nome", "4 x OP13-113", "4 OP13-113"
+COUNT_FIRST_RE = re.compile(rf"^{_COUNT}\s*[xX×*]?\s*{_CODE}(?P<rest>.*)$")
+# "OP13-113 x4", "OP13-113 (Nome) x 4"
+CODE_FIRST_RE = re.compile(rf"^{_CODE}(?:\s+[^\d×*]*?)?\s*[xX×*]\s*{_COUNT}\s*$")
+# "Leader: OP13-079", "Líder - 1x OP13-079"
+LEADER_RE = re.compile(r"^(?:leader|l[ií]der)\b\s*[:\-]?\s*(?P<body>.*)$", re.IGNORECASE)
+# "Characters (20)", "Eventos:" — section headers between cards
+HEADER_RE = re.compile(r"^[^\W\d_](?:[^\W\d]|[ !&/-]){0,40}:?\s*(?:\(\d+\))?:?$")
+CODE_RE = re.compile(rf"^{_CODE}$")
+# card names / loose codes, resolved through a CardIndex: "4x Nami", "Nami x4"
+NAME_COUNT_FIRST_RE = re.compile(rf"^{_COUNT}(?:\s*[xX×*](?=\s|[A-Z0-9])\s*|\s+)(?P<name>(?:0|[^\d\s]).*?)$")
+NAME_COUNT_LAST_RE = re.compile(rf"^(?P<name>(?:0|[^\d\s]).*?)\s+[xX×*]?\s*{_COUNT}$")
+COMMENT_PREFIXES = ("#", "//")
+
+
+class Card(NamedTuple):
+    code: str
+    name: str
+    type: str
+    colors: Tuple[str, ...]
+
+
+class DeckError(NamedTuple):
+    line: Optional[int]  # 1-based line number, None for deck-wide rules
+    kind: str            # syntax | unknown_card | ambiguous | copies | count | leader | color | size
+    message: str
+    card: Optional[str] = None
+
+    def __str__(self):
+        return f"linha {self.line}: {self.message}" if self.line else self.message
+
+
+class DeckResult(NamedTuple):
+    ok: bool
+    total: int
+    leader: Optional[str]
+    cards: Dict[str, int]  # main deck, code -> copies
+    errors: List[DeckError]
+    corrections: Tuple[Tuple[int, str, str], ...] = ()  # (line, typed, code)
+
+    def summary(self, limit: int = 8) -> str:
+        """Portuguese, DM-sized description of the errors and corrections."""
+        lines = [f"• linha {no}: `{typed}` → {code}" for no, typed, code in self.corrections[:limit]]
+        if len(self.corrections) > limit:
+            lines.append(f"• … e mais {len(self.corrections) - limit} correção(ões)")
+        if lines:
+            lines.insert(0, "🔎 Cartas interpretadas:")
+        if self.ok:
+            return "\n".join([f"✅ Deck válido: líder {self.leader} + {self.total - 1} cartas."] + lines)
+        lines += [f"• {e}" for e in self.errors[:limit]]
+        if len(self.errors) > limit:
+            lines.append(f"• … e mais {len(self.errors) - limit} erro(s)")
+        return "\n".join(lines)
+
+    def canonical(self) -> str:
+        """The deck as ``1xLEADER`` followed by ``NxCODE`` lines."""
+        lines = [f"1x{self.leader}"] if self.leader else []
+        return "\n".join(lines + [f"{n}x{code}" for code, n in self.cards.items()])
+
+
+def normalize_code(code: str) -> str:
+    """``op13-113_p1`` -> ``OP13-113`` (alternate arts count as the same card)."""
+    return code.split("_", 1)[0].upper()
+
+
+# ---------------- CATALOG ----------------
+class CardCatalog:
+    """Card lookup by code (``get``) and by set (``in_set``)."""
+
+    def __init__(self, cards=()):
+        self.by_code: Dict[str, Card] = {}
+        self.by_set: Dict[str, Dict[str, Card]] = {}
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def __bool__(self):
+        return bool(self.by_code)
+
+    def __contains__(self, code: str) -> bool:
+        return normalize_code(code) in self.by_code
+
+    def add(self, card: Card):
+        self.by_code[card.code] = card
+        set_code, number = card.code.rsplit("-", 1)
+        self.by_set.setdefault(set_code, {})[number] = card
+
+    def get(self, code: str) -> Optional[Card]:
+        return self.by_code.get(normalize_code(code))
+
+    def in_set(self, set_code: str) -> Dict[str, Card]:
+        return self.by_set.get(set_code.upper(), {})
+
+    @staticmethod
+    def _card(raw: dict) -> Optional[Card]:
+        code = raw.get("code") or raw.get("id") or raw.get("card_id")
+        if not code or not CODE_RE.match(str(code)):
+            return None
+        colors = raw.get("colors", raw.get("color", ()))
+        if isinstance(colors, str):
+            colors = colors.split("/")
+        return Card(normalize_code(str(code)), str(raw.get("name", "")),
+                    str(raw.get("type") or raw.get("category") or "").strip().lower(),
+                    tuple(c.strip().lower() for c in colors if c.strip()))
+
+    @classmethod
+    def load(cls, path) -> "CardCatalog":
+        """Load ``path``; a missing file gives an empty catalog."""
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        raw = json.loads(path.read_text(encoding="utf-8") or "[]")
+        if isinstance(raw, dict):
+            raw = [dict(v, code=v.get("code", k)) for k, v in raw.items()]
+        return cls(c for c in map(cls._card, raw) if c)
+
+
+# ---------------- PARSER ----------------
+def parse_line(line: str) -> Optional[Tuple[int, str, bool]]:
+    """``(count, code, is_leader)`` for a card line, ``None`` if it is not one."""
+    is_leader = False
+    m = LEADER_RE.match(line)
+    if m and m.group("body"):
+        is_leader, line = True, m.group("body")
+    m = COUNT_FIRST_RE.match(line) or CODE_FIRST_RE.match(line)
+    if m:
+        return int(m.group("count")), normalize_code(m.group("code")), is_leader
+    m = CODE_RE.match(line)
+    if m and is_leader:
+        return 1, normalize_code(m.group("code")), True
+    return None
+
+
+def parse_name_line(line: str) -> Optional[Tuple[int, str, bool]]:
+    """``(count, name, is_leader)`` for ``4x Nami``/``Nami x4``/``Leader: Law``."""
+    is_leader = False
+    m = LEADER_RE.match(line)
+    if m and m.group("body"):
+        is_leader, line = True, m.group("body")
+    m = NAME_COUNT_FIRST_RE.match(line) or NAME_COUNT_LAST_RE.match(line)
+    if m:
+        return int(m.group("count")), m.group("name").strip(), is_leader
+    if is_leader:
+        return 1, line.strip(), True
+    return None
+
+
+def parse_decklist(text: str, index=None):
+    """Split ``text`` into card entries.
+
+    Returns ``(entries, errors, corrections)`` with entries as ``(line_no,
+    count, code, is_leader)``. Blank lines, comments and section headers are
+    skipped; a ``Leader``/``Líder`` header marks the next card as the leader.
+    With a ``CardIndex``, names and near-miss codes are resolved (using the
+    leader's colors to break ties once it is known) and listed in
+    ``corrections``.
+    """
+    entries, errors, corrections = [], [], []
+    leader_next = False
+    leader_colors = None
+    lines = text.splitlines()
+    if len(lines) > MAX_LINES:
+        errors.append(DeckError(None, "size", f"decklist longa demais ({len(lines)} linhas, máximo {MAX_LINES})"))
+        lines = lines[:MAX_LINES]
+    for no, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith(COMMENT_PREFIXES):
+            continue
+        if len(line) > MAX_LINE_LENGTH:
+            errors.append(DeckError(no, "syntax", "linha longa demais"))
+            continue
+        parsed = parse_line(line)
+        typed = None
+        if parsed and index and parsed[1] not in index.catalog:
+            typed = parsed[1]
+        elif not parsed and index:
+            parsed = parse_name_line(line)
+            if parsed and HEADER_RE.match(line) and not parsed[2]:
+                parsed = None
+            if parsed:
+                typed = parsed[1]
+        if typed is not None:
+            count, _, is_leader = parsed
+            is_leader = is_leader or leader_next
+            match = index.resolve(typed, colors=leader_colors, leader=is_leader)
+            if match.code:
+                parsed = (count, match.code, is_leader)
+                if match.how != "exact" or typed != match.code:
+                    corrections.append((no, typed, match.code))
+            elif match.how == "ambiguous":
+                errors.append(DeckError(no, "ambiguous", f"`{typed}` pode ser {', '.join(match.candidates)} — use o código", typed))
+                leader_next = False
+                continue
+            elif not CODE_RE.match(typed):
+                errors.append(DeckError(no, "unknown_card", f"carta `{typed[:40]}` não encontrada no catálogo", typed))
+                leader_next = False
+                continue
+        if parsed:
+            count, code, is_leader = parsed
+            is_leader = is_leader or leader_next
+            entries.append((no, count, code, is_leader))
+            leader_next = False
+            if index and leader_colors is None:
+                card = index.catalog.get(code)
+                if card is not None and card.type == LEADER:
+                    leader_colors = card.colors
+        elif HEADER_RE.match(line):
+            leader_next = bool(LEADER_RE.match(line.rstrip(":")))
+        else:
+            errors.append(DeckError(no, "syntax", f"linha não reconhecida: `{line[:40]}` (use `4xOP13-113`)"))
+    return entries, errors, corrections
+
+
+# ---------------- VALIDATION ----------------
+def validate_decklist(text: str, catalog: Optional[CardCatalog] = None, index=None) -> DeckResult:
+    entries, errors, corrections = parse_decklist(text, index or None)
+    catalog = catalog or (index.catalog if index is not None else CardCatalog())
+    known = bool(catalog)
+
+    # leader: explicit marker, else the catalog's leader card, else the
+    # first single-copy line (the usual "1xLEADER" first line of exports)
+    leader_idx = next((i for i, e in enumerate(entries) if e[3]), None)
+    if leader_idx is None and known:
+        leader_idx = next((i for i, e in enumerate(entries)
+                           if (catalog.get(e[2]) or Card("", "", "", ())).type == LEADER), None)
+    if leader_idx is None and not known and entries and entries[0][1] == 1:
+        leader_idx = 0
+
+    leader = None
+    leader_card = None
+    main = Counter()
+    first_line = {}
+    total = 0
+    for i, (no, count, code, _) in enumerate(entries):
+        total += count
+        card = catalog.get(code) if known else None
+        if known and card is None:
+            errors.append(DeckError(no, "unknown_card", f"carta {code} não encontrada no catálogo", code))
+        if i == leader_idx:
+            leader, leader_card = code, card
+            if count != 1:
+                errors.append(DeckError(no, "leader", f"o líder {code} deve ter 1 cópia (encontrado {count})", code))
+            if card is not None and card.type != LEADER:
+                errors.append(DeckError(no, "leader", f"{code} não é uma carta de líder", code))
+            continue
+        if card is not None and card.type == LEADER:
+            errors.append(DeckError(no, "leader", f"{code} é um líder e não pode ficar no deck principal", code))
+        elif card is not None and card.type == DON:
+            errors.append(DeckError(no, "syntax", f"{code} é DON!! e não entra na decklist", code))
+        main[code] += count
+        first_line.setdefault(code, no)
+
+    if leader is None:
+        errors.append(DeckError(None, "leader", "nenhum líder encontrado (ex.: `1xOP13-079` na primeira linha ou `Leader: OP13-079`)"))
+
+    for code, copies in main.items():
+        if copies > MAX_COPIES:
+            errors.append(DeckError(first_line[code], "copies", f"{copies} cópias de {code} (máximo {MAX_COPIES})", code))
+
+    if leader_card is not None and leader_card.colors:
+        allowed = set(leader_card.colors)
+        for code in main:
+            card = catalog.get(code)
+            if card is not None and card.colors and not allowed.intersection(card.colors):
+                errors.append(DeckError(first_line[code], "color",
+                                        f"{code} ({'/'.join(card.colors)}) não tem cor do líder ({'/'.join(leader_card.colors)})", code))
+
+    deck_cards = sum(main.values())
+    if deck_cards != DECK_SIZE:
+        errors.append(DeckError(None, "count", f"o deck principal tem {deck_cards} cartas — são necessárias {DECK_SIZE} + 1 líder (total {total})"))
+
+    errors.sort(key=lambda e: (e.line is None, e.line or 0))
+    return DeckResult(not errors, total, leader, dict(main), errors, tuple(corrections))
+
+
+def validate_many(decks: Dict[str, str], catalog: Optional[CardCatalog] = None, index=None) -> Dict[str, DeckResult]:
+    """Validate every decklist of an event; identical texts are checked once."""
+    seen: Dict[str, DeckResult] = {}
+    out = {}
+    for uid, text in decks.items():
+        result = seen.get(text)
+        if result is None:
+            result = seen[text] = validate_decklist(text, catalog, index)
+        out[uid] = result
+    return out
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    colors = ("red", "green", "blue", "purple", "black", "yellow")
+    cards = []
+    for s in range(1, 14):
+        for num in range(1, 121):
+            kind = LEADER if num <= 8 else ("event" if num > 100 else "character")
+            cards.append(Card(f"OP{s:02d}-{num:03d}", f"Card {s}-{num}", kind, (colors[num % 6],)))
+    catalog = CardCatalog(cards)
+    leaders = [c for c in cards if c.type == LEADER]
+
+    def valid_deck():
+        lead = rng.choice(leaders)
+        pool = [c for c in cards if c.type != LEADER and c.colors == lead.colors]
+        picks = rng.sample(pool, 13)
+        counts = [4] * 12 + [2]
+        lines = [f"1x{lead.code}"] + [f"{k}x{c.code}" for k, c in zip(counts, picks)]
+        return "\n".join(lines)
+
+    def malformed():
+        d = valid_deck().splitlines()
+        kind = rng.randrange(7)
+        if kind == 0:
+            d[1] = "5x" + d[1].split("x", 1)[1]
+        elif kind == 1:
+            d.insert(2, "4x OP1-ABC lorem ipsum")
+        elif kind == 2:
+            d = d[1:]
+        elif kind == 3:
+            d.append("1xOP99-999")
+        elif kind == 4:
+            d = ["9" * 500 + "x" + "O" * 500] * 3
+        elif kind == 5:
+            d = d * 20
+        else:
+            d = ["​🏴‍☠️" * 80, "x" * 10000]
+        return "\n".join(d)
+
+    decks = {str(i): (valid_deck() if i % 2 else malformed()) for i in range(n)}
+    t0 = time.perf_counter()
+    results = validate_many(decks, catalog)
+    dt = time.perf_counter() - t0
+    ok = sum(r.ok for r in results.values())
+    kinds = Counter(e.kind for r in results.values() for e in r.errors)
+    print(f"{n} decklists ({ok} válidas) em {dt * 1000:.1f} ms — {dt / n * 1e6:.0f} µs por deck")
+    print("erros por tipo:", dict(kinds))
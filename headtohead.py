@@ -0,0 +1,145 @@
+# headtohead.py — OPTCG Sorocaba — confronto direto
+#
+# Placar de cada par de jogadores (vitórias, derrotas e empates) mantido em
+# memória. Cada par fica guardado uma vez, na ordem (menor id, maior id), e a
+# consulta devolve o placar do ponto de vista de quem perguntou — O(1).
+#
+#   * resultado confirmado -> ``add(record)`` soma um inteiro;
+#   * na inicialização -> ``build(historico)`` reconstrói tudo numa passada
+#     vetorizada (np.unique nos pares + bincount nos resultados).
+#
+# Benchmark: python headtohead.py [partidas] [jogadores]
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+WIN_LO, WIN_HI, TIE = 0, 1, 2
+
+
+def _outcome(record: dict) -> Optional[Tuple[int, int, int]]:
+    """``(lo, hi, WIN_LO | WIN_HI | TIE)`` for a history record, else ``None``."""
+    players = record.get("players") or (record.get("winner"), record.get("loser"))
+    ids = [int(u) for u in players if u is not None]
+    if len(ids) != 2 or ids[0] == ids[1]:
+        return None
+    lo, hi = sorted(ids)
+    if record.get("tie"):
+        return lo, hi, TIE
+    winner = record.get("winner")
+    if winner is None:
+        return None
+    return lo, hi, WIN_LO if int(winner) == lo else WIN_HI
+
+
+class HeadToHead:
+    """Pairwise records: ``pairs[(lo, hi)] = [lo wins, hi wins, ties]``."""
+
+    def __init__(self, pairs: Optional[Dict[Tuple[int, int], List[int]]] = None):
+        self.pairs = pairs if pairs is not None else {}
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @classmethod
+    def build(cls, records: Iterable[dict]) -> "HeadToHead":
+        """Aggregate a whole history at once.
+
+        The Python loop only copies fields into flat lists; ordering the pair,
+        classifying the result and counting happen in NumPy.
+        """
+        a, b, win, tie = [], [], [], []
+        for r in records:
+            ids = r.get("players") or (r.get("winner"), r.get("loser"))
+            if len(ids) != 2 or ids[0] is None or ids[1] is None:
+                continue
+            w = r.get("winner")
+            a.append(ids[0]); b.append(ids[1])
+            win.append(-1 if w is None else w)
+            tie.append(bool(r.get("tie")))
+        if not a:
+            return cls()
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        win = np.asarray(win, dtype=np.int64)
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        res = np.where(tie, TIE, np.where(win == lo, WIN_LO, np.where(win == hi, WIN_HI, -1)))
+        keep = (lo != hi) & (res >= 0)
+        lo, hi, res = lo[keep], hi[keep], res[keep]
+        if not len(res):
+            return cls()
+        # snowflakes -> dense ids so a pair packs into one int64 key
+        ids, dense = np.unique(np.concatenate((lo, hi)), return_inverse=True)
+        m = len(ids)
+        keys, inverse = np.unique(dense[:len(lo)] * m + dense[len(lo):], return_inverse=True)
+        counts = np.bincount(inverse * 3 + res, minlength=len(keys) * 3).reshape(-1, 3)
+        return cls(dict(zip(zip(ids[keys // m].tolist(), ids[keys % m].tolist()), counts.tolist())))
+
+    def add(self, record: dict) -> bool:
+        """Count one confirmed result; records without two players are ignored."""
+        o = _outcome(record)
+        if o is None:
+            return False
+        lo, hi, res = o
+        row = self.pairs.get((lo, hi))
+        if row is None:
+            row = self.pairs[(lo, hi)] = [0, 0, 0]
+        row[res] += 1
+        return True
+
+    def get(self, a: int, b: int) -> Tuple[int, int, int]:
+        """``(wins, losses, ties)`` of ``a`` against ``b``."""
+        a, b = int(a), int(b)
+        row = self.pairs.get((min(a, b), max(a, b)))
+        if row is None:
+            return 0, 0, 0
+        return (row[0], row[1], row[2]) if a < b else (row[1], row[0], row[2])
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(42)
+    base = 10 ** 17  # snowflake-sized ids
+    records = []
+    for _ in range(n):
+        a, b = (base + u for u in rng.sample(range(players), 2))
+        if rng.random() < 0.05:
+            records.append({"winner": None, "loser": None, "players": [a, b], "tie": True})
+        else:
+            w, l = (a, b) if rng.random() < 0.5 else (b, a)
+            records.append({"winner": w, "loser": l, "players": [a, b]})
+
+    t0 = time.perf_counter()
+    h2h = HeadToHead.build(records)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    inc = HeadToHead()
+    for r in records:
+        inc.add(r)
+    t_inc = time.perf_counter() - t0
+    assert inc.pairs == h2h.pairs
+
+    a, b = base, base + 1
+    t0 = time.perf_counter()
+    scan = [0, 0, 0]
+    for r in records:
+        if set(r["players"]) == {a, b}:
+            scan[2 if r.get("tie") else (0 if r["winner"] == a else 1)] += 1
+    t_scan = time.perf_counter() - t0
+    assert tuple(scan) == h2h.get(a, b)
+
+    q = 100000
+    t0 = time.perf_counter()
+    for _ in range(q):
+        h2h.get(base + rng.randrange(players), base + rng.randrange(players))
+    t_get = time.perf_counter() - t0
+
+    print(f"{n} partidas, {len(h2h)} pares: build vetorizado {t_build * 1000:.0f} ms | "
+          f"add um a um {t_inc * 1000:.0f} ms | consulta {t_get / q * 1e6:.2f} µs | "
+          f"varredura do histórico {t_scan * 1000:.1f} ms")
@@ -0,0 +1,129 @@
+# leaderboard.py — OPTCG Sorocaba — rankings
+#
+# Índice de classificação mantido incrementalmente: as pontuações continuam
+# no documento de ranking (ranking["scores_1x1"], ranking["scores_torneio"])
+# e o índice guarda as chaves (-pontos, uid) numa lista ordenada. Alterar uma
+# pontuação move só aquele jogador (bisect), a posição de um jogador sai por
+# busca binária e o texto do top 20 fica em cache até a próxima mudança.
+#
+# Benchmark: python leaderboard.py [jogadores] [consultas]
+
+from bisect import bisect_left, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Leaderboard:
+    """Sorted view over a ``{str(uid): points}`` dict from the ranking doc.
+
+    Writes go through ``set``/``incr``/``clear`` so the dict and the index
+    stay in step. ``rank`` is the competition rank (ties share a position)
+    found in O(log n); ``render`` output is cached per template until the
+    next score change.
+    """
+
+    def __init__(self, scores: Dict[str, int]):
+        self.scores = scores
+        self.version = 0
+        self.rebuild()
+
+    def rebuild(self):
+        self._keys = sorted((-pts, uid) for uid, pts in self.scores.items())
+        self._renders = {}
+        self.version += 1
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, uid) -> bool:
+        return str(uid) in self.scores
+
+    def _changed(self):
+        self._renders.clear()
+        self.version += 1
+
+    # ---- writes ----
+    def set(self, uid, points: int) -> int:
+        uid = str(uid)
+        old = self.scores.get(uid)
+        if old == points:
+            return points
+        if old is not None:
+            i = bisect_left(self._keys, (-old, uid))
+            if i < len(self._keys) and self._keys[i] == (-old, uid):
+                del self._keys[i]
+        self.scores[uid] = points
+        insort(self._keys, (-points, uid))
+        self._changed()
+        return points
+
+    def incr(self, uid, by: int = 1) -> int:
+        return self.set(uid, self.scores.get(str(uid), 0) + by)
+
+    def clear(self):
+        """Empty the scope in place (the ranking doc keeps the same dict)."""
+        self.scores.clear()
+        self._keys = []
+        self._changed()
+
+    # ---- reads ----
+    def points(self, uid) -> int:
+        return self.scores.get(str(uid), 0)
+
+    def rank(self, uid) -> Optional[int]:
+        """1-based position of ``uid`` (shared on ties) or ``None`` if unranked."""
+        pts = self.scores.get(str(uid))
+        if pts is None:
+            return None
+        return bisect_left(self._keys, (-pts, "")) + 1
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        return [(uid, -neg) for neg, uid in self._keys[:n]]
+
+    def render(self, header: str, line: Callable[[int, str, int], str], empty: str, n: int = 20) -> str:
+        """Top ``n`` as text; ``line(pos, uid, points)`` formats one row."""
+        key = (header, line, empty, n)
+        text = self._renders.get(key)
+        if text is None:
+            rows = [header] + [line(i, uid, pts) for i, (uid, pts) in enumerate(self.top(n), 1)]
+            if len(rows) == 1:
+                rows.append(empty)
+            text = self._renders[key] = "\n".join(rows)
+        return text
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    q = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rng = random.Random(42)
+    scores = {str(u): rng.randint(0, 200) for u in range(n)}
+    lb = Leaderboard(scores)
+    fmt = lambda i, u, p: f"{i}. <@{u}> — {p} vitórias"
+
+    t0 = time.perf_counter()
+    for _ in range(q):
+        lb.incr(rng.randrange(n))
+    t_upd = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(q):
+        lb.rank(rng.randrange(n))
+    t_rank = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(q):
+        lb.render("Ranking", fmt, "vazio")
+    t_cached = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(100):
+        items = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        "\n".join(fmt(i, u, p) for i, (u, p) in enumerate(items[:20], 1))
+    t_sort = (time.perf_counter() - t0) / 100
+
+    assert lb.top(20) == [(u, p) for u, p in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:20]]
+    print(f"{n} jogadores: incr {t_upd / q * 1e6:.1f} µs, rank {t_rank / q * 1e6:.1f} µs, "
+          f"render em cache {t_cached / q * 1e6:.2f} µs, ordenação completa {t_sort * 1e3:.2f} ms")
@@ -0,0 +1,161 @@
+# loopwatch.py — OPTCG Sorocaba — atraso do event loop
+#
+# Mede continuamente o atraso (lag) do event loop e aponta quem o travou:
+#
+#   * uma task acorda a cada ``interval`` segundos; a diferença entre o
+#     tempo dormido e o pedido é o lag daquele instante (janela móvel de
+#     amostras para o resumo p50/p95/p99/máx);
+#   * uma thread vigia o último batimento dessa task; se o loop passa de
+#     ``threshold`` sem bater, ela copia a pilha da thread do loop naquele
+#     momento (sys._current_frames) — é o código síncrono que está segurando
+#     o loop — e registra no log na hora, mesmo que o loop nunca volte;
+#   * quando o loop volta, a parada entra no histórico com a duração total.
+#
+# O resumo aparece no !lag (dono) e no /health do servidor web.
+#
+# Benchmark: python loopwatch.py
+
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+from typing import List, Optional
+
+from colorama import Fore
+
+from metrics import registry
+
+LAG_SECONDS = registry.histogram("optcg_loop_lag_seconds", "Event loop scheduling lag",
+                                 buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+STACK_DEPTH = 12
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class LoopWatchdog:
+    """Loop lag sampler plus a thread that captures the blocking stack."""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, window: float = 600, max_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = deque(maxlen=max(1, int(window / interval)))  # (wall time, lag)
+        self.stalls = deque(maxlen=max_stalls)
+        self.started = time.time()
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._captured = None  # (beat, stack) taken by the watcher for the current stall
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- loop side ----
+    async def _run(self):
+        self._loop_thread = threading.get_ident()
+        while True:
+            t0 = time.monotonic()
+            self._beat = t0
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - t0 - self.interval)
+            self._beat = now
+            self.samples.append((time.time(), lag))
+            LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                captured, self._captured = self._captured, None
+                stack = captured[1] if captured and captured[0] == t0 else []
+                self.stalls.append({"at": time.time() - lag, "lag": lag, "stack": stack})
+                if not stack:
+                    # shorter than the watcher's poll: no stack, just the duration
+                    print(Fore.YELLOW + f"[LOOP] event loop atrasou {lag * 1000:.0f} ms")
+
+    # ---- watcher thread ----
+    def _watch(self):
+        poll = max(self.threshold / 4, 0.01)
+        while not self._stop.wait(poll):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or self._loop_thread is None:
+                continue
+            if self._captured and self._captured[0] == beat:
+                continue  # already reported this stall
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame else []
+            self._captured = (beat, stack)
+            print(Fore.YELLOW + f"[LOOP] event loop bloqueado há {blocked * 1000:.0f} ms em:\n" + "".join(stack).rstrip())
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    # ---- reads ----
+    def summary(self) -> dict:
+        lags = sorted(lag for _, lag in self.samples)
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "samples": len(lags),
+            "window": round(self.samples[-1][0] - self.samples[0][0], 1) if self.samples else 0.0,
+            "p50_ms": round(_percentile(lags, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(lags, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(lags, 0.99) * 1000, 2),
+            "max_ms": round((lags[-1] if lags else 0.0) * 1000, 2),
+            "over_threshold": sum(1 for v in lags if v >= self.threshold),
+            "threshold_ms": round(self.threshold * 1000),
+            "stalls": len(self.stalls),
+            "last_stall": None if last is None else {
+                "at": last["at"], "lag_ms": round(last["lag"] * 1000), "where": where(last["stack"])},
+        }
+
+    def healthy(self, within: float = 60) -> bool:
+        """No stall in the last ``within`` seconds and the loop is still beating."""
+        if time.monotonic() - self._beat > max(self.threshold, self.interval) * 4:
+            return False
+        return not self.stalls or time.time() - self.stalls[-1]["at"] > within
+
+
+def where(stack: List[str]) -> str:
+    """``file:line in function`` of the innermost captured frame."""
+    if not stack:
+        return "?"
+    first = stack[-1].strip().splitlines()[0]  # 'File "x.py", line 12, in fn'
+    try:
+        path, line, func = first.split(", ")
+        return f"{path[6:-1].rsplit('/', 1)[-1]}:{line[5:]} em {func[3:]}"
+    except ValueError:
+        return first
+
+
+if __name__ == "__main__":
+    import json
+
+    async def bench():
+        dog = LoopWatchdog(interval=0.05, threshold=0.2)
+        dog.start()
+        await asyncio.sleep(0.5)
+
+        def blocking_save():
+            time.sleep(0.6)  # stands in for a synchronous json.dump on the loop
+
+        blocking_save()
+        await asyncio.sleep(0.3)
+        dog.stop()
+        s = dog.summary()
+        assert s["stalls"] == 1 and "blocking_save" in s["last_stall"]["where"], s
+        print(json.dumps(s, ensure_ascii=False, indent=2))
+
+    asyncio.run(bench())
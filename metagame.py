@@ -0,0 +1,255 @@
+# metagame.py — OPTCG Sorocaba — análise de metagame
+#
+# Agrega as decklists confirmadas e os resultados de torneio. Cada partida de
+# torneio no histórico carrega o evento e a referência (sha256) do deck de
+# cada jogador; daí saem:
+#
+#   * matriz carta × deck (contagem de cópias) -> taxa de inclusão e média
+#     de cópias por carta;
+#   * uso de cada líder (play rate);
+#   * matriz líder × líder de resultados -> win rate de cada confronto.
+#
+# A ingestão só acumula inteiros em listas; as matrizes são montadas com
+# operações vetorizadas do NumPy na hora do relatório, que fica em cache até
+# chegar um resultado novo. Decks são imutáveis (endereçados por conteúdo),
+# então cada um é analisado uma única vez.
+#
+# Benchmark: python metagame.py [torneios] [jogadores]
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from decklist import parse_decklist
+
+MIN_MATCHUP_GAMES = 3
+
+
+class Metagame:
+    """Incremental collector of decks and results with a cached NumPy report.
+
+    ``load_deck(ref)`` returns the decklist text for a store reference; it is
+    only called the first time a reference shows up in a report.
+    """
+
+    def __init__(self, load_deck: Callable[[str], str], index=None):
+        self.load_deck = load_deck
+        self.index = index
+        self._refs: Dict[str, int] = {}      # deck ref -> id
+        self._ref_list: List[str] = []
+        self._decks: Dict[Tuple[str, str], int] = {}  # (event, uid) -> deck id
+        self._events = set()
+        self._deck_rows: List[int] = []      # one entry per (event, player) deck
+        self._results: List[Tuple[int, int, float]] = []  # (deck a, deck b, score a)
+        self._parsed: Dict[int, Tuple[Optional[str], Dict[str, int]]] = {}
+        self._cache = None
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        # results first: every counted result then has its decks counted too,
+        # even if ingest runs on the loop while a report is built on a thread
+        n_results = len(self._results)
+        return len(self._deck_rows), n_results
+
+    def _ref_id(self, ref: str) -> int:
+        i = self._refs.get(ref)
+        if i is None:
+            i = self._refs[ref] = len(self._ref_list)
+            self._ref_list.append(ref)
+        return i
+
+    def _deck(self, event: str, uid: str, ref: str) -> int:
+        """Ref id of the player's deck in ``event``: the first one registered
+        wins, so a later result carrying another ref (deck resubmitted
+        mid-event) is still counted for a deck that is in ``_deck_rows``."""
+        key = (event, uid)
+        row = self._decks.get(key)
+        if row is None:
+            row = self._decks[key] = len(self._deck_rows)
+            self._events.add(event)
+            self._deck_rows.append(self._ref_id(ref))
+        return self._deck_rows[row]
+
+    def ingest(self, record: dict):
+        """Add one history record; records without deck references are ignored."""
+        decks = record.get("decks") or {}
+        event = record.get("event")
+        if not event or len(decks) != 2 or not all(decks.values()):
+            return
+        (ua, ra), (ub, rb) = sorted(decks.items())
+        a = self._deck(event, ua, ra)
+        b = self._deck(event, ub, rb)
+        if record.get("tie"):
+            score = 0.5
+        elif str(record.get("winner")) == ua:
+            score = 1.0
+        elif str(record.get("winner")) == ub:
+            score = 0.0
+        else:
+            return
+        self._results.append((a, b, score))
+
+    def _parse(self, ref_id: int):
+        parsed = self._parsed.get(ref_id)
+        if parsed is None:
+            entries, _, _ = parse_decklist(self.load_deck(self._ref_list[ref_id]), self.index)
+            leader, cards = None, {}
+            for _, count, code, is_leader in entries:
+                if leader is None and (is_leader or (not cards and count == 1)):
+                    leader = code
+                else:
+                    cards[code] = cards.get(code, 0) + count
+            parsed = self._parsed[ref_id] = (leader, cards)
+        return parsed
+
+    # ---------------- REPORT ----------------
+    def report(self) -> dict:
+        """Play rates, matchup win rates and card inclusion; cached per version."""
+        version = self.version
+        if self._cache and self._cache[0] == version:
+            return self._cache[1]
+        n_decks, n_results = version
+        deck_rows = np.asarray(self._deck_rows[:n_decks], dtype=np.int64)
+
+        # vocabularies over the distinct decks only
+        ref_ids = np.unique(deck_rows)
+        leaders: Dict[str, int] = {}
+        cards: Dict[str, int] = {}
+        ref_leader = np.full(len(self._ref_list), -1, dtype=np.int64)
+        card_idx, card_ref, card_cnt = [], [], []
+        for r in ref_ids.tolist():
+            leader, deck = self._parse(r)
+            ref_leader[r] = leaders.setdefault(leader or "?", len(leaders))
+            for code, count in deck.items():
+                card_idx.append(cards.setdefault(code, len(cards)))
+                card_ref.append(r)
+                card_cnt.append(count)
+
+        # card x deck count matrix: columns are distinct decks, weighted by
+        # how many players registered each one
+        col_of_ref = np.full(len(self._ref_list), -1, dtype=np.int64)
+        col_of_ref[ref_ids] = np.arange(len(ref_ids))
+        matrix = np.zeros((len(cards), len(ref_ids)), dtype=np.uint8)
+        if card_idx:
+            matrix[np.asarray(card_idx), col_of_ref[np.asarray(card_ref)]] = np.minimum(card_cnt, 255)
+        weight = np.bincount(col_of_ref[deck_rows], minlength=len(ref_ids)) if n_decks else np.zeros(0, np.int64)
+        included = (matrix > 0).astype(np.int64) @ weight
+        copies = matrix.astype(np.int64) @ weight
+
+        # leader play rate
+        deck_leader = ref_leader[deck_rows]
+        plays = np.bincount(deck_leader, minlength=len(leaders)) if n_decks else np.zeros(len(leaders), np.int64)
+
+        # leader x leader results (ties count half for each side)
+        wins = np.zeros((len(leaders), len(leaders)), dtype=np.float64)
+        if n_results:
+            res = np.asarray(self._results[:n_results], dtype=np.float64)
+            la = ref_leader[res[:, 0].astype(np.int64)]
+            lb = ref_leader[res[:, 1].astype(np.int64)]
+            np.add.at(wins, (la, lb), res[:, 2])
+            np.add.at(wins, (lb, la), 1.0 - res[:, 2])
+        games = wins + wins.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            winrate = np.where(games > 0, wins / games, np.nan)
+
+        leader_names = list(leaders)
+        card_names = list(cards)
+        order = np.argsort(-plays, kind="stable")
+        overall_games = games.sum(axis=1) - np.diag(games)
+        overall_wins = wins.sum(axis=1) - np.diag(wins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            overall = np.where(overall_games > 0, overall_wins / overall_games, np.nan)
+
+        leader_rows = [{
+            "leader": leader_names[i],
+            "decks": int(plays[i]),
+            "play_rate": float(plays[i] / n_decks) if n_decks else 0.0,
+            "games": int(overall_games[i]),
+            "win_rate": None if np.isnan(overall[i]) else float(overall[i]),
+        } for i in order.tolist()]
+
+        pair_i, pair_j = np.nonzero(np.triu(games >= MIN_MATCHUP_GAMES, k=1))
+        matchups = sorted(({
+            "a": leader_names[i], "b": leader_names[j],
+            "games": int(games[i, j]), "win_rate_a": float(winrate[i, j]),
+        } for i, j in zip(pair_i.tolist(), pair_j.tolist())), key=lambda m: -m["games"])
+
+        card_order = np.lexsort((-copies, -included))
+        card_rows = [{
+            "card": card_names[c],
+            "inclusion": float(included[c] / n_decks) if n_decks else 0.0,
+            "avg_copies": float(copies[c] / included[c]) if included[c] else 0.0,
+        } for c in card_order.tolist()]
+
+        report = {
+            "decks": n_decks,
+            "events": len(self._events),
+            "results": n_results,
+            "leaders": leader_rows,
+            "matchups": matchups,
+            "cards": card_rows,
+        }
+        self._cache = (version, report)
+        return report
+
+
+def format_report(report: dict, leaders: int = 8, matchups: int = 8, cards: int = 10) -> str:
+    """Portuguese text for Discord (fits one message with the default sizes)."""
+    if not report["decks"]:
+        return "📊 Ainda não há decklists de torneio com resultados registrados."
+    lines = [f"📊 **Metagame** — {report['events']} torneio(s), {report['decks']} decks, {report['results']} partidas\n",
+             "**Líderes (uso | win rate):**"]
+    for r in report["leaders"][:leaders]:
+        wr = f"{r['win_rate'] * 100:.0f}% em {r['games']}" if r["win_rate"] is not None else "—"
+        lines.append(f"• {r['leader']} — {r['play_rate'] * 100:.1f}% ({r['decks']}) | {wr}")
+    if report["matchups"]:
+        lines.append(f"\n**Confrontos (≥{MIN_MATCHUP_GAMES} partidas):**")
+        for m in report["matchups"][:matchups]:
+            lines.append(f"• {m['a']} x {m['b']} — {m['win_rate_a'] * 100:.0f}% / {(1 - m['win_rate_a']) * 100:.0f}% em {m['games']}")
+    lines.append("\n**Cartas mais usadas (inclusão | cópias):**")
+    for c in report["cards"][:cards]:
+        lines.append(f"• {c['card']} — {c['inclusion'] * 100:.0f}% | {c['avg_copies']:.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    rng = random.Random(42)
+    leaders = [f"OP{s:02d}-001" for s in range(1, 21)]
+    pool = [f"OP{s:02d}-{n:03d}" for s in range(1, 14) for n in range(10, 121)]
+    archetypes = []
+    for _ in range(120):
+        picks = rng.sample(pool, 13)
+        archetypes.append("\n".join([f"1x{rng.choice(leaders)}"] + [f"4x{c}" for c in picks[:12]] + [f"2x{picks[12]}"]))
+    texts = {str(i): t for i, t in enumerate(archetypes)}
+
+    meta = Metagame(texts.__getitem__)
+    t0 = time.perf_counter()
+    for e in range(events):
+        decks = {str(u): str(rng.randrange(len(archetypes))) for u in range(players)}
+        for _ in range(players // 2 * 5):
+            a, b = rng.sample(range(players), 2)
+            meta.ingest({"event": f"e{e}", "decks": {str(a): decks[str(a)], str(b): decks[str(b)]},
+                         "winner": rng.choice((a, b)), "tie": rng.random() < 0.05})
+    t_ingest = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    rep = meta.report()
+    t_first = time.perf_counter() - t0
+    meta.ingest({"event": "extra", "decks": {"1": "0", "2": "1"}, "winner": 1})
+    t0 = time.perf_counter()
+    meta.report()
+    t_again = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    meta.report()
+    t_cached = time.perf_counter() - t0
+
+    print(f"{events} torneios, {rep['decks']} decks, {rep['results']} partidas")
+    print(f"ingestão {t_ingest * 1000:.1f} ms | 1º relatório (com parse) {t_first * 1000:.1f} ms | "
+          f"após novo resultado {t_again * 1000:.1f} ms | em cache {t_cached * 1e6:.1f} µs")
+    print(format_report(rep))
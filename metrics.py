@@ -0,0 +1,201 @@
+# metrics.py — OPTCG Sorocaba — métricas no formato Prometheus
+#
+# Registro em memória de contadores, histogramas e gauges, exposto em texto
+# (formato de exposição do Prometheus) no /metrics do servidor web.
+#
+#   * contador: um dict rótulos -> valor, incremento O(1);
+#   * histograma: buckets fixos, a observação é um bisect + dois somas;
+#   * gauge: função chamada só na hora da coleta (custo zero no caminho
+#     quente).
+#
+# Histogramas podem ser alimentados por threads do executor (save_json),
+# então usam um lock; contadores só são tocados no event loop.
+#
+# Benchmark: python metrics.py [observações]
+
+import time
+import threading
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# seconds; covers a sub-millisecond handler up to a slow REST call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    # exposition format: backslash, double quote and line feed are escaped
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, by: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + by
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        values = self._values or ({(): 0} if not self.labelnames else {})
+        for key, v in sorted(values.items()):
+            out.append(f"{self.name}_total{_labels(self.labelnames, key)} {v:g}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 3)
+            s[i] += 1  # the slot after the last bucket is +Inf
+            s[-2] += value
+            s[-1] += 1
+
+    def time(self, *labels):
+        """Context manager observing the elapsed time of its block."""
+        return _Timer(self, labels)
+
+    def timed(self, *labels):
+        """Decorator for coroutine functions."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            async def inner(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - t0, *labels)
+            return inner
+        return wrap
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(s)) for k, s in self._series.items())
+        for key, s in series:
+            cum = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s):
+                cum += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                out.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {s[-2]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {s[-1]}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Tuple):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+        return False
+
+
+class Gauge:
+    """Read at scrape time: ``fn()`` returns a number or ``{labels tuple: number}``."""
+
+    def __init__(self, name: str, doc: str, fn: Callable, labels: Iterable[str] = ()):
+        self.name, self.doc, self.fn, self.labelnames = name, doc, fn, tuple(labels)
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.fn()
+        except Exception:
+            return out
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for key, v in items:
+            key = key if isinstance(key, tuple) else (key,)
+            out.append(f"{self.name}{_labels(self.labelnames, key)} {v:g}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, doc, labels, buckets))
+
+    def gauge(self, name: str, doc: str, fn: Callable, labels: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, doc, fn, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# process-wide registry shared by bot.py and storage.py
+registry = Registry()
+
+
+if __name__ == "__main__":
+    import sys
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = random.Random(42)
+    reg = Registry()
+    c = reg.counter("bench_events", "events", ("kind",))
+    h = reg.histogram("bench_seconds", "latency", ("route",))
+    reg.gauge("bench_queue", "size", lambda: 42)
+    values = [rng.expovariate(50) for _ in range(1000)]
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        c.inc("join")
+    t_inc = (time.perf_counter() - t0) / n
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        h.observe(values[i % 1000], "GET /users/{user_id}")
+    t_obs = (time.perf_counter() - t0) / n
+
+    t0 = time.perf_counter()
+    for i in range(n // 10):
+        with h.time("POST /channels/{channel_id}/messages"):
+            pass
+    t_ctx = (time.perf_counter() - t0) / (n // 10)
+
+    t0 = time.perf_counter()
+    text = reg.render()
+    t_render = time.perf_counter() - t0
+    print(f"contador {t_inc * 1e9:.0f} ns | histograma {t_obs * 1e9:.0f} ns | "
+          f"with time() {t_ctx * 1e9:.0f} ns | coleta {t_render * 1e6:.0f} µs ({len(text.splitlines())} linhas)")
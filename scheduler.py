@@ -0,0 +1,221 @@
+# scheduler.py — OPTCG Sorocaba — agenda de tarefas
+#
+# Todos os eventos com hora marcada (reset mensal do ranking, lembretes de
+# rodada, ...) ficam num único heap de timers: uma task dorme até o próximo
+# vencimento em vez de cada recurso ter o seu loop de polling.
+#
+#   * os horários são calculados no fuso da comunidade (America/Sao_Paulo,
+#     pytz) e gravados em UTC no documento "agenda", que o PersistenceWriter
+#     salva junto com o resto do estado;
+#   * ao iniciar, tarefas vencidas enquanto o bot estava fora rodam logo
+#     (uma vez só: tarefas recorrentes seguem para a próxima ocorrência
+#     depois de agora, sem repetir cada uma que foi perdida);
+#   * a nova data (ou a remoção, para tarefas únicas) só é marcada para
+#     gravação depois que o handler termina: uma queda no meio da execução
+#     faz a tarefa rodar de novo ao reiniciar (pelo menos uma vez). Os
+#     handlers precisam tolerar a repetição — o fechamento de temporada gera
+#     ids únicos e não faz nada com o ranking já vazio.
+#
+# Benchmark: python scheduler.py [tarefas]
+
+import heapq
+import asyncio
+import datetime
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import pytz
+from colorama import Fore
+
+TIMEZONE = pytz.timezone("America/Sao_Paulo")
+MAX_SLEEP = 3600  # re-check the wall clock at least hourly (suspend, clock jumps)
+
+
+def local_now(tz=TIMEZONE) -> datetime.datetime:
+    return datetime.datetime.now(tz)
+
+
+def monthly(day: int = 1, hour: int = 0, minute: int = 0, tz=TIMEZONE):
+    """Recurrence: every month on ``day`` at ``hour:minute`` local time."""
+    def next_after(after: datetime.datetime) -> datetime.datetime:
+        after = after.astimezone(tz)
+        year, month = after.year, after.month
+        while True:
+            candidate = tz.localize(datetime.datetime(year, month, day, hour, minute))
+            if candidate > after:
+                return candidate
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return next_after
+
+
+def _ts(when: datetime.datetime) -> float:
+    if when.tzinfo is None:
+        raise ValueError("horário sem fuso")
+    return when.timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, pytz.utc).isoformat()
+
+
+class Scheduler:
+    """Persistent timer heap running async handlers by job kind.
+
+    ``jobs`` is the persisted doc: ``{name: {"kind", "at" (UTC ISO), "data"}}``.
+    The heap holds ``(timestamp, seq, name)``; rescheduling or cancelling
+    leaves the old entry behind and it is skipped when popped.
+    """
+
+    def __init__(self, jobs: dict, on_change: Optional[Callable[[], None]] = None, tz=TIMEZONE):
+        self.jobs = jobs
+        self.tz = tz
+        self.on_change = on_change or (lambda: None)
+        self._handlers: Dict[str, Callable[..., Awaitable]] = {}
+        self._every: Dict[str, Callable] = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+        for name, job in jobs.items():
+            self._push(name, job)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def _push(self, name: str, job: dict):
+        ts = datetime.datetime.fromisoformat(job["at"]).timestamp()
+        heapq.heappush(self._heap, (ts, next(self._seq), name))
+        if self._heap[0][2] == name:
+            self._wake.set()
+
+    # ---- jobs ----
+    def register(self, kind: str, handler: Callable[..., Awaitable], every: Optional[Callable] = None):
+        """``handler(due, **data)`` runs each ``kind`` job; ``every(after)`` makes it recurring."""
+        self._handlers[kind] = handler
+        if every:
+            self._every[kind] = every
+
+    def schedule(self, name: str, kind: str, when: datetime.datetime, **data):
+        """Add or move job ``name`` to ``when`` (timezone-aware)."""
+        job = self.jobs[name] = {"kind": kind, "at": _iso(_ts(when)), "data": data}
+        self._push(name, job)
+        self.on_change()
+
+    def ensure(self, name: str, kind: str, after: Optional[datetime.datetime] = None, **data):
+        """Schedule a recurring job unless it already exists.
+
+        The first run is the next occurrence after ``after`` (default: now);
+        passing the last known run lets a missed occurrence catch up.
+        """
+        if name not in self.jobs:
+            self.schedule(name, kind, self._every[kind](after or local_now(self.tz)), **data)
+
+    def cancel(self, name: str) -> bool:
+        if self.jobs.pop(name, None) is None:
+            return False
+        self.on_change()
+        return True
+
+    def next_run(self, name: str) -> Optional[datetime.datetime]:
+        job = self.jobs.get(name)
+        if job is None:
+            return None
+        return datetime.datetime.fromisoformat(job["at"]).astimezone(self.tz)
+
+    # ---- loop ----
+    def _pop_due(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            ts, _, name = heapq.heappop(self._heap)
+            job = self.jobs.get(name)
+            # stale entry: job cancelled or moved since it was pushed
+            if job is None or datetime.datetime.fromisoformat(job["at"]).timestamp() != ts:
+                continue
+            yield ts, name, job
+
+    def _advance(self, ts: float, name: str, job: dict):
+        if self.jobs.get(name) is not job or _ts(datetime.datetime.fromisoformat(job["at"])) != ts:
+            return  # moved or cancelled while its handler ran
+        every = self._every.get(job["kind"])
+        if every:
+            # catch-up runs once; the next run is the first one after now
+            due = datetime.datetime.fromtimestamp(ts, self.tz)
+            job["at"] = _iso(_ts(every(max(due, local_now(self.tz)))))
+            self._push(name, job)
+        else:
+            self.jobs.pop(name, None)
+        self.on_change()
+
+    async def _run(self, ts: float, name: str, job: dict):
+        handler = self._handlers.get(job["kind"])
+        try:
+            if handler is None:
+                print(Fore.YELLOW + f"[AGENDA] sem handler para {job['kind']} ({name})")
+            else:
+                await handler(datetime.datetime.fromtimestamp(ts, self.tz), **job.get("data", {}))
+        except Exception as e:
+            print(Fore.RED + f"[AGENDA] {name}: {e}")
+        # at-least-once: the persisted date only moves once the handler is done
+        # (a handler cancelled at shutdown leaves it due for the next start)
+        self._advance(ts, name, job)
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            for ts, name, job in list(self._pop_due(time.time())):
+                # handlers run as their own tasks so a slow one (DM fan-out)
+                # does not hold back the rest of the heap
+                task = asyncio.create_task(self._run(ts, name, job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            delay = MAX_SLEEP if not self._heap else min(MAX_SLEEP, max(0.0, self._heap[0][0] - time.time()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    async def bench():
+        fired = []
+
+        async def handler(due, i):
+            fired.append((time.time() - due.timestamp(), i))
+
+        jobs = {}
+        sched = Scheduler(jobs)
+        sched.register("job", handler)
+        start = local_now()
+        t0 = time.perf_counter()
+        for i in range(n):
+            sched.schedule(f"j{i}", "job", start + datetime.timedelta(milliseconds=50 + (i * 7919) % 1000), i=i)
+        t_add = (time.perf_counter() - t0) / n
+        for i in range(0, n, 10):
+            sched.cancel(f"j{i}")
+        sched.start()
+        while len(sched) or sched._running:
+            await asyncio.sleep(0.05)
+        sched.stop()
+        late = sorted(d for d, _ in fired)
+        assert len(fired) == n - n // 10
+        print(f"{n} tarefas: agendar {t_add * 1e6:.1f} µs | disparadas {len(fired)} | "
+              f"atraso mediano {late[len(late) // 2] * 1000:.1f} ms, máx {late[-1] * 1000:.1f} ms")
+
+        nxt = monthly()(TIMEZONE.localize(datetime.datetime(2026, 1, 31, 23, 59)))
+        assert (nxt.month, nxt.day, nxt.hour, nxt.utcoffset()) == (2, 1, 0, datetime.timedelta(hours=-3))
+
+    asyncio.run(bench())
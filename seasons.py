@@ -0,0 +1,220 @@
+# seasons.py — OPTCG Sorocaba — temporadas de ranking
+#
+# Cada reset de ranking fecha uma temporada em vez de apagar a classificação:
+#
+#   * a classificação que sai vira um snapshot imutável e compacto
+#     (data/seasons/<escopo>-<rótulo>.json.gz: [[uid, pontos, posição], ...]
+#     já em ordem de classificação);
+#   * um índice pequeno (data/seasons/index.json) lista as temporadas com o
+#     pódio e o número de jogadores, então listar temporadas não abre nenhum
+#     snapshot e ver uma temporada abre só aquele arquivo;
+#   * o mesmo índice guarda os acumulados de todas as temporadas por jogador
+#     (pontos, temporadas jogadas, títulos, melhor posição), atualizados no
+#     fechamento — nada de reler snapshots para somar vitórias.
+#
+# O snapshot é gravado antes do índice; um snapshot que ficou fora do índice
+# (queda entre as duas gravações) é incorporado ao abrir o arquivo. O novo
+# índice é montado sobre cópias e só substitui o da memória depois de
+# gravado, então uma falha não deixa memória e disco divergentes.
+#
+# Benchmark: python seasons.py [temporadas] [jogadores]
+
+import os
+import json
+import gzip
+import copy
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from colorama import Fore
+
+from storage import save_json, load_json
+
+SNAPSHOT_CACHE = 4
+PODIUM = 3
+
+# rollup row: [total points, seasons played, titles, best rank]
+TOTAL, PLAYED, TITLES, BEST = range(4)
+
+
+def ranked(scores: Dict[str, int]) -> List[Tuple[str, int, int]]:
+    """``(uid, points, competition rank)`` sorted by position."""
+    rows = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    out, rank, prev = [], 0, None
+    for i, (uid, pts) in enumerate(rows, 1):
+        if pts != prev:
+            rank, prev = i, pts
+        out.append((uid, pts, rank))
+    return out
+
+
+class SeasonArchive:
+    """Immutable per-season snapshots plus an index with all-time rollups.
+
+    ``close_season`` does file I/O and is meant to run on the io executor;
+    reads of the index and rollups are plain dict lookups.
+    """
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.base_dir / "index.json"
+        doc = load_json(self.index_path, {"seasons": [], "rollups": {}})
+        self.entries: List[dict] = doc.get("seasons", [])
+        self.rollups: Dict[str, Dict[str, list]] = doc.get("rollups", {})
+        self._by_id = {e["id"]: e for e in self.entries}
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, list]" = OrderedDict()
+        self._recover()
+
+    def _path(self, season_id: str) -> Path:
+        return self.base_dir / f"{season_id}.json.gz"
+
+    def _commit(self, entries: List[dict], rollups: Dict[str, Dict[str, list]]):
+        """Write the new index, then make it the in-memory one."""
+        if not save_json(self.index_path, {"seasons": entries, "rollups": rollups}):
+            raise OSError(f"não foi possível gravar {self.index_path}")
+        self.entries, self.rollups = entries, rollups
+        self._by_id = {e["id"]: e for e in entries}
+
+    def _recover(self):
+        orphans = sorted(p for p in self.base_dir.glob("*.json.gz")
+                         if p.name[:-len(".json.gz")] not in self._by_id)
+        if not orphans:
+            return
+        entries, rollups = list(self.entries), copy.deepcopy(self.rollups)
+        for path in orphans:
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    snap = json.load(f)
+                entries.append(self._register(snap, rollups))
+            except Exception as e:
+                print(Fore.RED + f"[SEASONS] {path}: {e}")
+        self._commit(entries, rollups)
+
+    @staticmethod
+    def _register(snap: dict, rollups: Dict[str, Dict[str, list]]) -> dict:
+        """Index entry of ``snap``; folds its rows into ``rollups`` (a copy)."""
+        rows = snap["ranks"]
+        scope = rollups.setdefault(snap["scope"], {})
+        for uid, pts, rank in rows:
+            row = scope.get(uid)
+            if row is None:
+                row = scope[uid] = [0, 0, 0, rank]
+            row[TOTAL] += pts
+            row[PLAYED] += 1
+            row[TITLES] += rank == 1
+            row[BEST] = min(row[BEST], rank)
+        return {
+            "id": snap["id"], "scope": snap["scope"], "label": snap["label"],
+            "closed_at": snap["closed_at"], "players": len(rows),
+            "podium": rows[:PODIUM],
+        }
+
+    # ---- writes ----
+    def close_season(self, scope: str, scores: Dict[str, int], label: str, closed_at: str) -> Optional[dict]:
+        """Freeze ``scores`` as season ``<scope>-<label>``; ``None`` if nobody scored."""
+        if not scores:
+            return None
+        with self._lock:
+            season_id, n = f"{scope}-{label}", 1
+            while season_id in self._by_id or self._path(season_id).exists():
+                n += 1
+                season_id = f"{scope}-{label}-{n}"
+            rows = [[uid, pts, rank] for uid, pts, rank in ranked(scores)]
+            snap = {"id": season_id, "scope": scope, "label": label, "closed_at": closed_at, "ranks": rows}
+            path = self._path(season_id)
+            tmp = path.with_name(path.name + ".tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(snap, f, separators=(",", ":"), ensure_ascii=False)
+            os.replace(tmp, path)
+            # only this scope's rollups change; the others are shared as is
+            rollups = dict(self.rollups)
+            rollups[scope] = copy.deepcopy(self.rollups.get(scope, {}))
+            entry = self._register(snap, rollups)
+            try:
+                self._commit(self.entries + [entry], rollups)
+            except Exception:
+                # the caller restores the standings; drop the unindexed snapshot
+                # so it is not recovered as a season later
+                path.unlink(missing_ok=True)
+                raise
+            return entry
+
+    # ---- reads ----
+    def seasons(self, scope: Optional[str] = None) -> List[dict]:
+        """Index entries, newest first."""
+        return [e for e in reversed(self.entries) if scope is None or e["scope"] == scope]
+
+    def get(self, season_id: str) -> Optional[dict]:
+        return self._by_id.get(season_id)
+
+    def standings(self, season_id: str) -> List[list]:
+        """``[uid, points, rank]`` rows of one season (only that snapshot is read)."""
+        with self._lock:
+            rows = self._cache.get(season_id)
+            if rows is not None:
+                self._cache.move_to_end(season_id)
+                return rows
+        if season_id not in self._by_id:
+            return []
+        with gzip.open(self._path(season_id), "rt", encoding="utf-8") as f:
+            rows = json.load(f)["ranks"]
+        with self._lock:
+            self._cache[season_id] = rows
+            while len(self._cache) > SNAPSHOT_CACHE:
+                self._cache.popitem(last=False)
+        return rows
+
+    def alltime(self, scope: str, uid) -> Optional[list]:
+        """Rollup row ``[total, seasons, titles, best rank]`` over closed seasons."""
+        return self.rollups.get(scope, {}).get(str(uid))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+    import tempfile
+
+    n_seasons = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    players = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SeasonArchive(Path(tmp))
+        t0 = time.perf_counter()
+        for s in range(n_seasons):
+            scores = {str(u): rng.randint(0, 60) for u in rng.sample(range(players * 2), players)}
+            archive.close_season("1x1", scores, f"{2020 + s // 12}-{s % 12 + 1:02d}", "")
+        t_close = (time.perf_counter() - t0) / n_seasons
+        size = sum(p.stat().st_size for p in Path(tmp).glob("*.json.gz")) / n_seasons
+
+        t0 = time.perf_counter()
+        reopened = SeasonArchive(Path(tmp))
+        t_open = time.perf_counter() - t0
+
+        q = 20000
+        t0 = time.perf_counter()
+        for _ in range(q):
+            reopened.alltime("1x1", rng.randrange(players * 2))
+        t_all = (time.perf_counter() - t0) / q
+
+        t0 = time.perf_counter()
+        scan = {}
+        for e in reopened.seasons("1x1"):
+            with gzip.open(reopened._path(e["id"]), "rt", encoding="utf-8") as f:
+                for uid, pts, _ in json.load(f)["ranks"]:
+                    scan[uid] = scan.get(uid, 0) + pts
+        t_scan = time.perf_counter() - t0
+        assert all(reopened.alltime("1x1", u)[TOTAL] == v for u, v in scan.items())
+
+        t0 = time.perf_counter()
+        reopened.standings(reopened.seasons("1x1")[-1]["id"])
+        t_one = time.perf_counter() - t0
+
+    print(f"{n_seasons} temporadas x {players} jogadores: fechamento {t_close * 1000:.1f} ms | "
+          f"snapshot {size / 1024:.1f} KiB | abrir arquivo {t_open * 1000:.1f} ms | "
+          f"acumulado {t_all * 1e6:.2f} µs | ler uma temporada {t_one * 1000:.1f} ms | "
+          f"reler todos os snapshots {t_scan * 1000:.0f} ms")
@@ -0,0 +1,1265 @@
+# storage.py — OPTCG Sorocaba — camada de persistência
+#
+# Histórico em formato append-only: cada resultado confirmado vira uma linha
+# JSON em data/historico/journal.jsonl. Quando o journal atinge SEGMENT_SIZE
+# registros ele é compactado (gzip) em um segmento imutável, então registrar
+# um resultado custa O(1) de I/O independente do tamanho do histórico.
+#
+# Um índice jogador -> posições acompanha o histórico: cada segmento tem um
+# seg_NNNNNN.idx.json e o journal é indexado ao carregar e a cada append, então
+# o histórico de um jogador só lê as partidas dele (página a página).
+#
+# Os handlers nunca gravam direto: marcam o documento como sujo no
+# PersistenceWriter, que agrupa as alterações e grava uma vez por intervalo
+# (arquivo temporário + rename, sem arquivo corrompido em caso de falha).
+# A serialização e o I/O rodam num ThreadPoolExecutor limitado, sobre uma
+# cópia (snapshot) tirada no event loop.
+#
+# Decklists ficam fora do estado do torneio, num armazenamento endereçado
+# por conteúdo (sha256 do texto, gzip, deduplicado); torneio_data guarda só
+# a referência. A exportação para o dono é escrita em streaming, deck a deck.
+#
+# Backends (STORAGE_BACKEND): "json" (arquivos + journal) e "sqlite" (WAL,
+# tabelas indexadas). Ambos expõem as mesmas operações usadas pelo bot.
+# Migração única JSON -> SQLite: python storage.py migrate
+# Teste de estresse do writer (pontuações mudando durante o flush):
+#   python storage.py stress [rodadas]
+
+import os
+import sys
+import json
+import gzip
+import time
+import copy
+import functools
+import asyncio
+import shutil
+import hashlib
+import tempfile
+import sqlite3
+import zipfile
+import threading
+from itertools import islice
+from io import BytesIO
+from collections import deque, OrderedDict
+from pathlib import Path
+
+from colorama import Fore
+
+from metrics import registry
+
+SEGMENT_SIZE = 1000
+RECENT_SIZE = 50
+SEGMENT_CACHE = 4
+ITER_CHUNK = 1000  # rows per query when iterating the SQLite history
+
+SAVE_SECONDS = registry.histogram("optcg_save_json_seconds", "Atomic JSON document writes", ("kind",))
+
+RANKING_DEFAULT = {"scores_1x1": {}, "scores_torneio": {}, "__last_reset": None}
+TORNEIO_DEFAULT = {
+    "active": False,
+    "inscriptions_open": False,
+    "players": [],
+    "decklists": {},
+    "deck_confirmed": {},
+    "round": 0,
+    "rounds_target": None,
+    "pairings": {},
+    "scores": {},
+    "played": {},
+    "byes": [],
+    "bye_history": [],
+    "records": {},
+    "finished": False,
+    "inscription_message_id": 0,
+    "tournament_champions": {}
+}
+
+
+def _save_kind(path: Path) -> str:
+    """Fixed-cardinality metric label for a saved file (one per segment index
+    file would grow forever)."""
+    name = path.name
+    if name.startswith("seg_") and name.endswith(".idx.json"):
+        return "journal-index"
+    if name == "index.json" and path.parent.name == "seasons":
+        return "seasons-index"
+    if path.stem in SAVE_KINDS:
+        return path.stem
+    return "other"
+
+
+def save_json(path: Path, data) -> bool:
+    """Atomic write: temp file + fsync + rename, the old file survives a failure."""
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with SAVE_SECONDS.time(_save_kind(path)):
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        return True
+    except Exception as e:
+        print(Fore.RED + f"[SAVE ERROR] {path}: {e}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def load_json(path: Path, default):
+    if not path.exists():
+        save_json(path, default)
+        return default
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        # keep the unreadable file for inspection instead of overwriting it
+        backup = path.with_name(f"{path.name}.corrupt-{int(time.time())}")
+        print(Fore.RED + f"[LOAD ERROR] {path}: {e} — cópia salva em {backup}")
+        try:
+            os.replace(path, backup)
+        except OSError:
+            pass
+        save_json(path, default)
+        return default
+
+
+# small named documents (poll registry, active 1x1 matches, scheduled jobs, ...)
+EXTRA_DOCUMENTS = ("polls", "partidas", "agenda")
+SAVE_KINDS = frozenset(("ranking", "torneio") + EXTRA_DOCUMENTS)
+
+
+def _fresh(default):
+    return json.loads(json.dumps(default))
+
+
+def _read_lines(fp):
+    """Yield decoded records, skipping a torn trailing line after a crash."""
+    for raw in fp:
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield json.loads(raw)
+        except ValueError:
+            continue
+
+
+def record_players(record: dict):
+    """Player ids of a match record (ties only list them under ``players``)."""
+    ids = record.get("players") or (record.get("winner"), record.get("loser"))
+    return tuple(dict.fromkeys(int(u) for u in ids if u is not None))
+
+
+class MatchJournal:
+    """Append-only, line-delimited match history split into gzip segments.
+
+    Record positions are stable: segment ``k`` holds exactly the records
+    ``k * segment_size`` .. ``(k + 1) * segment_size - 1``, the journal holds
+    the rest. Only the last ``recent_size`` records are kept in memory.
+    ``append`` only buffers; ``sync`` writes the buffer with a single fsync.
+    The writer may split ``sync`` into ``take_pending`` (event loop),
+    ``write_batch`` (worker thread) and ``finish_batch`` (event loop).
+
+    ``page``/``read_page`` page through one player's records via an
+    in-memory player -> positions index (per-segment index files + the
+    journal): ``page`` runs on the event loop and serves unsynced records
+    from memory, ``read_page`` reads the rest from disk under the compaction
+    lock and belongs on a worker thread.
+
+    A batch counts as durable once its fsync returned, even if the
+    compaction that follows fails; a failed compaction leaves the journal
+    as it was (``_journal_skip`` head lines already copied into segments)
+    and is retried on the next write.
+    """
+
+    def __init__(self, base_dir: Path, segment_size: int = SEGMENT_SIZE,
+                 recent_size: int = RECENT_SIZE):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.base_dir / "journal.jsonl"
+        self.segment_size = segment_size
+        self._recent = deque(maxlen=recent_size)
+        self._segments = self._scan_segments()
+        self._journal_count = 0  # journal records not yet in a segment
+        self._journal_skip = 0  # head lines of the journal file already in segments
+        self._pending = []
+        self._inflight = []
+        self._written = False  # the in-flight batch reached the disk
+        self._fp = None
+        self._lock = threading.Lock()  # compaction vs. reads of segments/journal
+        self._seg_cache = OrderedDict()
+        self._by_player = {}
+        for idx in range(len(self._segments)):
+            self._load_segment_index(idx)
+        self._load_journal()
+        self._durable = len(self._segments) * self.segment_size + self._journal_count
+
+    # ---- setup ----
+    def _segment_path(self, idx: int) -> Path:
+        return self.base_dir / f"seg_{idx:06d}.jsonl.gz"
+
+    def _scan_segments(self):
+        segs = []
+        while self._segment_path(len(segs)).exists():
+            segs.append(self._segment_path(len(segs)))
+        return segs
+
+    def _index_path(self, idx: int) -> Path:
+        return self.base_dir / f"seg_{idx:06d}.idx.json"
+
+    def _index(self, record: dict, pos: int):
+        for uid in record_players(record):
+            self._by_player.setdefault(uid, []).append(pos)
+
+    @staticmethod
+    def _build_index(records) -> dict:
+        index = {}
+        for line, rec in enumerate(records):
+            for uid in record_players(rec):
+                index.setdefault(str(uid), []).append(line)
+        return index
+
+    def _load_segment_index(self, idx: int):
+        path = self._index_path(idx)
+        index = None
+        if path.exists():
+            try:
+                index = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                index = None
+        if index is None:
+            # segments written before the index existed
+            index = self._build_index(self._read_segment(idx))
+            save_json(path, index)
+        base = idx * self.segment_size
+        for uid, lines in index.items():
+            self._by_player.setdefault(int(uid), []).extend(base + line for line in lines)
+
+    def _stale_head(self, records: list) -> int:
+        """Leading journal records that are already the last segments.
+
+        A crash (or failure) between writing a segment and truncating the
+        journal leaves the same records in both.
+        """
+        size, n = self.segment_size, len(self._segments)
+        for chunks in range(min(n, len(records) // size), 0, -1):
+            if all(list(self._read_segment(n - chunks + c)) == records[c * size:(c + 1) * size]
+                   for c in range(chunks)):
+                return chunks * size
+        return 0
+
+    def _load_journal(self):
+        base = len(self._segments) * self.segment_size
+        records = []
+        if self.journal_path.exists():
+            with self.journal_path.open("r", encoding="utf-8") as f:
+                records = list(_read_lines(f))
+        if len(records) >= self.segment_size:
+            self._journal_skip = self._stale_head(records)
+        for rec in records[self._journal_skip:]:
+            self._index(rec, base + self._journal_count)
+            self._journal_count += 1
+            self._recent.append(rec)
+        if self._journal_count >= self.segment_size or self._journal_skip:
+            self._compact()
+        if len(self._recent) < self._recent.maxlen and self._segments:
+            older = list(self._read_segment(len(self._segments) - 1))
+            need = self._recent.maxlen - len(self._recent)
+            for rec in reversed(older[-need:]):
+                self._recent.appendleft(rec)
+        self._fp = self.journal_path.open("a", encoding="utf-8")
+
+    def _read_segment(self, idx: int):
+        with gzip.open(self._segment_path(idx), "rt", encoding="utf-8") as f:
+            yield from _read_lines(f)
+
+    # ---- write path ----
+    def append(self, record: dict):
+        # records are written in append order (failed batches are re-queued
+        # in front), so the current length is the record's final position
+        self._index(record, len(self))
+        self._pending.append(record)
+        self._recent.append(record)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def take_pending(self):
+        batch, self._pending = self._pending, []
+        self._inflight = batch
+        self._written = False
+        return batch
+
+    def write_batch(self, batch):
+        if not batch:
+            return
+        with self._lock:
+            self._write_batch(batch)
+            if self._journal_count >= self.segment_size or self._journal_skip:
+                try:
+                    self._compact()
+                except Exception as e:
+                    # the batch is already durable in the journal
+                    print(Fore.RED + f"[JOURNAL] compactação falhou (nova tentativa na próxima gravação): {e}")
+
+    def _write_batch(self, batch):
+        start = os.fstat(self._fp.fileno()).st_size
+        try:
+            self._fp.write("".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in batch))
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+        except Exception:
+            # drop the partial write so the retried batch is not duplicated
+            try:
+                self._fp.close()
+            except Exception:
+                pass
+            with self.journal_path.open("r+b") as f:
+                f.truncate(start)
+            self._fp = self.journal_path.open("a", encoding="utf-8")
+            raise
+        self._journal_count += len(batch)
+        self._written = True
+
+    def finish_batch(self, batch, ok: bool):
+        self._inflight = []
+        # re-queue only what never reached the disk
+        if ok or self._written:
+            self._durable += len(batch)
+        else:
+            self._pending = batch + self._pending
+        self._written = False
+
+    def sync(self):
+        if self._fp is None or not self._pending:
+            return
+        batch = self.take_pending()
+        try:
+            self.write_batch(batch)
+            ok = True
+        except Exception as e:
+            print(Fore.RED + f"[JOURNAL] gravação falhou: {e}")
+            ok = False
+        self.finish_batch(batch, ok)
+
+    def _compact(self):
+        """Move the full journal into new immutable gzip segments."""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        try:
+            with self.journal_path.open("r", encoding="utf-8") as f:
+                records = list(_read_lines(f))[self._journal_skip:]
+            while len(records) >= self.segment_size:
+                chunk, records = records[:self.segment_size], records[self.segment_size:]
+                target = self._segment_path(len(self._segments))
+                tmp = target.with_suffix(".tmp")
+                with gzip.open(tmp, "wt", encoding="utf-8") as g:
+                    for rec in chunk:
+                        g.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+                save_json(self._index_path(len(self._segments)), self._build_index(chunk))
+                os.replace(tmp, target)
+                self._segments.append(target)
+                self._journal_skip += self.segment_size
+                self._journal_count -= self.segment_size
+            tmp = self.journal_path.with_suffix(".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.journal_path)
+            self._journal_skip = 0
+            self._journal_count = len(records)
+        finally:
+            self._fp = self.journal_path.open("a", encoding="utf-8")
+
+    def close(self):
+        self.sync()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    # ---- read path ----
+    def __len__(self):
+        return self._durable + len(self._inflight) + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def tail(self, n: int):
+        """Last ``n`` records (n <= recent_size) without touching disk."""
+        if n <= 0:
+            return []
+        return list(self._recent)[-n:]
+
+    def count_for_player(self, uid: int) -> int:
+        return len(self._by_player.get(int(uid), ()))
+
+    def page(self, uid: int, limit: int = 10, offset: int = 0):
+        """Event-loop half of ``for_player``: pick the positions of ``limit``
+        records of ``uid`` (newest first, skipping ``offset``) and take the
+        unsynced ones from memory. No I/O, no lock."""
+        positions = self._by_player.get(int(uid), [])
+        end = len(positions) - offset
+        wanted = positions[max(0, end - limit):max(0, end)][::-1]
+        unsynced = self._inflight + self._pending
+        first_unsynced = self._durable
+        found = {pos: unsynced[pos - first_unsynced] for pos in wanted if pos >= first_unsynced}
+        return wanted, found
+
+    def read_page(self, page) -> list:
+        """Disk half of ``for_player``: reads only the segments holding the
+        records (a few cached) and the journal. Takes the compaction lock, so
+        run it on a worker thread."""
+        wanted, found = page
+        found = dict(found)
+        disk = [pos for pos in wanted if pos not in found]
+        if disk:
+            with self._lock:
+                seg_base = len(self._segments) * self.segment_size
+                journal_lines = {}
+                for pos in disk:
+                    if pos < seg_base:
+                        found[pos] = self._segment_records(pos // self.segment_size)[pos % self.segment_size]
+                    else:
+                        journal_lines[pos - seg_base + self._journal_skip] = pos
+                if journal_lines:
+                    # same line filter as when the journal was indexed
+                    with self.journal_path.open("r", encoding="utf-8") as f:
+                        for line, rec in enumerate(_read_lines(f)):
+                            if line in journal_lines:
+                                found[journal_lines[line]] = rec
+        return [found[pos] for pos in wanted if pos in found]
+
+    def for_player(self, uid: int, limit: int = 10, offset: int = 0):
+        """``limit`` records of ``uid``, newest first, skipping ``offset``
+        (blocking: ``page`` + ``read_page`` in one call, for scripts)."""
+        return self.read_page(self.page(uid, limit, offset))
+
+    def _segment_records(self, idx: int) -> list:
+        records = self._seg_cache.get(idx)
+        if records is None:
+            records = self._seg_cache[idx] = list(self._read_segment(idx))
+            if len(self._seg_cache) > SEGMENT_CACHE:
+                self._seg_cache.popitem(last=False)
+        else:
+            self._seg_cache.move_to_end(idx)
+        return records
+
+    def __iter__(self):
+        """Stream every record, oldest first, one segment at a time.
+
+        The unsynced records (in flight and pending) are captured first;
+        disk reads stop at the durable count taken at the same moment.
+        Segments are immutable and read without the lock; the journal is
+        read under it, so a concurrent compaction cannot shift its lines.
+        """
+        unsynced = self._inflight + self._pending
+        remaining = self._durable
+        idx = 0
+        while remaining > 0:
+            with self._lock:
+                in_journal = idx >= len(self._segments)
+                if in_journal:
+                    with self.journal_path.open("r", encoding="utf-8") as f:
+                        records = list(islice(_read_lines(f), self._journal_skip, self._journal_skip + remaining))
+            if not in_journal:
+                records = list(islice(self._read_segment(idx), remaining))
+                idx += 1
+            yield from records
+            remaining -= len(records)
+            if in_journal:
+                break
+        yield from unsynced
+
+    def import_legacy(self, path: Path):
+        """One-shot import of the old whole-document historico.json."""
+        path = Path(path)
+        if not path.exists():
+            return 0
+        try:
+            raw = path.read_text(encoding="utf-8")
+            legacy = json.loads(raw) if raw.strip() else []
+        except Exception as e:
+            print(Fore.RED + f"[JOURNAL] historico legado ilegível {path}: {e}")
+            return 0
+        if not isinstance(legacy, list):
+            return 0
+        for rec in legacy:
+            self.append(rec)
+        self.sync()
+        os.replace(path, path.with_suffix(".json.migrated"))
+        print(Fore.CYAN + f"[JOURNAL] {len(legacy)} partidas importadas de {path}")
+        return len(legacy)
+
+
+# ---------------- DECKLISTS ----------------
+EXPORT_CHUNK = 64 * 1024
+
+
+def normalize_deck_text(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def deck_digest(text: str) -> str:
+    return hashlib.sha256(normalize_deck_text(text).encode("utf-8")).hexdigest()
+
+
+def is_deck_ref(value) -> bool:
+    return isinstance(value, str) and len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+class DeckStore:
+    """Content-addressed decklists: ``objects/ab/<sha256>.gz``.
+
+    ``put`` returns the digest and writes nothing when the same text is
+    already stored; objects are immutable, so a write is temp file + rename.
+    """
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.base_dir / digest[:2] / f"{digest}.gz"
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def put(self, text: str) -> str:
+        text = normalize_deck_text(text)
+        digest = deck_digest(text)
+        path = self._path(digest)
+        if path.exists():
+            return digest
+        path.parent.mkdir(exist_ok=True)
+        # a private temp file per writer: two threads storing the same text
+        # must not share (and rename away) each other's file
+        fd, tmp = tempfile.mkstemp(prefix=f"{digest}.", suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(text.encode("utf-8"))
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            # content-addressed: whoever won the race stored the same bytes
+            if not path.exists():
+                raise
+        return digest
+
+    def open(self, digest: str):
+        """Binary stream of the (uncompressed) decklist."""
+        return gzip.open(self._path(digest), "rb")
+
+    def get(self, digest: str) -> str:
+        try:
+            with self.open(digest) as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return ""
+
+
+def intern_decklists(store, torneio: dict) -> int:
+    """Move raw decklist texts (older state files) into ``store``, keeping refs."""
+    decks = torneio.setdefault("decklists", {})
+    moved = 0
+    for uid, value in list(decks.items()):
+        if value and not is_deck_ref(value):
+            decks[uid] = store.put(value)
+            moved += 1
+    return moved
+
+
+def export_decklists(store, out_path: Path, entries) -> Path:
+    """Stream ``entries`` (``(name, header, digest)``) into a .zip or .txt file.
+
+    Each decklist is copied from the store in ``EXPORT_CHUNK`` pieces, so the
+    export never holds more than one chunk in memory.
+    """
+    out_path = Path(out_path)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    if out_path.suffix == ".zip":
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, header, digest in entries:
+                with zf.open(f"{name}.txt", "w") as out:
+                    out.write(header.encode("utf-8"))
+                    if digest:
+                        with store.open(digest) as src:
+                            shutil.copyfileobj(src, out, EXPORT_CHUNK)
+    else:
+        with tmp.open("wb") as out:
+            for name, header, digest in entries:
+                out.write(header.encode("utf-8"))
+                if digest:
+                    with store.open(digest) as src:
+                        shutil.copyfileobj(src, out, EXPORT_CHUNK)
+                out.write(b"\n\n---\n\n")
+    os.replace(tmp, out_path)
+    return out_path
+
+
+# ---------------- BACKENDS ----------------
+class JsonStorage:
+    """Whole-document JSON files for ranking/torneio plus the match journal.
+
+    There are no point updates: pending scores make the PersistenceWriter
+    write its snapshot of the whole ranking document instead.
+    """
+
+    name = "json"
+    point_updates = False
+
+    def __init__(self, data_path: Path):
+        self.data_path = Path(data_path)
+        self.ranking_file = self.data_path / "ranking.json"
+        self.torneio_file = self.data_path / "torneio.json"
+        self.matches = MatchJournal(self.data_path / "historico")
+        self.matches.import_legacy(self.data_path / "historico.json")
+        self.decks = DeckStore(self.data_path / "decklists" / "objects")
+
+    def load_ranking(self):
+        return load_json(self.ranking_file, _fresh(RANKING_DEFAULT))
+
+    def save_ranking(self, data):
+        return save_json(self.ranking_file, data)
+
+    def load_torneio(self):
+        return load_json(self.torneio_file, _fresh(TORNEIO_DEFAULT))
+
+    def save_torneio(self, data):
+        return save_json(self.torneio_file, data)
+
+    def load_doc(self, name: str, default):
+        return load_json(self.data_path / f"{name}.json", _fresh(default))
+
+    def save_doc(self, name: str, data):
+        return save_json(self.data_path / f"{name}.json", data)
+
+    def sync(self):
+        self.matches.sync()
+
+    def close(self):
+        self.matches.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    scope TEXT NOT NULL,
+    player_id INTEGER NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, player_id)
+);
+-- only served the removed top_scores query; every score write paid for it
+DROP INDEX IF EXISTS idx_scores_rank;
+CREATE TABLE IF NOT EXISTS matches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id TEXT,
+    winner INTEGER,
+    loser INTEGER,
+    tie INTEGER NOT NULL DEFAULT 0,
+    source TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_matches_winner ON matches (winner);
+CREATE INDEX IF NOT EXISTS idx_matches_loser ON matches (loser);
+CREATE TABLE IF NOT EXISTS match_players (
+    player_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (player_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pairings (
+    pairing_id TEXT PRIMARY KEY,
+    round INTEGER,
+    player1 INTEGER,
+    player2 INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pairings_p1 ON pairings (player1);
+CREATE INDEX IF NOT EXISTS idx_pairings_p2 ON pairings (player2);
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decklists (
+    player_id INTEGER PRIMARY KEY,
+    text TEXT,  -- deck_objects digest
+    confirmed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS deck_objects (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+# torneio_data keys stored in their own tables; everything else lives in meta
+TORNEIO_TABLE_KEYS = ("players", "decklists", "deck_confirmed", "pairings", "scores", "tournament_champions")
+SCOPE_TORNEIO_EVENT = "torneio_event"
+SCOPE_CHAMPIONS = "tournament_champions"
+
+
+def _locked(fn):
+    """Run the method holding ``self.lock``: the SQLite connection is shared by
+    reads on the event loop and write transactions on the executor."""
+    @functools.wraps(fn)
+    def inner(self, *args, **kwargs):
+        with self.lock:
+            return fn(self, *args, **kwargs)
+    return inner
+
+
+class SqliteMatchLog:
+    """Match history table exposing the same interface as MatchJournal.
+
+    ``_inflight`` is the batch being written on the executor; once its
+    transaction commits (``_committed``) readers get it from the table rather
+    than from memory, so nothing is counted twice before ``finish_batch``.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self.conn = conn
+        self.lock = lock
+        self._pending = []
+        self._inflight = []
+        self._committed = False
+        self._durable = self._count()
+        if self._durable and conn.execute("SELECT 1 FROM match_players LIMIT 1").fetchone() is None:
+            self._backfill_players()
+
+    @_locked
+    def _count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    @staticmethod
+    def _row(record: dict):
+        return (record.get("match_id"), record.get("winner"), record.get("loser"), 1 if record.get("tie") else 0,
+                record.get("source"), record.get("timestamp"), json.dumps(record, ensure_ascii=False))
+
+    def append(self, record: dict):
+        self._pending.append(record)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def _insert(self, records) -> int:
+        count = 0
+        for r in records:
+            seq = self.conn.execute(
+                "INSERT INTO matches (match_id, winner, loser, tie, source, timestamp, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._row(r)).lastrowid
+            self.conn.executemany("INSERT OR IGNORE INTO match_players (player_id, seq) VALUES (?, ?)",
+                                  [(uid, seq) for uid in record_players(r)])
+            count += 1
+        return count
+
+    @_locked
+    def _backfill_players(self):
+        with self.conn:
+            for seq, data in self.conn.execute("SELECT seq, data FROM matches").fetchall():
+                self.conn.executemany("INSERT OR IGNORE INTO match_players (player_id, seq) VALUES (?, ?)",
+                                      [(uid, seq) for uid in record_players(json.loads(data))])
+
+    @_locked
+    def append_many(self, records):
+        with self.conn:
+            self._durable += self._insert(records)
+
+    @_locked
+    def replace_all(self, records) -> int:
+        """Replace the whole history (matches and the player index) in one transaction."""
+        with self.conn:
+            self.conn.execute("DELETE FROM match_players")
+            self.conn.execute("DELETE FROM matches")
+            count = self._insert(records)
+        self._durable = self._count()
+        return count
+
+    @_locked
+    def take_pending(self):
+        batch, self._pending = self._pending, []
+        self._inflight = batch
+        self._committed = False
+        return batch
+
+    @_locked
+    def write_batch(self, batch):
+        if not batch:
+            return
+        with self.conn:
+            self._insert(batch)
+        self._committed = True
+
+    @_locked
+    def finish_batch(self, batch, ok: bool):
+        self._inflight = []
+        if ok or self._committed:
+            self._durable += len(batch)
+        else:
+            self._pending = batch + self._pending
+        self._committed = False
+
+    def _unsynced(self):
+        return self._pending if self._committed else self._inflight + self._pending
+
+    @_locked
+    def tail(self, n: int):
+        if n <= 0:
+            return []
+        rows = self.conn.execute("SELECT data FROM matches ORDER BY seq DESC LIMIT ?", (n,)).fetchall()
+        return ([json.loads(r[0]) for r in reversed(rows)] + self._unsynced())[-n:]
+
+    def _unsynced_for(self, uid: int):
+        return [r for r in reversed(self._unsynced()) if int(uid) in record_players(r)]
+
+    @_locked
+    def count_for_player(self, uid: int) -> int:
+        row = self.conn.execute("SELECT COUNT(*) FROM match_players WHERE player_id = ?", (int(uid),)).fetchone()
+        return row[0] + len(self._unsynced_for(uid))
+
+    def page(self, uid: int, limit: int = 10, offset: int = 0):
+        # same split as MatchJournal; the query and the unsynced records are
+        # read together under the lock, so everything happens in read_page
+        return uid, limit, offset
+
+    def read_page(self, page) -> list:
+        return self.for_player(*page)
+
+    @_locked
+    def for_player(self, uid: int, limit: int = 10, offset: int = 0):
+        """``limit`` records of ``uid``, newest first, skipping ``offset``."""
+        unsynced = self._unsynced_for(uid)
+        pending = unsynced[offset:offset + limit]
+        db_offset = max(0, offset - len(unsynced))
+        rows = self.conn.execute(
+            "SELECT m.data FROM match_players p JOIN matches m ON m.seq = p.seq "
+            "WHERE p.player_id = ? ORDER BY p.seq DESC LIMIT ? OFFSET ?",
+            (int(uid), limit - len(pending), db_offset)).fetchall()
+        return pending + [json.loads(r[0]) for r in rows]
+
+    def __len__(self):
+        return self._durable + len(self._inflight) + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        # chunked reads: the lock is never held across a yield
+        with self.lock:
+            unsynced = list(self._unsynced())
+            last = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM matches").fetchone()[0]
+        seq = 0
+        while seq < last:
+            with self.lock:
+                rows = self.conn.execute("SELECT seq, data FROM matches WHERE seq > ? AND seq <= ? ORDER BY seq LIMIT ?",
+                                         (seq, last, ITER_CHUNK)).fetchall()
+            if not rows:
+                break
+            seq = rows[-1][0]
+            for _, data in rows:
+                yield json.loads(data)
+        yield from unsynced
+
+    def sync(self):
+        if not self._pending:
+            return
+        batch = self.take_pending()
+        try:
+            self.write_batch(batch)
+            ok = True
+        except Exception as e:
+            print(Fore.RED + f"[SQLITE] gravação de partidas falhou: {e}")
+            ok = False
+        self.finish_batch(batch, ok)
+
+    def close(self):
+        pass
+
+
+class SqliteDeckStore:
+    """``DeckStore`` over the deck_objects table (gzip blobs keyed by sha256)."""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self.conn = conn
+        self.lock = lock
+
+    @_locked
+    def __contains__(self, digest: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM deck_objects WHERE digest = ?", (digest,)).fetchone() is not None
+
+    @_locked
+    def put(self, text: str) -> str:
+        text = normalize_deck_text(text)
+        digest = deck_digest(text)
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO deck_objects (digest, data) VALUES (?, ?)",
+                              (digest, gzip.compress(text.encode("utf-8"))))
+        return digest
+
+    @_locked
+    def open(self, digest: str):
+        row = self.conn.execute("SELECT data FROM deck_objects WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(digest)
+        return gzip.GzipFile(fileobj=BytesIO(row[0]), mode="rb")
+
+    def get(self, digest: str) -> str:
+        try:
+            with self.open(digest) as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return ""
+
+
+class SqliteStorage:
+    """SQLite (WAL) backend: indexed tables for players, matches, pairings,
+    decklists and scores.
+
+    One connection serves the event loop and the executor threads; ``lock``
+    (shared with ``matches`` and ``decks``) serializes every use of it, so a
+    read never lands in the middle of a write transaction.
+    """
+
+    name = "sqlite"
+    point_updates = True
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.matches = SqliteMatchLog(self.conn, self.lock)
+        self.decks = SqliteDeckStore(self.conn, self.lock)
+
+    # ---- meta ----
+    @_locked
+    def _get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta_many(self, items):
+        self.conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in items])
+
+    # ---- scores ----
+    def _scores(self, scope: str) -> dict:
+        rows = self.conn.execute("SELECT player_id, points FROM scores WHERE scope = ?", (scope,))
+        return {str(pid): pts for pid, pts in rows}
+
+    def _replace_scores(self, scope: str, scores: dict):
+        self.conn.execute("DELETE FROM scores WHERE scope = ?", (scope,))
+        self.conn.executemany("INSERT INTO scores (scope, player_id, points) VALUES (?, ?, ?)",
+                              [(scope, int(uid), pts) for uid, pts in scores.items()])
+
+    @_locked
+    def set_scores(self, items):
+        """``items``: ``{(scope, uid): value}``, upserted in one transaction."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO scores (scope, player_id, points) VALUES (?, ?, ?) "
+                "ON CONFLICT(scope, player_id) DO UPDATE SET points = excluded.points",
+                [(scope, int(uid), value) for (scope, uid), value in items.items()])
+        return True
+
+    # ---- ranking document ----
+    # every dict in the ranking doc (scores_1x1, scores_torneio, elo_1x1, ...)
+    # is a scope in the scores table; scalar keys go to meta
+    @_locked
+    def load_ranking(self):
+        data = _fresh(RANKING_DEFAULT)
+        scopes = [scope for (scope,) in self.conn.execute(
+            "SELECT DISTINCT scope FROM scores WHERE scope NOT IN (?, ?)", (SCOPE_TORNEIO_EVENT, SCOPE_CHAMPIONS))]
+        for scope in scopes:
+            data[scope] = self._scores(scope)
+        for key, value in self.conn.execute("SELECT key, value FROM meta WHERE key LIKE 'ranking.%'"):
+            data[key[len("ranking."):]] = json.loads(value)
+        return data
+
+    @_locked
+    def save_ranking(self, data):
+        with self.conn:
+            for key, value in data.items():
+                if isinstance(value, dict):
+                    self._replace_scores(key, value)
+            self._set_meta_many([(f"ranking.{k}", v) for k, v in data.items() if not isinstance(v, dict)])
+        return True
+
+    # ---- torneio document ----
+    @_locked
+    def load_torneio(self):
+        data = _fresh(TORNEIO_DEFAULT)
+        for key, value in self.conn.execute("SELECT key, value FROM meta WHERE key LIKE 'torneio.%'"):
+            data[key[len("torneio."):]] = json.loads(value)
+        data["players"] = [pid for (pid,) in self.conn.execute("SELECT player_id FROM players ORDER BY position")]
+        for pid, text, confirmed in self.conn.execute("SELECT player_id, text, confirmed FROM decklists"):
+            if text is not None:
+                data["decklists"][str(pid)] = text
+            data["deck_confirmed"][str(pid)] = bool(confirmed)
+        data["pairings"] = {pid: json.loads(raw) for pid, raw in
+                            self.conn.execute("SELECT pairing_id, data FROM pairings ORDER BY rowid")}
+        data["scores"] = self._scores(SCOPE_TORNEIO_EVENT)
+        data["tournament_champions"] = self._scores(SCOPE_CHAMPIONS)
+        return data
+
+    @_locked
+    def save_torneio(self, data):
+        with self.conn:
+            self.conn.execute("DELETE FROM meta WHERE key LIKE 'torneio.%'")
+            self._set_meta_many([(f"torneio.{k}", v) for k, v in data.items() if k not in TORNEIO_TABLE_KEYS])
+            self.conn.execute("DELETE FROM players")
+            self.conn.executemany("INSERT INTO players (player_id, position) VALUES (?, ?)",
+                                  [(int(uid), i) for i, uid in enumerate(data.get("players", []))])
+            decks = data.get("decklists", {})
+            confirmed = data.get("deck_confirmed", {})
+            self.conn.execute("DELETE FROM decklists")
+            self.conn.executemany("INSERT INTO decklists (player_id, text, confirmed) VALUES (?, ?, ?)",
+                                  [(int(uid), decks.get(uid), 1 if confirmed.get(uid) else 0)
+                                   for uid in set(decks) | set(confirmed)])
+            self.conn.execute("DELETE FROM pairings")
+            self.conn.executemany(
+                "INSERT INTO pairings (pairing_id, round, player1, player2, data) VALUES (?, ?, ?, ?, ?)",
+                [(pid, p.get("round"), p.get("player1"), p.get("player2"), json.dumps(p, ensure_ascii=False))
+                 for pid, p in data.get("pairings", {}).items()])
+            self._replace_scores(SCOPE_TORNEIO_EVENT, data.get("scores", {}))
+            self._replace_scores(SCOPE_CHAMPIONS, data.get("tournament_champions", {}))
+        return True
+
+    # ---- named documents ----
+    @_locked
+    def load_doc(self, name: str, default):
+        row = self.conn.execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else _fresh(default)
+
+    @_locked
+    def save_doc(self, name: str, data):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO documents (name, data) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                (name, json.dumps(data, ensure_ascii=False)))
+        return True
+
+    # ---- matches ----
+    def sync(self):
+        self.matches.sync()
+
+    def close(self):
+        self.sync()
+        with self.lock:
+            self.conn.close()
+
+
+# ---------------- PERSISTENCE WRITER ----------------
+class PersistenceWriter:
+    """Dirty-tracking, coalescing writer in front of a storage backend.
+
+    Handlers call ``mark_dirty``/``mark_score``; ``flush`` (driven by a
+    periodic task and on shutdown) writes each dirty document once, no
+    matter how many changes happened since the previous flush.
+
+    ``flush_async`` deep-copies the dirty documents on the event loop and
+    runs serialization + disk I/O on ``executor``, so a handler mutating
+    state meanwhile can never produce a torn file.
+
+    ``generation(name)`` counts the changes marked on a document; readers
+    that cache a rendering of it use it as the version.
+    """
+
+    def __init__(self, store, documents: dict, executor=None):
+        self.store = store
+        self.documents = documents  # name -> (getter, saver)
+        self.executor = executor
+        self._dirty = set()
+        self._scores = {}  # (scope, uid) -> value
+        self._generations = {}
+        self._lock = asyncio.Lock()
+
+    def mark_dirty(self, name: str):
+        self._dirty.add(name)
+        self._generations[name] = self._generations.get(name, 0) + 1
+
+    def mark_score(self, scope: str, uid: int, value: int):
+        self._scores[(scope, uid)] = value
+        # scores live in the ranking document
+        self._generations["ranking"] = self._generations.get("ranking", 0) + 1
+
+    def generation(self, name: str) -> int:
+        return self._generations.get(name, 0)
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._dirty or self._scores or self.store.matches.dirty)
+
+    def _snapshot(self):
+        dirty, self._dirty = self._dirty, set()
+        scores, self._scores = self._scores, {}
+        if scores and not self.store.point_updates:
+            # the live document already holds the new values; write its copy
+            dirty.add("ranking")
+        docs = {name: copy.deepcopy(self.documents[name][0]()) for name in dirty}
+        # point updates are redundant once the whole ranking document is written
+        if "ranking" in docs:
+            scores = {}
+        return docs, scores, self.store.matches.take_pending()
+
+    def _write(self, snapshot):
+        """Runs on a worker thread; returns what failed so it can be retried."""
+        docs, scores, batch = snapshot
+        failed_docs, failed_scores = [], {}
+        for name, data in docs.items():
+            try:
+                ok = self.documents[name][1](data)
+            except Exception as e:
+                print(Fore.RED + f"[PERSIST] {name}: {e}")
+                ok = False
+            if not ok:
+                failed_docs.append(name)
+        if scores:
+            # every pending score goes out in a single write of the ranking
+            try:
+                ok = self.store.set_scores(scores)
+            except Exception as e:
+                print(Fore.RED + f"[PERSIST] scores: {e}")
+                ok = False
+            if not ok:
+                failed_scores = scores
+        try:
+            self.store.matches.write_batch(batch)
+            matches_ok = True
+        except Exception as e:
+            print(Fore.RED + f"[PERSIST] partidas: {e}")
+            matches_ok = False
+        return failed_docs, failed_scores, matches_ok
+
+    def _finish(self, snapshot, result):
+        failed_docs, failed_scores, matches_ok = result
+        self._dirty.update(failed_docs)
+        for key, value in failed_scores.items():
+            self._scores.setdefault(key, value)
+        self.store.matches.finish_batch(snapshot[2], matches_ok)
+
+    def flush(self):
+        """Synchronous flush, for shutdown and scripts."""
+        snapshot = self._snapshot()
+        self._finish(snapshot, self._write(snapshot))
+
+    async def flush_async(self):
+        async with self._lock:
+            if not self.pending:
+                return
+            snapshot = self._snapshot()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, self._write, snapshot)
+            self._finish(snapshot, result)
+
+    async def shutdown(self):
+        """Final flush; waits for an in-progress background flush first."""
+        async with self._lock:
+            self.flush()
+
+
+def open_storage(backend: str, data_path: Path):
+    """Build the configured backend; a new SQLite db is seeded from the JSON files."""
+    data_path = Path(data_path)
+    if backend == "sqlite":
+        db_path = data_path / "opttcg.db"
+        fresh = not db_path.exists()
+        store = SqliteStorage(db_path)
+        if fresh:
+            migrate_json_to_sqlite(data_path, store)
+        return store
+    return JsonStorage(data_path)
+
+
+def migrate_json_to_sqlite(data_path: Path, target: "SqliteStorage"):
+    """One-shot copy of ranking.json, torneio.json (and its decklists) and the match history."""
+    source = JsonStorage(data_path)
+    target.save_ranking(source.load_ranking())
+    torneio = source.load_torneio()
+    intern_decklists(source.decks, torneio)
+    for ref in set(torneio.get("decklists", {}).values()):
+        if ref and ref not in target.decks:
+            target.decks.put(source.decks.get(ref))
+    target.save_torneio(torneio)
+    for name in EXTRA_DOCUMENTS:
+        if (Path(data_path) / f"{name}.json").exists():
+            target.save_doc(name, source.load_doc(name, {}))
+    count = target.matches.replace_all(iter(source.matches))
+    source.close()
+    print(Fore.CYAN + f"[MIGRATE] JSON -> SQLite concluído ({count} partidas) em {target.db_path}")
+    return count
+
+
+def _stress(rounds: int):
+    """Mutate scores on the loop while background flushes run, for both
+    backends, and check that what lands on disk is the final state."""
+    import random
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    async def run(store):
+        ranking = store.load_ranking()
+        writer = PersistenceWriter(store, {"ranking": (lambda: ranking, store.save_ranking)},
+                                   ThreadPoolExecutor(max_workers=2))
+        rng = random.Random(42)
+        flushes = []
+        for i in range(rounds):
+            for _ in range(50):
+                scope = rng.choice(("scores_1x1", "elo_1x1"))
+                uid = rng.randrange(10 ** 17, 10 ** 17 + 500)
+                value = ranking.setdefault(scope, {}).get(str(uid), 0) + rng.randint(1, 30)
+                ranking[scope][str(uid)] = value
+                writer.mark_score(scope, uid, value)
+                # readers iterate the live dicts while the flush runs
+                sum(ranking[scope].values())
+            if not flushes or flushes[-1].done():
+                flushes.append(asyncio.ensure_future(writer.flush_async()))
+            await asyncio.sleep(0)
+        await asyncio.gather(*flushes)
+        await writer.flush_async()
+        return ranking
+
+    for backend in ("json", "sqlite"):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = open_storage(backend, Path(tmp))
+            t0 = time.perf_counter()
+            live = asyncio.run(run(store))
+            elapsed = time.perf_counter() - t0
+            store.close()
+            disk = open_storage(backend, Path(tmp)).load_ranking()
+            for scope in ("scores_1x1", "elo_1x1"):
+                assert disk[scope] == live[scope], f"{backend}: {scope} divergente"
+            print(f"{backend}: {rounds} rodadas x 50 pontuações, {len(live['scores_1x1'])} jogadores, "
+                  f"disco == memória ({elapsed * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        base = Path(sys.argv[2]) if len(sys.argv) >= 3 else Path("data")
+        store = SqliteStorage(base / "opttcg.db")
+        migrate_json_to_sqlite(base, store)
+        store.close()
+    elif len(sys.argv) >= 2 and sys.argv[1] == "stress":
+        _stress(int(sys.argv[2]) if len(sys.argv) >= 3 else 2000)
+    else:
+        print("Uso: python storage.py migrate [pasta_data] | stress [rodadas]")
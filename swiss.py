@@ -0,0 +1,322 @@
+# swiss.py — OPTCG Sorocaba — emparelhamento suíço
+#
+# Emparelhamento por custo mínimo: cada par custa a diferença de pontos ao
+# quadrado, mais uma penalidade alta para revanches; o bye vai para o jogador
+# de menor pontuação que ainda não recebeu bye. Até EXACT_MAX jogadores o
+# emparelhamento ótimo é calculado exatamente (programação dinâmica sobre
+# subconjuntos: o primeiro jogador livre escolhe o parceiro). Acima disso a
+# solução inicial é gulosa (cada jogador com o adversário mais barato entre
+# os próximos da classificação), refinada por trocas entre pares enquanto o
+# custo total diminuir; se sobrar revanche, a vizinhança de cada uma
+# (EXACT_MAX jogadores) é resolvida de novo de forma exata. Determinístico:
+# mesma entrada, mesmos pares.
+#
+# Standings mantém a classificação com desempates (Buchholz e OMW%)
+# atualizados incrementalmente a cada resultado: só os oponentes de quem
+# mudou de pontuação são tocados, sem recalcular todas as rodadas.
+#
+# Benchmark: python swiss.py [jogadores] [rodadas]
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCORE_WEIGHT = 100.0
+REMATCH_PENALTY = 1_000_000.0
+RANK_WEIGHT = 0.01
+CANDIDATE_WINDOW = 16
+SWAP_WINDOW = 16
+MAX_PASSES = 8
+EXACT_MAX = 16  # players solved exactly (~1.6k subproblems, a few ms)
+
+
+def _opponents(played: Optional[dict], players: Iterable[int]) -> Dict[int, Counter]:
+    played = played or {}
+    return {u: Counter(int(o) for o in played.get(str(u), [])) for u in players}
+
+
+def choose_bye(order: List[int], scores: dict, bye_history: Iterable[int]) -> int:
+    """Lowest-ranked player among those with the fewest byes so far."""
+    counts = Counter(int(u) for u in bye_history or [])
+    rank = {u: i for i, u in enumerate(order)}
+    return min(order, key=lambda u: (counts[u], scores.get(str(u), 0), -rank[u]))
+
+
+def _exact_pairs(players: List[int], cost) -> List[Tuple[int, int]]:
+    """Minimum-cost perfect matching of an even ``players`` list.
+
+    Subset DP where the first free player picks its partner: the reachable
+    states grow like Fibonacci numbers, not 2^n. Ties keep the earliest
+    partner in ``players`` order.
+    """
+    n = len(players)
+    c = [[cost(a, b) for b in players] for a in players]
+    full = (1 << n) - 1
+    memo = {full: (0.0, None)}
+
+    def best(mask: int):
+        found = memo.get(mask)
+        if found is not None:
+            return found
+        i = (~mask & (mask + 1)).bit_length() - 1
+        taken = mask | 1 << i
+        found = None
+        for j in range(i + 1, n):
+            if not taken >> j & 1:
+                total = best(taken | 1 << j)[0] + c[i][j]
+                if found is None or total < found[0] - 1e-9:
+                    found = (total, j)
+        memo[mask] = found
+        return found
+
+    best(0)
+    pairs, mask = [], 0
+    while mask != full:
+        i = (~mask & (mask + 1)).bit_length() - 1
+        j = memo[mask][1]
+        pairs.append((players[i], players[j]))
+        mask |= 1 << i | 1 << j
+    return pairs
+
+
+def pair_round(players: List[int], scores: dict, played: Optional[dict] = None,
+               bye_history: Optional[Iterable[int]] = None) -> Tuple[List[Tuple[int, int]], Optional[int]]:
+    """Pair one Swiss round.
+
+    ``scores`` and ``played`` are keyed by ``str(uid)`` like ``torneio_data``;
+    ``played[str(uid)]`` lists previous opponents and ``bye_history`` every
+    player that already got a bye. Returns ``(pairs, bye)``.
+    """
+    order = sorted(players, key=lambda u: (-scores.get(str(u), 0), u))
+    bye = None
+    if len(order) % 2 == 1:
+        bye = choose_bye(order, scores, bye_history)
+        order = [u for u in order if u != bye]
+    if not order:
+        return [], bye
+
+    rank = {u: i for i, u in enumerate(order)}
+    pts = {u: scores.get(str(u), 0) for u in order}
+    opp = _opponents(played, order)
+
+    def cost(a: int, b: int) -> float:
+        return (SCORE_WEIGHT * (pts[a] - pts[b]) ** 2
+                + REMATCH_PENALTY * opp[a][b]
+                + RANK_WEIGHT * abs(rank[a] - rank[b]))
+
+    if len(order) <= EXACT_MAX:
+        return _finish(_exact_pairs(order, cost), rank), bye
+
+    # greedy: top of the standings picks the cheapest nearby opponent
+    pairs = []
+    unpaired = list(order)
+    while unpaired:
+        a = unpaired[0]
+        window = unpaired[1:1 + CANDIDATE_WINDOW]
+        b = min(window, key=lambda c: (cost(a, c), rank[c]))
+        unpaired.remove(b)
+        unpaired.pop(0)
+        pairs.append((a, b))
+
+    def improve(i: int, j: int) -> bool:
+        (a, b), (c, d) = pairs[i], pairs[j]
+        current = cost(a, b) + cost(c, d)
+        alt1 = cost(a, c) + cost(b, d)
+        alt2 = cost(a, d) + cost(b, c)
+        if min(alt1, alt2) < current - 1e-9:
+            if alt1 <= alt2:
+                pairs[i], pairs[j] = (a, c), (b, d)
+            else:
+                pairs[i], pairs[j] = (a, d), (b, c)
+            return True
+        return False
+
+    # local search: swap partners between nearby pairs while it helps,
+    # and let any remaining rematch look across the whole round
+    for _ in range(MAX_PASSES):
+        improved = False
+        for i in range(len(pairs)):
+            for j in range(i + 1, min(len(pairs), i + 1 + SWAP_WINDOW)):
+                improved |= improve(i, j)
+        for i in range(len(pairs)):
+            a, b = pairs[i]
+            if opp[a][b]:
+                for j in range(len(pairs)):
+                    if j != i and improve(min(i, j), max(i, j)):
+                        improved = True
+                        break
+        if not improved:
+            break
+
+    # a rematch that survived the swaps may need a 3+-pair rotation: re-solve
+    # its standings neighbourhood exactly
+    span = EXACT_MAX // 2
+    tried = set()
+    while True:
+        pairs.sort(key=lambda p: min(rank[p[0]], rank[p[1]]))
+        i = next((k for k, (a, b) in enumerate(pairs) if opp[a][b] and (a, b) not in tried), None)
+        if i is None:
+            break
+        tried.add(pairs[i])
+        lo = max(0, min(i - span // 2, len(pairs) - span))
+        block = pairs[lo:lo + span]
+        members = sorted((u for p in block for u in p), key=rank.get)
+        better = _exact_pairs(members, cost)
+        if sum(cost(x, y) for x, y in better) < sum(cost(x, y) for x, y in block) - 1e-9:
+            pairs[lo:lo + span] = better
+
+    return _finish(pairs, rank), bye
+
+
+def _finish(pairs: List[Tuple[int, int]], rank: Dict[int, int]) -> List[Tuple[int, int]]:
+    """Higher-ranked player first, tables in standings order."""
+    pairs = [(a, b) if rank[a] < rank[b] else (b, a) for a, b in pairs]
+    pairs.sort(key=lambda p: rank[p[0]])
+    return pairs
+
+
+# ---------------- STANDINGS ----------------
+MIN_MWP = 0.33
+
+
+class Standings:
+    """Ordered standings with incremental tiebreakers, backed by ``torneio_data``.
+
+    Raw state stays in the tournament document (``scores``, ``played``,
+    ``bye_history`` and ``records[str(uid)] = {"w", "l", "t"}``); this object
+    owns the derived Buchholz / opponent-match-win% sums and a cached, fully
+    ordered table. ``record_result``/``record_bye`` update both in
+    O(rounds); ``table()`` is cached until the next change.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.rebuild()
+
+    # ---- raw accessors ----
+    def _rec(self, uid: int) -> dict:
+        return self.data.setdefault("records", {}).setdefault(str(uid), {"w": 0, "l": 0, "t": 0})
+
+    def points(self, uid: int) -> int:
+        return self.data.get("scores", {}).get(str(uid), 0)
+
+    def _opps(self, uid: int) -> list:
+        return self.data.setdefault("played", {}).setdefault(str(uid), [])
+
+    def mwp(self, uid: int) -> float:
+        rec = self._rec(uid)
+        byes = self._byes.get(uid, 0)
+        games = rec["w"] + rec["l"] + rec["t"] + byes
+        if not games:
+            return MIN_MWP
+        return max(MIN_MWP, (rec["w"] + byes + 0.5 * rec["t"]) / games)
+
+    # ---- full rebuild (startup / new event) ----
+    def rebuild(self):
+        self._byes = Counter(int(u) for u in self.data.get("bye_history", []))
+        players = [int(u) for u in self.data.get("players", [])]
+        self._buchholz = {}
+        self._omw_sum = {}
+        for u in players:
+            opps = [int(o) for o in self._opps(u)]
+            self._buchholz[u] = sum(self.points(o) for o in opps)
+            self._omw_sum[u] = sum(self.mwp(o) for o in opps)
+        self._table = None
+
+    def _propagate(self, uid: int, d_points: float, d_mwp: float):
+        for o in self._opps(uid):
+            o = int(o)
+            self._buchholz[o] = self._buchholz.get(o, 0) + d_points
+            self._omw_sum[o] = self._omw_sum.get(o, 0.0) + d_mwp
+
+    # ---- incremental updates ----
+    def record_result(self, a: int, b: int, winner: Optional[int]):
+        before = {u: (self.points(u), self.mwp(u)) for u in (a, b)}
+        scores = self.data.setdefault("scores", {})
+        if winner is None:
+            self._rec(a)["t"] += 1
+            self._rec(b)["t"] += 1
+        else:
+            loser = b if winner == a else a
+            self._rec(winner)["w"] += 1
+            self._rec(loser)["l"] += 1
+            scores[str(winner)] = scores.get(str(winner), 0) + 1
+        for u in (a, b):
+            pts, mwp = before[u]
+            self._propagate(u, self.points(u) - pts, self.mwp(u) - mwp)
+        # the new edge contributes the opponents' updated values
+        self._opps(a).append(b)
+        self._opps(b).append(a)
+        self._buchholz[a] = self._buchholz.get(a, 0) + self.points(b)
+        self._buchholz[b] = self._buchholz.get(b, 0) + self.points(a)
+        self._omw_sum[a] = self._omw_sum.get(a, 0.0) + self.mwp(b)
+        self._omw_sum[b] = self._omw_sum.get(b, 0.0) + self.mwp(a)
+        self._table = None
+
+    def record_bye(self, uid: int):
+        mwp = self.mwp(uid)
+        scores = self.data.setdefault("scores", {})
+        scores[str(uid)] = scores.get(str(uid), 0) + 1
+        self.data.setdefault("bye_history", []).append(uid)
+        self._byes[uid] += 1
+        self._propagate(uid, 1, self.mwp(uid) - mwp)
+        self._table = None
+
+    # ---- reads ----
+    def row(self, uid: int) -> dict:
+        rec = self._rec(uid)
+        n = len(self._opps(uid))
+        return {
+            "uid": uid,
+            "points": self.points(uid),
+            "w": rec["w"], "l": rec["l"], "t": rec["t"],
+            "byes": self._byes.get(uid, 0),
+            "buchholz": self._buchholz.get(uid, 0),
+            "omw": self._omw_sum.get(uid, 0.0) / n if n else 0.0,
+            "mwp": self.mwp(uid),
+        }
+
+    def table(self) -> List[dict]:
+        """Standings ordered by points, OMW%, Buchholz, MW%, then id."""
+        if self._table is None:
+            rows = [self.row(int(u)) for u in self.data.get("players", [])]
+            rows.sort(key=lambda r: (-r["points"], -round(r["omw"], 6), -r["buchholz"], -round(r["mwp"], 6), r["uid"]))
+            self._table = rows
+        return self._table
+
+    def leader(self) -> Optional[dict]:
+        t = self.table()
+        return t[0] if t else None
+
+
+def count_rematches(pairs: List[Tuple[int, int]], played: dict) -> int:
+    return sum(1 for a, b in pairs if b in [int(o) for o in played.get(str(a), [])])
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 9
+    rng = random.Random(42)
+    players = list(range(1, n + 1))
+    scores = {str(u): 0 for u in players}
+    played = {str(u): [] for u in players}
+    byes = []
+    worst = 0.0
+    for r in range(1, rounds + 1):
+        t0 = time.perf_counter()
+        pairs, bye = pair_round(players, scores, played, byes)
+        dt = time.perf_counter() - t0
+        worst = max(worst, dt)
+        rem = count_rematches(pairs, played)
+        for a, b in pairs:
+            played[str(a)].append(b)
+            played[str(b)].append(a)
+            scores[str(rng.choice((a, b)))] += 1
+        if bye is not None:
+            byes.append(bye)
+            scores[str(bye)] += 1
+        print(f"rodada {r}: {len(pairs)} mesas, bye={bye}, revanches={rem}, {dt * 1000:.1f} ms")
+    print(f"{n} jogadores, {rounds} rodadas — pior rodada {worst * 1000:.1f} ms, byes repetidos: {len(byes) - len(set(byes))}")
@@ -0,0 +1,135 @@
+# webapi.py — OPTCG Sorocaba — API HTTP somente leitura
+#
+# Documentos JSON servidos pelo mesmo servidor aiohttp do keepalive. Cada
+# recurso tem uma função de versão barata (contadores que já mudam junto com
+# o estado) e só é serializado de novo quando a versão muda; o corpo fica
+# pronto em bytes, com a versão gzip e o ETag, então:
+#
+#   * cliente com If-None-Match igual -> 304 sem corpo;
+#   * cliente com Accept-Encoding: gzip -> corpo comprimido já pronto;
+#   * polling constante não serializa nada enquanto nada mudou.
+#
+# Benchmark: python webapi.py [requisições]
+
+import gzip
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, NamedTuple, Optional
+
+from aiohttp import web
+
+GZIP_MIN = 512  # smaller bodies are sent as is
+KEYED_CACHE = 256
+
+
+class Payload(NamedTuple):
+    version: Hashable
+    etag: str
+    body: bytes
+    gz: Optional[bytes]
+
+
+def encode(version: Hashable, data) -> Payload:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+    gz = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN else None
+    return Payload(version, etag, body, gz)
+
+
+class CachedJson:
+    """One JSON document rebuilt only when ``version()`` changes."""
+
+    def __init__(self, version: Callable[[], Hashable], build: Callable[[], object]):
+        self.version = version
+        self.build = build
+        self._payload: Optional[Payload] = None
+
+    def current(self) -> Payload:
+        v = self.version()
+        if self._payload is None or self._payload.version != v:
+            self._payload = encode(v, self.build())
+        return self._payload
+
+
+class KeyedCachedJson:
+    """Like ``CachedJson`` for parameterized documents (LRU over the keys).
+
+    ``build`` is a coroutine function, so it can read from disk off the loop.
+    """
+
+    def __init__(self, version: Callable[..., Hashable], build: Callable[..., Awaitable], maxsize: int = KEYED_CACHE):
+        self.version = version
+        self.build = build
+        self.maxsize = maxsize
+        self._payloads: "OrderedDict[Hashable, Payload]" = OrderedDict()
+
+    async def current(self, *key) -> Payload:
+        v = self.version(*key)
+        p = self._payloads.get(key)
+        if p is None or p.version != v:
+            p = self._payloads[key] = encode(v, await self.build(*key))
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+        else:
+            self._payloads.move_to_end(key)
+        return p
+
+
+def _matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    bare = etag[2:] if etag.startswith("W/") else etag
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == bare for t in tags)
+
+
+def respond(request: web.Request, payload: Payload) -> web.Response:
+    """304 / gzip / identity response for a pre-encoded payload."""
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "Access-Control-Allow-Origin": "*",
+    }
+    inm = request.headers.get("If-None-Match")
+    if inm and _matches(inm, payload.etag):
+        return web.Response(status=304, headers=headers)
+    body = payload.body
+    if payload.gz is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = payload.gz
+        headers["Content-Encoding"] = "gzip"
+    return web.Response(body=body, headers=headers, content_type="application/json", charset="utf-8")
+
+
+def bad_request(message: str) -> web.Response:
+    return web.json_response({"error": message}, status=400, headers={"Access-Control-Allow-Origin": "*"})
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+    from aiohttp.test_utils import make_mocked_request
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(42)
+    scores = {str(10 ** 17 + u): rng.randint(0, 300) for u in range(5000)}
+    state = {"v": 0}
+    doc = CachedJson(lambda: state["v"], lambda: sorted(scores.items(), key=lambda kv: -kv[1])[:500])
+
+    def timed(headers):
+        req = make_mocked_request("GET", "/api/ranking", headers=headers)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            resp = respond(req, doc.current())
+        return (time.perf_counter() - t0) / n, resp
+
+    t0 = time.perf_counter()
+    for _ in range(200):
+        json.dumps(sorted(scores.items(), key=lambda kv: -kv[1])[:500], indent=4)
+    t_naive = (time.perf_counter() - t0) / 200
+
+    t_full, r = timed({"Accept-Encoding": "gzip"})
+    t_304, r304 = timed({"If-None-Match": r.headers["ETag"]})
+    assert r304.status == 304
+    print(f"serializar a cada requisição {t_naive * 1e6:.0f} µs | em cache (gzip {len(doc.current().gz)} B "
+          f"de {len(doc.current().body)} B) {t_full * 1e6:.1f} µs | 304 {t_304 * 1e6:.1f} µs")